@@ -0,0 +1,220 @@
+import os
+import re
+
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.sql import text
+
+# --- Chunk metadata for filtered retrieval ---
+# medicaldata2 chunks are tagged with disease, region, source and language
+# when they are ingested (migrations/001_medicaldata2_metadata.sql adds the
+# columns). At query time the disease and language come from the query and
+# the regions from the user's hotspots in rag_data_view, so the vector
+# search only ranks chunks that can be relevant instead of the whole corpus.
+# NULL tags match everything. If the filtered search finds fewer than
+# 'limit' chunks, the rest come from the global search.
+#
+#   python chunk_metadata.py migrate             # add the columns and indexes
+#   python chunk_metadata.py backfill            # tag existing chunks from their content
+#   python chunk_metadata.py partition-indexes   # one partial HNSW index per disease
+
+TABLE = "medicaldata2"
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+DEFAULT_LANGUAGE = "en"
+
+# Disease names only, no symptoms: "diarrhea" in a query must not narrow
+# the search to one disease.
+DISEASE_KEYWORDS = {
+    "cholera": ("cholera", "vibrio"),
+    "typhoid": ("typhoid", "enteric fever", "paratyphoid"),
+    "hepatitis": ("hepatitis",),
+    "dysentery": ("dysentery", "shigell"),
+    "amoebiasis": ("amoebiasis", "amebiasis", "entamoeba"),
+    "gastroenteritis": ("gastroenteritis", "rotavirus", "norovirus"),
+    "giardiasis": ("giardia",),
+    "cryptosporidiosis": ("cryptosporid",),
+    "leptospirosis": ("leptospir",),
+    "malaria": ("malaria", "maleria", "plasmodium"),
+    "dengue": ("dengue",),
+    "polio": ("polio",),
+}
+DISEASE_PATTERNS = {
+    disease: re.compile(r"\b(?:" + "|".join(re.escape(k) for k in keywords) + ")", re.IGNORECASE)
+    for disease, keywords in DISEASE_KEYWORDS.items()
+}
+
+# Unicode blocks of the scripts the chatbot supports; Latin text is English
+SCRIPT_LANGUAGES = (
+    (0x0900, 0x097F, "hi"),  # Devanagari
+    (0x0980, 0x09FF, "bn"),
+    (0x0A00, 0x0A7F, "pa"),  # Gurmukhi
+    (0x0A80, 0x0AFF, "gu"),
+    (0x0B00, 0x0B7F, "or"),
+    (0x0B80, 0x0BFF, "ta"),
+    (0x0C00, 0x0C7F, "te"),
+    (0x0C80, 0x0CFF, "kn"),
+    (0x0D00, 0x0D7F, "ml"),
+    (0x0600, 0x06FF, "ur"),  # Arabic script
+)
+
+
+def detect_disease(content):
+    """The disease named most often in 'content', or None."""
+    counts = {d: len(p.findall(content)) for d, p in DISEASE_PATTERNS.items()}
+    disease, hits = max(counts.items(), key=lambda item: item[1])
+    return disease if hits else None
+
+
+def detect_language(content):
+    """Language code of the dominant script, DEFAULT_LANGUAGE for Latin text, None if there are no letters."""
+    counts = {}
+    for ch in content:
+        if not ch.isalpha():
+            continue
+        code = ord(ch)
+        language = next((lang for lo, hi, lang in SCRIPT_LANGUAGES if lo <= code <= hi), DEFAULT_LANGUAGE)
+        counts[language] = counts.get(language, 0) + 1
+    return max(counts, key=counts.get) if counts else None
+
+
+def normalize_region(region):
+    return region.strip().lower() if isinstance(region, str) and region.strip() else None
+
+
+def tag_chunk(content, source=None, region=None, language=None, disease=None):
+    """Metadata for one chunk at ingestion; explicit values win over detection."""
+    return {
+        "disease": disease or detect_disease(content),
+        "region": normalize_region(region),
+        "source": source,
+        "language": language or detect_language(content),
+    }
+
+
+def user_regions(user_info):
+    """Hotspot names from a rag_data_view row (a list or a comma-separated string)."""
+    if not user_info or not hasattr(user_info, "get"):
+        return []
+    regions = user_info.get("region")
+    if isinstance(regions, str):
+        regions = regions.split(",")
+    return [r for r in (normalize_region(r) for r in regions or []) if r]
+
+
+def query_filters(query, user_info=None):
+    filters = {"regions": user_regions(user_info), "language": detect_language(query)}
+    disease = detect_disease(query)
+    if disease:
+        filters["disease"] = disease
+    return filters
+
+
+def filtered_search_sql(filters):
+    clauses = ["(region IS NULL OR region = ANY(:regions))"]
+    if filters.get("language"):
+        clauses.append("(language IS NULL OR language = :language)")
+    if filters.get("disease"):
+        clauses.append("(disease IS NULL OR disease = :disease)")
+    return text(
+        f"SELECT content FROM {TABLE} WHERE {' AND '.join(clauses)} "
+        "ORDER BY embedding <-> (:embedding)::vector LIMIT :limit;"
+    )
+
+
+GLOBAL_SEARCH_SQL = text(f"SELECT content FROM {TABLE} ORDER BY embedding <-> (:embedding)::vector LIMIT :limit;")
+
+
+def search(db_session, embedding, query, user_info=None, limit=3):
+    """
+    Contents of the 'limit' nearest chunks, preferring the ones whose tags
+    fit the query and user. Returns (contents, filters).
+    """
+    filters = query_filters(query, user_info)
+    try:
+        # In a savepoint: a failure undoes only this query, not the
+        # transaction and its SET LOCAL statement_timeout
+        with db_session.begin_nested():
+            rows = db_session.execute(
+                filtered_search_sql(filters), {**filters, "embedding": embedding, "limit": limit}
+            ).fetchall()
+    except ProgrammingError:
+        # Metadata columns not migrated yet: search globally
+        rows = []
+    contents = list(dict.fromkeys(row[0] for row in rows))
+    if len(contents) < limit:
+        # Too few tagged matches (or an untagged corpus): top up from everything
+        rows = db_session.execute(GLOBAL_SEARCH_SQL, {"embedding": embedding, "limit": limit * 2}).fetchall()
+        for row in rows:
+            if len(contents) >= limit:
+                break
+            if row[0] not in contents:
+                contents.append(row[0])
+    return contents, filters
+
+
+# --- Schema management ---
+def migrate(db_session):
+    """Runs every migrations/*.sql in order; each one is idempotent."""
+    applied = []
+    for name in sorted(os.listdir(MIGRATIONS_DIR)):
+        if name.endswith(".sql"):
+            with open(os.path.join(MIGRATIONS_DIR, name)) as f:
+                db_session.execute(text(f.read()))
+            applied.append(name)
+    db_session.commit()
+    return applied
+
+
+def backfill(db_session, source=None, region=None):
+    """Tags chunks that were ingested before the metadata columns existed."""
+    rows = db_session.execute(text(f"SELECT DISTINCT content FROM {TABLE} WHERE language IS NULL;")).fetchall()
+    for (content,) in rows:
+        db_session.execute(
+            text(f"UPDATE {TABLE} SET disease = :disease, region = COALESCE(region, :region), "
+                 "source = COALESCE(source, :source), language = :language "
+                 "WHERE content = :content AND language IS NULL;"),
+            {**tag_chunk(content, source, region), "content": content},
+        )
+    db_session.commit()
+    return len(rows)
+
+
+def create_partition_indexes(db_session):
+    """
+    A partial HNSW index per tagged disease (plus the untagged chunks, which
+    match every disease), so a disease-filtered query walks only that
+    disease's graph. Needs an embedding column with fixed dimensions
+    (vector(n)).
+    """
+    diseases = [row[0] for row in db_session.execute(
+        text(f"SELECT DISTINCT disease FROM {TABLE} WHERE disease IS NOT NULL;")).fetchall()]
+    for disease in diseases:
+        if disease not in DISEASE_KEYWORDS:
+            continue  # Index names come from the known list only
+        # Same predicate as filtered_search_sql, so the planner can use the index
+        db_session.execute(text(f"DROP INDEX IF EXISTS {TABLE}_{disease}_hnsw;"))
+        db_session.execute(text(
+            f"CREATE INDEX {TABLE}_{disease}_hnsw ON {TABLE} "
+            f"USING hnsw (embedding vector_l2_ops) WHERE (disease IS NULL OR disease = '{disease}');"
+        ))
+    db_session.commit()
+    return diseases
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from config import get_db
+
+    parser = argparse.ArgumentParser(description=f"Manage the metadata tags of {TABLE}.")
+    parser.add_argument("command", choices=["migrate", "backfill", "partition-indexes"])
+    parser.add_argument("--source", help="backfill: source recorded on untagged chunks")
+    parser.add_argument("--region", help="backfill: region recorded on untagged chunks")
+    args = parser.parse_args()
+
+    db_session = next(get_db())
+    if args.command == "migrate":
+        print(f"Applied: {', '.join(migrate(db_session))}")
+    elif args.command == "backfill":
+        print(f"Tagged {backfill(db_session, args.source, args.region)} chunks.")
+    else:
+        print(f"Partial indexes for: {', '.join(create_partition_indexes(db_session)) or 'no tagged diseases'}")
@@ -21,6 +21,14 @@ class Config:
     EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "mxbai-embed-large:latest")
     MAIN_DATABASE_URL = os.getenv("MAIN_DATABASE_URL")
     print("MAIN_DATABASE_URL:", MAIN_DATABASE_URL)
+    #deadlines here (seconds)
+    RESPONSE_DEADLINE = float(os.getenv("RESPONSE_DEADLINE", "30"))  # whole /api/generate_response request
+    USER_INFO_TIMEOUT = float(os.getenv("USER_INFO_TIMEOUT", "2"))  # caps per stage, within the deadline
+    EMBEDDING_TIMEOUT = float(os.getenv("EMBEDDING_TIMEOUT", "5"))
+    SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", "3"))
+    GENERATION_RESERVE = float(os.getenv("GENERATION_RESERVE", "10"))  # kept back for the LLM while retrieving
+    GENERATION_RESERVE_SHARE = float(os.getenv("GENERATION_RESERVE_SHARE", "0.5"))  # at most this share of a request's budget
+    ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))  # cached answers used when generation times out
 
 
 config = Config()
@@ -0,0 +1,42 @@
+import time
+
+# --- Per-request deadline ---
+# One time budget for the whole /api/generate_response request. Each stage
+# asks for its timeout from what is left instead of using a fixed value of
+# its own, optionally keeping a reserve for the stages after it (retrieval
+# keeps time back for generation). A stage that cannot get a useful amount
+# of time is skipped rather than started.
+
+MIN_STAGE_SECONDS = 0.1
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class Deadline:
+    def __init__(self, seconds):
+        self.budget = seconds
+        self.start = time.monotonic()
+        self.expires = self.start + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires - time.monotonic())
+
+    def elapsed(self):
+        return time.monotonic() - self.start
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def timeout(self, cap=None, reserve=0.0):
+        """
+        Seconds the next stage may take: what is left after 'reserve', at
+        most 'cap'. Raises DeadlineExceeded if that is under MIN_STAGE_SECONDS.
+        """
+        seconds = self.remaining() - reserve
+        if cap is not None:
+            seconds = min(seconds, cap)
+        if seconds < MIN_STAGE_SECONDS:
+            raise DeadlineExceeded(f"{self.remaining():.2f}s left of {self.budget:g}s")
+        return seconds
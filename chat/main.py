@@ -1,11 +1,32 @@
 from config import get_db_main
 from flask import Flask, request, jsonify
 import requests
+import json
+import queue
+import threading
+import time
+from collections import OrderedDict
 from config import config, SessionLocal, engine, update_config, get_db, main_engine, MainSessionLocal
 # import psycopg2
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.sql import text
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+import chunk_metadata
+from deadline import Deadline, DeadlineExceeded
+import os
+import sys
+
+# Shared opt-in profiler (PROFILE_ENABLED=1), in profiling/ at the repository root;
+# deployments that ship only this directory run without it.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'profiling'))
+try:
+    from sampling_profiler import install_profiler
+except ImportError:
+    install_profiler = None
+
 app = Flask(__name__)
+if install_profiler:
+    install_profiler(app, 'chat')
 
 
 SYSTEM_PROMPT = """
@@ -25,13 +46,23 @@ Your responsibilities:
 7. Stay strictly within the scope of symptoms, first-aid, and health awareness. Do not answer unrelated topics.
 """
 
-def get_user_info(user_id):
+def set_statement_timeout(db_session, seconds):
+    """Bounds the session's next queries (this transaction) by the stage's share of the deadline."""
+    db_session.execute(text(f"SET LOCAL statement_timeout = {max(1, int(seconds * 1000))}"))
+
+def generation_reserve(deadline):
+    """Seconds the pre-LLM stages leave for generation, scaled down for short deadlines."""
+    return min(config.GENERATION_RESERVE, config.GENERATION_RESERVE_SHARE * deadline.budget)
+
+def get_user_info(user_id, deadline=None):
     
     try:
         if not user_id:
             return "No user ID provided."
         
         db_session_main = next(get_db_main()) 
+        if deadline is not None:
+            set_statement_timeout(db_session_main, deadline.timeout(config.USER_INFO_TIMEOUT, generation_reserve(deadline)))
         query = text("""
         SELECT 
         user_name as name, user_role as role, story_titles as program_tile,story_contents as program_content, 
@@ -45,69 +76,77 @@ def get_user_info(user_id):
         return user_info
     except Exception as e:
         # Rollback session if an error occurs
-        if 'db_session_main' in locals() and db_session:
+        if 'db_session_main' in locals() and db_session_main:
             db_session_main.rollback()
         return f"An unexpected error occurred during query and embedding: {e}"
 
-def query_and_embed(query: str):
+NO_MEDICAL_DATA = "No relevant medical data found."
+
+def retrieve(query: str, user_info=None, deadline=None):
     """
-    Chunks a query, generates embeddings, performs a similarity search,
-    and returns the content of the most similar medical data entries.
+    Embeds the query and returns the contents of the most similar medical
+    data entries. The search is restricted to chunks tagged for the query's
+    disease and language and the user's regions, topped up from the global
+    search. With a deadline, embedding and search each get what is left of
+    it, keeping generation_reserve() for the LLM; running out raises
+    DeadlineExceeded, requests.Timeout or a cancelled-statement
+    OperationalError. Other failures raise RuntimeError.
     """
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+    chunks = text_splitter.split_text(query)
+    
+    if not chunks:
+        return []
+
+    payload = {"model": config.EMBEDDING_MODEL, "prompt": chunks[0]}
+    # print("payload::::: ",payload)
+    timeout = 30 if deadline is None else deadline.timeout(config.EMBEDDING_TIMEOUT, generation_reserve(deadline))
+    r = requests.post(config.OLLAMA_URL + "/api/embeddings", json=payload, timeout=timeout)
+    if r.status_code != 200:
+        raise RuntimeError(f"Embedding API error: {r.status_code} {r.text}")
+
+    resp = r.json()
+    # print("resp::::: ",resp)
+    embedding = resp.get("embedding")
+    if embedding is None:
+        raise RuntimeError(f"No embedding returned: {resp}")
+
+    if not isinstance(embedding, list):
+        embedding = list(embedding)
+
+    db_session = next(get_db()) # Get a database session
     try:
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-        chunks = text_splitter.split_text(query)
-        
-        if not chunks:
-            return "No content to process."
-
-        payload = {"model": config.EMBEDDING_MODEL, "prompt": chunks[0]}
-        # print("payload::::: ",payload)
-        r = requests.post(config.OLLAMA_URL + "/api/embeddings", json=payload, timeout=30)
-        if r.status_code != 200:
-            return f"Embedding API error: {r.status_code} {r.text}"
-
-        resp = r.json()
-        # print("resp::::: ",resp)
-        embedding = resp.get("embedding")
-        if embedding is None:
-            return f"No embedding returned: {resp}"
-
-        if not isinstance(embedding, list):
-            embedding = list(embedding)
-
-        db_session = next(get_db()) # Get a database session
+        if deadline is not None:
+            set_statement_timeout(db_session, deadline.timeout(config.SEARCH_TIMEOUT, generation_reserve(deadline)))
         
         # first method
         # search_sql = text(
         #     "SELECT content FROM medicalData WHERE to_tsvector('english', content) @@ plainto_tsquery(:query) ORDER BY embedding <-> (:embedding)::vector LIMIT 3;"
         # )
         # second method
-        search_sql = text(
-            "SELECT content FROM medicaldata2 ORDER BY embedding <-> (:embedding)::vector LIMIT 3;"
-        )
-        result = db_session.execute(search_sql, {"embedding": embedding})
+        # search_sql = text(
+        #     "SELECT content FROM medicaldata2 ORDER BY embedding <-> (:embedding)::vector LIMIT 3;"
+        # )
+        # fourth method: metadata-filtered search with global fallback
+        contents, filters = chunk_metadata.search(db_session, embedding, query, user_info, limit=3)
+        print("Retrieval filters: ", filters)
         # third method
         # search_sql = text(
         #     "SELECT content FROM medicalData WHERE to_tsvector('english', content) @@ websearch_to_tsquery(:query) ORDER BY embedding <-> (:embedding)::vector LIMIT 3;"
         # )
         # result = db_session.execute(search_sql, {"embedding": embedding, "query": query})
-        
-        rows = result.fetchall()
-        
-        # Extract content from rows
-        retrieved_content = "\n".join([row[0] for row in rows]) if rows else "No relevant medical data found."
-        
-        return retrieved_content
-
-    except ImportError:
-        return "Required libraries (langchain, pgvector) not found. Please install them."
-    except Exception as e:
+        return contents
+    except Exception:
         # Rollback session if an error occurs
-        if 'db_session' in locals() and db_session:
-            db_session.rollback()
-        return f"An unexpected error occurred during query and embedding: {e}"
+        db_session.rollback()
+        raise
 
+def out_of_time(error):
+    """Whether a retrieval error means its stage ran out of deadline."""
+    if isinstance(error, (DeadlineExceeded, requests.Timeout)):
+        return True
+    # Postgres cancels a query that runs past statement_timeout
+    return isinstance(error, OperationalError) and "statement timeout" in str(error)
 
 @app.route('/api/config/get', methods=['GET'])
 def get_config():
@@ -192,11 +231,123 @@ def process_text():
         return jsonify({"error": f"An unexpected error occurred during text processing: {e}"}), 500
 
 
+# --- Answer cache ---
+# Answers that finished in time, by user and normalized query. Served when
+# generation cannot finish within the deadline, before falling back to the
+# retrieved context alone.
+ANSWER_CACHE_SIZE = 1024
+answer_cache = OrderedDict()  # key -> (stored at, answer)
+answer_cache_lock = threading.Lock()
+
+def answer_key(user_id, query):
+    return (user_id, " ".join(query.lower().split()))
+
+def cache_answer(key, answer):
+    with answer_cache_lock:
+        answer_cache[key] = (time.monotonic(), answer)
+        answer_cache.move_to_end(key)
+        while len(answer_cache) > ANSWER_CACHE_SIZE:
+            answer_cache.popitem(last=False)
+
+def cached_answer(key):
+    with answer_cache_lock:
+        entry = answer_cache.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > config.ANSWER_CACHE_TTL:
+            del answer_cache[key]
+            return None
+        answer_cache.move_to_end(key)
+        return entry[1]
+
+DISCLAIMER = "This is pre-treatment guidance only. Please consult a licensed doctor for a professional opinion."
+
+def retrieval_only_answer(contents):
+    """What the user gets when the model cannot answer in time but retrieval found something."""
+    context = "\n\n".join(contents)
+    return (f"I couldn't prepare a full answer in time. Here is the most relevant information I found:\n\n"
+            f"{context}\n\n{DISCLAIMER}")
+
+def request_deadline(data):
+    """
+    Seconds this request may take: RESPONSE_DEADLINE, shortened by the
+    caller's 'deadline_ms' body field or X-Request-Deadline-Ms header.
+    Any positive value is honoured; a budget too short for a stage skips
+    it. Values that are not positive numbers are ignored.
+    """
+    seconds = config.RESPONSE_DEADLINE
+    for value in (data.get('deadline_ms'), request.headers.get('X-Request-Deadline-Ms')):
+        try:
+            requested = float(value) / 1000
+        except (TypeError, ValueError):
+            continue
+        if requested > 0:  # Also false for NaN
+            seconds = min(seconds, requested)
+    return seconds
+
+def generate_with_deadline(payload, deadline):
+    """
+    Streams the model's answer until it is done or the deadline passes.
+    Returns (text, done, error): when time runs out 'text' is what was
+    generated so far and done is False; error is set if the model failed.
+    """
+    tokens = queue.Queue()
+    stop = threading.Event()
+    timeout = deadline.timeout()
+
+    def read():
+        try:
+            # Read timeout between streamed lines, not for the whole answer
+            with requests.post(config.OLLAMA_URL + "/api/generate", json={**payload, "stream": True},
+                               stream=True, timeout=timeout) as r:
+                if r.status_code != 200:
+                    tokens.put(("error", f"Qwen model API error: {r.status_code} {r.text}"))
+                    return
+                for line in r.iter_lines():
+                    if stop.is_set():
+                        return  # Closing the connection makes Ollama stop generating
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        tokens.put(("error", f"Qwen model error: {chunk['error']}"))
+                        return
+                    tokens.put(("token", chunk.get("response", "")))
+                    if chunk.get("done"):
+                        tokens.put(("done", None))
+                        return
+            tokens.put(("error", "Qwen model stream ended before the answer was done"))
+        except Exception as e:
+            tokens.put(("timeout" if isinstance(e, requests.Timeout) else "error", str(e)))
+
+    threading.Thread(target=read, name="llm-stream", daemon=True).start()
+    parts = []
+    try:
+        while True:
+            try:
+                kind, value = tokens.get(timeout=deadline.remaining())
+            except queue.Empty:
+                return "".join(parts), False, None
+            if kind == "token":
+                parts.append(value)
+            elif kind == "done":
+                return "".join(parts), True, None
+            elif kind == "timeout":
+                return "".join(parts), False, None
+            else:
+                return "".join(parts), False, value
+    finally:
+        stop.set()
+
+
 @app.route('/api/generate_response', methods=['POST'])
 def generate_response_endpoint():
     """
     API endpoint to receive a query, retrieve relevant medical data,
     and generate a response using the Qwen model.
+    The whole request shares one deadline (RESPONSE_DEADLINE, or shorter if
+    the caller asks). Stages that would overrun it are skipped or cut short,
+    and the response lists them in 'degraded'.
     """
     data = request.get_json()
     if not data or 'query' not in data:
@@ -206,17 +357,36 @@ def generate_response_endpoint():
     user_id = data['user_id']
     print("query: ", user_query)
     print("user_id: ", user_id)
+    deadline = Deadline(request_deadline(data))
+    degraded = []
+
+    def respond(body, status=200):
+        body["elapsed_ms"] = round(deadline.elapsed() * 1000)
+        if degraded:
+            print(f"Degraded: {', '.join(degraded)} ({body['elapsed_ms']}ms)")
+        return jsonify(body), status
     
 
-    # Retrieve relevant medical data using the query_and_embed function
-    retrieved_content = query_and_embed(user_query)
-    if retrieved_content:
-        print("Medical Data retrieved.")
-    # Retrieve user information
-    user_data = get_user_info(user_id)
+    # Retrieve user information first: its regions narrow the retrieval
+    user_data = get_user_info(user_id, deadline)
+    if user_id and isinstance(user_data, str):
+        # Lookup failed or ran out of time: answer without the user's data
+        print(user_data)
+        degraded.append("user_info")
+        user_data = None
     if user_data:
         print("User Data retrieved.")
         print(user_data)
+    # Retrieve relevant medical data; skipped when it cannot finish in time
+    contents = []
+    try:
+        contents = retrieve(user_query, user_data, deadline)
+        retrieved_content = "\n".join(contents) if contents else NO_MEDICAL_DATA
+        print("Medical Data retrieved.")
+    except Exception as e:
+        print(f"Retrieval failed: {e}")
+        degraded.append("retrieval_timeout" if out_of_time(e) else "retrieval_error")
+        retrieved_content = NO_MEDICAL_DATA
 ###########################################
     # return jsonify(user_data), 200
 ###########################################
@@ -235,11 +405,11 @@ def generate_response_endpoint():
     # print("Additional Information:\n{user_data}\n\nUser Query:\n{user_query}")
     # return  prompt, 200
 
+    key = answer_key(user_id, user_query)
     try:
         payload = {
             "model": config.OLLAMA_MODEL,  # 'qwen3:0.6b-fp16' as per config
             "prompt": prompt,
-            "stream": False,
             "system": SYSTEM_PROMPT,
             "think": False,
             "temperature": 0.2,
@@ -251,22 +421,31 @@ def generate_response_endpoint():
             "num_ctx": 12000     
         }
         print("Querying LLM begin.")
-        r = requests.post(config.OLLAMA_URL + "/api/generate", json=payload, timeout=30)
-
-        if r.status_code != 200:
-            return jsonify({"error": f"Qwen model API error: {r.status_code} {r.text}"}), 502
-        print("LLM responsended.")
-        resp = r.json()
-        generated_text = resp.get("response")
-        print(generated_text)
-
-        if generated_text is None:
-            return jsonify({"error": f"No response generated by Qwen model: {resp}"}), 502
-
-        return jsonify({"response": generated_text}), 200
-
-    except Exception as e:
-        return jsonify({"error": f"An unexpected error occurred during Qwen model generation: {e}"}), 500
+        generated_text, done, error = generate_with_deadline(payload, deadline)
+    except DeadlineExceeded:
+        generated_text, done, error = "", False, None
+    print("LLM responsended." if done else f"LLM stopped early: {error or 'deadline'}")
+    print(generated_text)
+
+    if done and generated_text:
+        cache_answer(key, generated_text)
+        return respond({"response": generated_text, "degraded": degraded, "partial": False})
+
+    # Generation could not finish: partial output, then a cached answer, then the retrieved context
+    degraded.append("generation_error" if error else "generation_timeout")
+    if generated_text.strip():
+        return respond({"response": f"{generated_text.rstrip()}\n\n{DISCLAIMER}",
+                        "degraded": degraded, "partial": True})
+    cached = cached_answer(key)
+    if cached is not None:
+        degraded.append("cached_answer")
+        return respond({"response": cached, "degraded": degraded, "partial": False})
+    if contents:
+        degraded.append("retrieval_only")
+        return respond({"response": retrieval_only_answer(contents), "degraded": degraded, "partial": False})
+    if error:
+        return respond({"error": error, "degraded": degraded}, 502)
+    return respond({"error": "No response could be generated within the deadline.", "degraded": degraded}, 504)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,13 @@
+-- Metadata tags on the retrieval chunks, used to filter the vector search
+-- (see chunk_metadata.py). NULL means "applies everywhere": a chunk with no
+-- region is general knowledge and matches every user.
+-- Safe to run more than once: python chunk_metadata.py migrate
+
+ALTER TABLE medicaldata2 ADD COLUMN IF NOT EXISTS disease text;
+ALTER TABLE medicaldata2 ADD COLUMN IF NOT EXISTS region text;
+ALTER TABLE medicaldata2 ADD COLUMN IF NOT EXISTS source text;
+ALTER TABLE medicaldata2 ADD COLUMN IF NOT EXISTS language text;
+
+CREATE INDEX IF NOT EXISTS medicaldata2_disease_idx ON medicaldata2 (disease);
+CREATE INDEX IF NOT EXISTS medicaldata2_region_idx ON medicaldata2 (region);
+CREATE INDEX IF NOT EXISTS medicaldata2_language_idx ON medicaldata2 (language);
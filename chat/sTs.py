@@ -6,6 +6,8 @@ from sqlalchemy.sql import text
 import os
 from dotenv import load_dotenv
 
+from chunk_metadata import tag_chunk
+
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL") 
@@ -65,7 +67,7 @@ def insert_chunks(db_session, chunks_with_embeddings):
             print(f"Inserted chunk: {item['content'][:50]}...{item['content'][-50:]}")
         db_session.commit()
 # Main processing logic
-def process_data():
+def process_data(source="medicaldata", region=None, language=None, disease=None):
     db_session = SessionLocal()
     try:
         # Fetch existing data
@@ -98,7 +100,9 @@ def process_data():
             
             #### Testing
             if embedding:
-                db_session.execute(text("INSERT INTO medicaldata2 (content, embedding) VALUES (:content, :embedding)"), {"content": chunk_text, "embedding": embedding})
+                # Tags drive the filtered retrieval (see chunk_metadata.py)
+                tags = tag_chunk(chunk_text, source=source, region=region, language=language, disease=disease)
+                db_session.execute(text("INSERT INTO medicaldata2 (content, embedding, disease, region, source, language) VALUES (:content, :embedding, :disease, :region, :source, :language)"), {"content": chunk_text, "embedding": embedding, **tags})
                 print(f"Inserted chunk: {chunk_text[:50]}...{chunk_text[-50:]}")
         
         db_session.commit()
@@ -118,5 +122,13 @@ def process_data():
         db_session.close()
 
 if __name__ == "__main__":
-    process_data()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Re-chunk medicaldata into medicaldata2 with metadata tags.")
+    parser.add_argument("--source", default="medicaldata", help="Source recorded on every chunk")
+    parser.add_argument("--region", help="Region the text is specific to (default: general knowledge)")
+    parser.add_argument("--language", help="Language code (default: detected per chunk)")
+    parser.add_argument("--disease", help="Disease of every chunk (default: detected per chunk)")
+    args = parser.parse_args()
+    process_data(args.source, args.region, args.language, args.disease)
     print("Data processing completed.")
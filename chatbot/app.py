@@ -1,4 +1,5 @@
 import os
+import sys
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import google.generativeai as genai
@@ -7,7 +8,17 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
+# Shared opt-in profiler (PROFILE_ENABLED=1), in profiling/ at the repository root;
+# the Docker image ships only app.py and runs without it.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'profiling'))
+try:
+    from sampling_profiler import install_profiler
+except ImportError:
+    install_profiler = None
+
 app = Flask(__name__)
+if install_profiler:
+    install_profiler(app, 'chatbot')
 # Enable CORS for all endpoints to work with Next.js frontend
 CORS(app, resources={
     r"/chat": {"origins": "*"},
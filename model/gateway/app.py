@@ -0,0 +1,151 @@
+# gateway/app.py
+import importlib.util
+import os
+import sys
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+
+# --- Single-process inference gateway ---
+# Serves the three model services from one process, so pandas, NumPy,
+# scikit-learn and XGBoost are imported once per replica instead of three
+# times. Each service keeps its own routes under a prefix:
+#
+#   /outbreak/...        model/outbreak/app.py (Flask, mounted through WSGI)
+#   /waterborne/...      model/waterborne-disease-predictor/src/app.py
+#   /water_quality/...   model/water_quality/app.py
+#
+# Services are imported from their own directories (they use sibling-module
+# imports like 'from features import ...') and resolve their artifacts
+# relative to their own files, so the gateway runs from any directory.
+#
+#   uvicorn app:app --app-dir model/gateway
+#
+# GATEWAY_ENABLE_<NAME>=0 leaves a service out entirely (it is never imported).
+#
+# Metrics are shared; batching is not. Each service keeps its own (only
+# water_quality micro-batches /predict), see README.md.
+
+MODEL_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVICES = {
+    # name: (service directory, app module file, WSGI app?)
+    "outbreak": (os.path.join(MODEL_ROOT, "outbreak"), "app.py", True),
+    "waterborne": (os.path.join(MODEL_ROOT, "waterborne-disease-predictor", "src"), "app.py", False),
+    "water_quality": (os.path.join(MODEL_ROOT, "water_quality"), "app.py", False),
+}
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def enabled(name):
+    return os.getenv(f"GATEWAY_ENABLE_{name.upper()}", "1").lower() not in ("0", "false", "no", "")
+
+
+def load_service(name, directory, filename):
+    """Imports a service's app module under a unique name ('<name>_app')."""
+    if directory not in sys.path:
+        # Kept on sys.path: services also import siblings lazily inside functions
+        sys.path.insert(0, directory)
+    module_name = f"{name}_app"
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(directory, filename))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    start = time.perf_counter()
+    spec.loader.exec_module(module)
+    print(f"Gateway: loaded {name} in {time.perf_counter() - start:.2f}s.")
+    return module
+
+
+def wsgi_middleware(wsgi_app):
+    try:
+        from a2wsgi import WSGIMiddleware
+    except ImportError:
+        from starlette.middleware.wsgi import WSGIMiddleware
+    return WSGIMiddleware(wsgi_app)
+
+
+# water_quality owns the shared histogram and micro-batching code
+sys.path.insert(0, SERVICES["water_quality"][0])
+from batching import Histogram  # noqa: E402
+
+services = {}  # name -> imported module
+for name, (directory, filename, is_wsgi) in SERVICES.items():
+    if enabled(name):
+        services[name] = load_service(name, directory, filename)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Mounted apps do not get lifespan events of their own; run their
+    # startup/shutdown handlers (e.g. water_quality's model loading) here.
+    async with AsyncExitStack() as stack:
+        for name, module in services.items():
+            if not SERVICES[name][2]:
+                await stack.enter_async_context(module.app.router.lifespan_context(module.app))
+        yield
+
+
+app = FastAPI(title="Model Inference Gateway", lifespan=lifespan)
+
+request_seconds = {
+    name: Histogram("gateway_request_duration_seconds", "Request latency per model service", LATENCY_BUCKETS)
+    for name in services
+}
+requests_total = {name: {} for name in services}  # name -> {status: count}
+
+
+# --- Metrics middleware ---
+# Pure ASGI so streaming responses are timed to their last byte.
+class ServiceMetrics:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        name = scope["path"].strip("/").split("/", 1)[0] if scope["type"] == "http" else None
+        if name not in request_seconds:
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            request_seconds[name].observe(time.perf_counter() - start)
+            counts = requests_total[name]
+            counts[status] = counts.get(status, 0) + 1
+
+
+app.add_middleware(ServiceMetrics)
+
+for name, module in services.items():
+    app.mount(f"/{name}", wsgi_middleware(module.app) if SERVICES[name][2] else module.app)
+
+
+@app.get("/health")
+def health():
+    return {"status": "ok", "services": {name: enabled(name) for name in SERVICES}}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Per-service request latency and counts, plus the water_quality micro-batcher, in Prometheus format."""
+    lines = []
+    for i, (name, histogram) in enumerate(request_seconds.items()):
+        lines.append(histogram.render(f'service="{name}"', header=i == 0))
+    lines.append("# HELP gateway_requests_total Requests per model service and status")
+    lines.append("# TYPE gateway_requests_total counter")
+    for name, counts in requests_total.items():
+        for status, count in sorted(counts.items()):
+            lines.append(f'gateway_requests_total{{service="{name}",status="{status}"}} {count}')
+    if "water_quality" in services:
+        lines.append(services["water_quality"].batcher.metrics().rstrip("\n"))
+    return "\n".join(lines) + "\n"
@@ -1,19 +1,89 @@
-from flask import Flask, request, jsonify
-import joblib
+from flask import Flask, request, jsonify, Response, stream_with_context
+import hmac
+import json
+import os
+import sys
+import threading
+import time
 import pandas as pd
 import numpy as np
+from feature_store import FeatureStore
+from features import build_feature_matrix, feature_row, scenario_matrix
+from model_registry import ModelRegistry
+from risk_table import RiskTable
+
+# Shared opt-in profiler (PROFILE_ENABLED=1), in profiling/ at the repository root;
+# deployments that ship only this service run without it.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'profiling'))
+try:
+    from sampling_profiler import install_profiler
+except ImportError:
+    install_profiler = None
 
 # Initialize the Flask application 🚀
 app = Flask(__name__)
+if install_profiler:
+    install_profiler(app, 'outbreak')
 
 # --- Step 1: Load the Trained Model ---
+# Models come from the versioned registry (model/registry/<version>/), falling
+# back to model/outbreak_predictor.pkl. Each is warmed up before serving and
+# can be hot-swapped via /admin/model/activate or the ACTIVE file watcher.
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+MODEL_WATCH_INTERVAL = float(os.environ.get('MODEL_WATCH_INTERVAL', '0'))
+
 print("Loading the trained model...")
+registry = ModelRegistry()
 try:
-    model = joblib.load('model/outbreak_predictor.pkl')
-    print("Model loaded successfully.")
-except FileNotFoundError:
+    registry.activate(persist=False)
+except Exception as e:
+    print(f"Error: Could not load a model ({e}). Please run train_model.py first.")
+if registry.current is None:
     print("Error: Model file not found. Please run train_model.py first.")
-    model = None
+
+# --- Load the Rolling Feature Store ---
+# Keeps per-village history so callers only need to send today's reading.
+feature_store = FeatureStore().load()
+print(f"Feature store loaded with {len(feature_store)} villages.")
+
+# --- Load the Precomputed Risk Table ---
+# Serves dashboard risk lookups from memory; only changed villages are rescored.
+# /ingest saves it at most every RISK_TABLE_SAVE_INTERVAL seconds; a save lost
+# on shutdown only means those villages are rescored at the next startup.
+RISK_TABLE_SAVE_INTERVAL = float(os.environ.get('RISK_TABLE_SAVE_INTERVAL', '5'))
+risk_table = RiskTable().load()
+_save_lock = threading.Lock()
+_save_pending = False
+
+def _save_risk_table():
+    global _save_pending
+    with _save_lock:
+        _save_pending = False  # Changes from here on schedule another save
+    risk_table.save()
+
+def schedule_risk_table_save():
+    global _save_pending
+    with _save_lock:
+        if _save_pending:
+            return  # The pending save will include this change
+        _save_pending = True
+    timer = threading.Timer(RISK_TABLE_SAVE_INTERVAL, _save_risk_table)
+    timer.daemon = True
+    timer.start()
+
+def refresh_risk_table():
+    handle = registry.current
+    if handle is None:
+        return 0
+    rescored = risk_table.rescore(handle, handle.version, feature_store)
+    if rescored:
+        risk_table.save()
+    return rescored
+
+refresh_risk_table()
+print(f"Risk table holds {len(risk_table)} villages.")
+# Started once the risk table exists: a swap rescores it, as /admin/model/activate does
+registry.watch(MODEL_WATCH_INTERVAL, on_swap=lambda handle: refresh_risk_table())
 
 # --- Step 2: Define Feature Engineering Function ---
 def create_features_for_prediction(data):
@@ -21,31 +91,50 @@ def create_features_for_prediction(data):
     Creates features for the input data for a single prediction.
     'data' is expected to be a dictionary of the latest readings.
     """
-    df = pd.DataFrame([data])
-    df['cases_7_day_avg'] = data.get('cases_7_day_avg', df['reported_cases'])
-    df['rainfall_3_day_sum'] = data.get('rainfall_3_day_sum', df['rainfall_mm'])
-    
-    features_ordered = [
-        'reported_cases', 'turbidity_ntu', 'ph_level', 'rainfall_mm',
-        'e_coli_present', 'population_density', 'proximity_to_river',
-        'cases_7_day_avg', 'rainfall_3_day_sum', 'cases_7_days_ago'
-    ]
-    
-    for col in features_ordered:
-        if col not in df.columns:
-            df[col] = 0
-    return df[features_ordered]
+    return model_features_for([data], registry.current)
+
+def model_features_for(records, handle):
+    """
+    Feature matrix in the columns 'handle' was trained on. Models trained with
+    neighbor aggregates get them from the feature store's spatial index.
+    """
+    if handle is None:
+        return build_feature_matrix(records)
+    if handle.spatial_radius_km:
+        feature_store.add_neighbor_features(records, handle.spatial_radius_km)
+    return build_feature_matrix(records, handle.features)
+
+def model_row_for(record, handle):
+    """One reading as a float32 row for the compiled trees (no DataFrame)."""
+    if handle.spatial_radius_km:
+        feature_store.add_neighbor_features([record], handle.spatial_radius_km)
+    return feature_row(record, handle.features)
+
+def resolve_from_store(data):
+    """Fills in rolling features from the feature store for known villages."""
+    village_id = data.get('village_id')
+    if village_id is not None and village_id in feature_store:
+        return feature_store.features_for(data)
+    return data
 
 # --- Step 3: Create Prediction Endpoint ---
 @app.route('/predict', methods=['POST'])
 def predict():
-    if model is None:
+    handle = registry.current  # Held for the whole request, even across a swap
+    if handle is None:
         return jsonify({'error': 'Model not loaded. Cannot make predictions.'}), 500
 
     try:
         json_data = request.get_json()
-        features_df = create_features_for_prediction(json_data)
-        prediction_probability = model.predict_proba(features_df)
+        # Known villages get their rolling features from the server-side store
+        json_data = resolve_from_store(json_data)
+        if handle.compiled is not None:
+            features, columns = model_row_for(json_data, handle), handle.features
+        else:
+            features, columns = model_features_for([json_data], handle), None
+        start = time.perf_counter()
+        prediction_probability = handle.predict_proba(features)
+        registry.score_shadow(features, prediction_probability[:, 1], (time.perf_counter() - start) * 1000, columns)
         outbreak_risk = prediction_probability[0][1]
         
         # Prepare the response WITHOUT village_id
@@ -53,33 +142,245 @@ def predict():
             'outbreak_risk_probability': float(outbreak_risk),
             'timestamp': pd.Timestamp.now(tz='Asia/Kolkata').isoformat()
         }
+        if 'history_days' in json_data:
+            response['history_days'] = json_data['history_days']
         
         return jsonify(response)
 
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+# --- Batch Prediction Endpoint ---
+BATCH_STREAM_CHUNK = 1000  # Rows serialized per streamed chunk
+
+def parse_batch_body():
+    """Reads a batch body sent either as a JSON array or as NDJSON."""
+    if request.mimetype in ('application/x-ndjson', 'application/ndjson', 'application/jsonl'):
+        lines = request.get_data(as_text=True).splitlines()
+        return [json.loads(line) for line in lines if line.strip()], True
+    records = request.get_json()
+    if isinstance(records, dict):
+        records = records.get('records')
+    if not isinstance(records, list):
+        raise ValueError('Expected a JSON array of readings or an NDJSON body.')
+    return records, False
+
+@app.route('/predict_batch', methods=['POST'])
+def predict_batch():
+    """
+    Scores many villages with a single predict_proba call. Results are
+    streamed back as NDJSON (for NDJSON requests or 'Accept: application/x-ndjson')
+    or as a JSON array, in request order.
+    """
+    handle = registry.current
+    if handle is None:
+        return jsonify({'error': 'Model not loaded. Cannot make predictions.'}), 500
+
+    try:
+        records, ndjson_in = parse_batch_body()
+        if not records:
+            return jsonify({'error': 'No readings to score.'}), 400
+        records = [resolve_from_store(r) for r in records]
+        features_df = model_features_for(records, handle)
+        start = time.perf_counter()
+        outbreak_risk = handle.predict_proba(features_df)[:, 1]
+        registry.score_shadow(features_df, outbreak_risk, (time.perf_counter() - start) * 1000)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+    timestamp = pd.Timestamp.now(tz='Asia/Kolkata').isoformat()
+    village_ids = [r.get('village_id') for r in records]
+    risks = outbreak_risk.tolist()
+    ndjson_out = ndjson_in or 'application/x-ndjson' in request.headers.get('Accept', '')
+
+    def generate():
+        if not ndjson_out:
+            yield '['
+        for start in range(0, len(risks), BATCH_STREAM_CHUNK):
+            rows = [
+                json.dumps({
+                    'village_id': village_ids[i],
+                    'outbreak_risk_probability': risks[i],
+                    'timestamp': timestamp,
+                })
+                for i in range(start, min(start + BATCH_STREAM_CHUNK, len(risks)))
+            ]
+            if ndjson_out:
+                yield '\n'.join(rows) + '\n'
+            else:
+                yield (',' if start else '') + ','.join(rows)
+        if not ndjson_out:
+            yield ']'
+
+    mimetype = 'application/x-ndjson' if ndjson_out else 'application/json'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+# --- What-if Scenario Endpoint ---
+MAX_SCENARIO_POINTS = 100000
+
+@app.route('/scenario', methods=['POST'])
+def scenario():
+    """
+    Scores a grid of what-if variations of one reading in a single model call:
+    {'base': {...reading or village_id...},
+     'grid': {'rainfall_3_day_sum': [20, 50, 80]},   # set a feature to each value
+     'scale': {'turbidity_ntu': [1, 2]}}             # multiply the base value
+    Returns the axes, the surface shape and the risk surface as nested lists.
+    """
+    handle = registry.current
+    if handle is None:
+        return jsonify({'error': 'Model not loaded. Cannot make predictions.'}), 500
+
+    try:
+        json_data = request.get_json()
+        grid, scale = json_data.get('grid') or {}, json_data.get('scale') or {}
+        unknown = [f for f in [*grid, *scale] if f not in handle.features]
+        if unknown:
+            return jsonify({'error': f'Unknown features: {unknown}. Expected any of {handle.features}.'}), 400
+        if set(grid) & set(scale):
+            return jsonify({'error': 'A feature can be in either grid or scale, not both.'}), 400
+        shape = [len(v) for v in [*grid.values(), *scale.values()]]
+        points = int(np.prod(shape))
+        if points == 0 or points > MAX_SCENARIO_POINTS:
+            return jsonify({'error': f'Scenario must have between 1 and {MAX_SCENARIO_POINTS} points, got {points}.'}), 400
+
+        base = resolve_from_store(json_data.get('base') or {})
+        base_row = model_features_for([base], handle)
+        matrix, axes = scenario_matrix(base_row, grid, scale)
+        risk = handle.predict_proba(matrix)[:, 1]
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'village_id': base.get('village_id'),
+        'base_risk': float(handle.predict_proba(base_row)[0, 1]),
+        'axes': [{'feature': f, 'mode': mode, 'values': values} for f, mode, values in axes],
+        'shape': shape,
+        'risk': np.round(risk.astype(float), 4).reshape(shape).tolist(),
+        'timestamp': pd.Timestamp.now(tz='Asia/Kolkata').isoformat()
+    })
+
+# --- Daily Reading Ingestion Endpoint ---
+@app.route('/ingest', methods=['POST'])
+def ingest():
+    """
+    Accepts one daily reading or a list of readings per village
+    ({'village_id', 'date', 'reported_cases', 'rainfall_mm', ...}) and
+    updates the rolling windows used by /predict. A batch is all or
+    nothing: one invalid reading rejects it with a 400 and stores none.
+    """
+    json_data = request.get_json()
+    if not json_data:
+        return jsonify({'error': 'Expected a reading or a list of readings.'}), 400
+
+    try:
+        ingested = feature_store.ingest(json_data)
+    except (ValueError, TypeError, KeyError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Keep the risk table fresh for just the villages that changed
+    rescored = 0
+    handle = registry.current
+    if handle is not None:
+        readings = json_data if isinstance(json_data, list) else [json_data]
+        touched = list(dict.fromkeys(r.get('village_id') for r in readings))
+        rescored = risk_table.rescore(handle, handle.version, feature_store, touched)
+        if rescored:
+            schedule_risk_table_save()
+
+    return jsonify({'ingested': ingested, 'villages': len(feature_store), 'rescored': rescored})
+
+# --- Precomputed Risk Endpoints ---
+@app.route('/risk/<village_id>', methods=['GET'])
+def village_risk(village_id):
+    body = risk_table.get_json(village_id)
+    if body is None:
+        return jsonify({'error': f'No risk score for village {village_id}.'}), 404
+    return Response(body, mimetype='application/json')
+
+@app.route('/risk', methods=['GET'])
+def district_risk():
+    """Risk for every village in ?district=..., or for all villages."""
+    return Response(risk_table.district_json(request.args.get('district')), mimetype='application/json')
+
+@app.route('/risk/refresh', methods=['POST'])
+def refresh_risk():
+    """Rescores villages whose inputs or model changed and saves the table."""
+    if registry.current is None:
+        return jsonify({'error': 'Model not loaded. Cannot make predictions.'}), 500
+    rescored = refresh_risk_table()
+    return jsonify({'rescored': rescored, 'villages': len(risk_table), 'model_version': registry.current.version})
+
+# --- Model Registry Admin Endpoints ---
+def admin_denied():
+    """Admin routes require the X-Admin-Token header, and are off when ADMIN_TOKEN is unset."""
+    if not ADMIN_TOKEN:
+        return jsonify({'error': 'Admin endpoints are disabled; set ADMIN_TOKEN to enable them.'}), 403
+    token = request.headers.get('X-Admin-Token')
+    if token is None or not hmac.compare_digest(token, ADMIN_TOKEN):
+        return jsonify({'error': 'Forbidden'}), 403
+    return None
+
+@app.route('/admin/model/versions', methods=['GET'])
+def model_versions():
+    denied = admin_denied()
+    if denied:
+        return denied
+    current = registry.current
+    return jsonify({'versions': registry.versions(), 'active': current.version if current else None})
+
+@app.route('/admin/model/activate', methods=['POST'])
+def activate_model():
+    """Loads and warms up {'version': ...} (default: ACTIVE file), then swaps it in."""
+    denied = admin_denied()
+    if denied:
+        return denied
+    version = (request.get_json(silent=True) or {}).get('version')
+    try:
+        handle = registry.activate(version)
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    rescored = refresh_risk_table()
+    return jsonify({'active': handle.info() if handle else None, 'rescored': rescored})
+
+@app.route('/admin/model/shadow', methods=['GET', 'POST'])
+def shadow_model():
+    """GET returns shadow comparison stats; POST {'version': ...} starts (null stops) shadow scoring."""
+    denied = admin_denied()
+    if denied:
+        return denied
+    if request.method == 'POST':
+        version = (request.get_json(silent=True) or {}).get('version')
+        try:
+            registry.set_shadow(version)
+        except FileNotFoundError as e:
+            return jsonify({'error': str(e)}), 404
+    stats = registry.shadow_stats
+    return jsonify({'shadow': stats.summary() if stats else None})
+
 # --- Health Check Endpoint ---
 @app.route('/', methods=['GET'])
 def health_check():
     return jsonify({
         "status": "healthy",
         "service": "Outbreak Prediction Model",
-        "model_loaded": model is not None,
+        "model_loaded": registry.current is not None,
         "timestamp": pd.Timestamp.now(tz='Asia/Kolkata').isoformat()
     })
 
 @app.route('/health', methods=['GET'])
 def health():
+    current = registry.current
     return jsonify({
         "status": "healthy",
         "service": "Outbreak Prediction Model",
-        "model_loaded": model is not None,
+        "model_loaded": current is not None,
+        "model": current.info() if current else None,
+        "shadow_version": registry.shadow.version if registry.shadow else None,
         "timestamp": pd.Timestamp.now(tz='Asia/Kolkata').isoformat()
     })
 
 # --- Step 4: Run the Flask App ---
 if __name__ == '__main__':
-    import os
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
@@ -0,0 +1,75 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from features import (
+    CASES_AVG_WINDOW, RAIN_SUM_WINDOW, CASES_LAG, OUTBREAK_HORIZON,
+    add_features, add_target, group_bounds,
+)
+
+
+def make_panel(num_villages, years, seed=42):
+    """Builds a sorted village x day panel with just the columns features need."""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2020-01-01', periods=365 * years, freq='D')
+    n = num_villages * len(dates)
+    return pd.DataFrame({
+        'village_id': np.repeat(np.arange(num_villages), len(dates)),
+        'date': np.tile(dates.values, num_villages),
+        'reported_cases': rng.integers(0, 30, size=n),
+        'rainfall_mm': np.round(np.abs(rng.normal(2, 5, size=n)), 2),
+    })
+
+
+def legacy_features(df):
+    """The per-group lambda implementation train_model.py used before features.py."""
+    g = df.groupby('village_id')
+    df['cases_7_day_avg'] = g['reported_cases'].transform(lambda x: x.rolling(CASES_AVG_WINDOW).mean())
+    df['rainfall_3_day_sum'] = g['rainfall_mm'].transform(lambda x: x.rolling(RAIN_SUM_WINDOW).sum())
+    df['cases_7_days_ago'] = g['reported_cases'].shift(CASES_LAG)
+    df['max_cases_next_7_days'] = g['reported_cases'].transform(
+        lambda x: x.rolling(OUTBREAK_HORIZON).max().shift(-OUTBREAK_HORIZON)
+    )
+    return df
+
+
+def vectorized_features(df):
+    bounds = group_bounds(df['village_id'].to_numpy())
+    return add_target(add_features(df, bounds), bounds=bounds)
+
+
+def timed(fn, df):
+    start = time.perf_counter()
+    out = fn(df)
+    return out, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark outbreak feature engineering.")
+    parser.add_argument('--villages', type=int, default=10000)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--legacy-villages', type=int, default=1000,
+                        help="Villages for the (slow) legacy comparison; 0 skips it")
+    args = parser.parse_args()
+
+    print(f"🚀 Building panel: {args.villages} villages x {args.years} years...")
+    panel = make_panel(args.villages, args.years)
+    rows = len(panel)
+
+    _, seconds = timed(vectorized_features, panel.copy())
+    print(f"Vectorized: {rows:,} rows in {seconds:.2f}s ({rows / seconds:,.0f} rows/s)")
+
+    if args.legacy_villages:
+        subset = make_panel(min(args.legacy_villages, args.villages), args.years)
+        fast, fast_s = timed(vectorized_features, subset.copy())
+        slow, slow_s = timed(legacy_features, subset.copy())
+        cols = ['cases_7_day_avg', 'rainfall_3_day_sum', 'cases_7_days_ago', 'max_cases_next_7_days']
+        max_diff = max(
+            np.nanmax(np.abs(fast[c].to_numpy(dtype=float) - slow[c].to_numpy(dtype=float))) for c in cols
+        )
+        same_nans = all((fast[c].isna() == slow[c].isna()).all() for c in cols)
+        print(f"Legacy on {len(subset):,} rows: {slow_s:.2f}s vs vectorized {fast_s:.2f}s "
+              f"({slow_s / fast_s:.1f}x faster)")
+        print(f"Max abs difference: {max_diff:.2e}, identical missing rows: {same_nans}")
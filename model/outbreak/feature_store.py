@@ -0,0 +1,441 @@
+import json
+import math
+import os
+import threading
+from datetime import date
+
+import numpy as np
+
+from features import CASES_AVG_WINDOW, RAIN_SUM_WINDOW, CASES_LAG, SPATIAL_WINDOW
+
+# Rolling windows come from features.py, the same definitions used by
+# train_model.py, so a feature is NaN until enough rows exist for a village.
+
+# The cases ring keeps today plus CASES_LAG previous readings.
+CASES_RING_SIZE = max(CASES_AVG_WINDOW, CASES_LAG + 1)
+# The rain ring also covers the 7-day window of the neighbor aggregates.
+RAIN_RING_SIZE = max(RAIN_SUM_WINDOW, SPATIAL_WINDOW)
+
+# Relative to this file, so the store is found from any working directory (e.g. the gateway)
+DEFAULT_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'feature_store')
+COMPACT_EVERY = 10000  # Journal lines before the snapshot is rewritten
+
+
+class VillageWindow:
+    """
+    Rolling state for one village, kept in fixed-size ring buffers with
+    running sums so that every new daily reading is an O(1) update.
+    """
+    __slots__ = ('cases', 'rain', 'count', 'cases_sum', 'rain_sum', 'rain_week_sum', 'last_date', 'latest', 'version')
+
+    def __init__(self):
+        self.cases = [0.0] * CASES_RING_SIZE
+        self.rain = [0.0] * RAIN_RING_SIZE
+        self.count = 0
+        self.cases_sum = 0.0
+        self.rain_sum = 0.0
+        self.rain_week_sum = 0.0  # Rain over SPATIAL_WINDOW days
+        self.last_date = None
+        self.latest = {}
+        self.version = 0  # Bumped on every update; lets consumers detect changed inputs
+
+    def _dropped(self, ring, window, count):
+        # Value leaving a window of `window` rows when row number `count` arrives.
+        return ring[(count - window) % len(ring)] if count >= window else 0.0
+
+    def push(self, reading_date, cases, rain, reading):
+        """Adds one reading. A reading for the current last date replaces it."""
+        if self.last_date is not None and reading_date < self.last_date:
+            raise ValueError(
+                f"Reading for {reading_date.isoformat()} is older than the latest "
+                f"stored reading ({self.last_date.isoformat()})."
+            )
+
+        if reading_date == self.last_date:
+            # Same-day correction: swap today's values in place.
+            c_idx = (self.count - 1) % CASES_RING_SIZE
+            r_idx = (self.count - 1) % RAIN_RING_SIZE
+            self.cases_sum += cases - self.cases[c_idx]
+            self.rain_sum += rain - self.rain[r_idx]
+            self.rain_week_sum += rain - self.rain[r_idx]
+            self.cases[c_idx] = cases
+            self.rain[r_idx] = rain
+        else:
+            self.cases_sum += cases - self._dropped(self.cases, CASES_AVG_WINDOW, self.count)
+            self.rain_sum += rain - self._dropped(self.rain, RAIN_SUM_WINDOW, self.count)
+            self.rain_week_sum += rain - self._dropped(self.rain, SPATIAL_WINDOW, self.count)
+            self.cases[self.count % CASES_RING_SIZE] = cases
+            self.rain[self.count % RAIN_RING_SIZE] = rain
+            self.count += 1
+            self.last_date = reading_date
+
+        self.latest.update(reading)
+        self.version += 1
+
+    def rolling_features(self):
+        """Rolling features for the most recent stored reading."""
+        n = self.count
+        return {
+            'cases_7_day_avg': self.cases_sum / CASES_AVG_WINDOW if n >= CASES_AVG_WINDOW else math.nan,
+            'rainfall_3_day_sum': self.rain_sum if n >= RAIN_SUM_WINDOW else math.nan,
+            'cases_7_days_ago': self.cases[(n - 1 - CASES_LAG) % CASES_RING_SIZE] if n > CASES_LAG else math.nan,
+        }
+
+    def preview_features(self, reading_date, cases, rain):
+        """
+        Rolling features as if a reading were appended, without mutating state.
+        A reading for the last stored date is treated as a same-day correction.
+        """
+        n = self.count
+        if reading_date is not None and reading_date == self.last_date:
+            c_idx = (n - 1) % CASES_RING_SIZE
+            r_idx = (n - 1) % RAIN_RING_SIZE
+            cases_sum = self.cases_sum + cases - self.cases[c_idx]
+            rain_sum = self.rain_sum + rain - self.rain[r_idx]
+            ago = self.cases[(n - 1 - CASES_LAG) % CASES_RING_SIZE] if n > CASES_LAG else math.nan
+        else:
+            if reading_date is not None and self.last_date is not None and reading_date < self.last_date:
+                raise ValueError(
+                    f"Reading for {reading_date.isoformat()} is older than the latest "
+                    f"stored reading ({self.last_date.isoformat()})."
+                )
+            cases_sum = self.cases_sum + cases - self._dropped(self.cases, CASES_AVG_WINDOW, n)
+            rain_sum = self.rain_sum + rain - self._dropped(self.rain, RAIN_SUM_WINDOW, n)
+            ago = self.cases[(n - CASES_LAG) % CASES_RING_SIZE] if n >= CASES_LAG else math.nan
+            n += 1
+        return {
+            'cases_7_day_avg': cases_sum / CASES_AVG_WINDOW if n >= CASES_AVG_WINDOW else math.nan,
+            'rainfall_3_day_sum': rain_sum if n >= RAIN_SUM_WINDOW else math.nan,
+            'cases_7_days_ago': ago,
+        }
+
+    def week_sums(self):
+        """(cases, rain) over the last SPATIAL_WINDOW days, NaN until the window is full."""
+        if self.count < SPATIAL_WINDOW:
+            return math.nan, math.nan
+        cases = sum(self.cases[(self.count - 1 - i) % CASES_RING_SIZE] for i in range(SPATIAL_WINDOW))
+        return cases, self.rain_week_sum
+
+    def to_dict(self):
+        return {
+            'cases': self.cases,
+            'rain': self.rain,
+            'count': self.count,
+            'last_date': self.last_date.isoformat() if self.last_date else None,
+            'latest': self.latest,
+            'version': self.version,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        w = cls()
+        w.cases = [float(v) for v in d['cases']]
+        w.count = int(d['count'])
+        rain = [float(v) for v in d['rain']]
+        if len(rain) != RAIN_RING_SIZE:
+            # Snapshot from before the rain ring grew: keep the days it has.
+            kept = min(w.count, len(rain))
+            for i in range(kept):
+                w.rain[(w.count - 1 - i) % RAIN_RING_SIZE] = rain[(w.count - 1 - i) % len(rain)]
+        else:
+            w.rain = rain
+        w.last_date = date.fromisoformat(d['last_date']) if d.get('last_date') else None
+        w.latest = dict(d.get('latest', {}))
+        w.version = int(d.get('version', w.count))
+        # Running sums are rebuilt from the rings so that float drift never persists.
+        w.cases_sum = sum(w.cases[(w.count - 1 - i) % CASES_RING_SIZE] for i in range(min(w.count, CASES_AVG_WINDOW)))
+        w.rain_sum = sum(w.rain[(w.count - 1 - i) % RAIN_RING_SIZE] for i in range(min(w.count, RAIN_SUM_WINDOW)))
+        w.rain_week_sum = sum(w.rain[(w.count - 1 - i) % RAIN_RING_SIZE] for i in range(min(w.count, SPATIAL_WINDOW)))
+        return w
+
+
+def _coordinate(record, key):
+    value = record.get(key)
+    return math.nan if value is None else float(value)
+
+
+def _parse_date(value):
+    if value is None:
+        return None
+    return date.fromisoformat(str(value)[:10])
+
+
+class FeatureStore:
+    """
+    Per-village rolling feature store.
+
+    State lives in memory; every ingested reading is appended to a journal
+    (NDJSON) and the journal is periodically folded into a JSON snapshot, so
+    persistence is also O(1) per update.
+    """
+
+    def __init__(self, store_dir=DEFAULT_STORE_DIR, compact_every=COMPACT_EVERY):
+        self.store_dir = store_dir
+        self.snapshot_path = os.path.join(store_dir, 'snapshot.json')
+        self.journal_path = os.path.join(store_dir, 'journal.ndjson')
+        self.compact_every = compact_every
+        self.villages = {}
+        self._journal_lines = 0
+        self._lock = threading.Lock()
+        # Spatial index over villages with coordinates, plus each indexed
+        # village's 7-day sums as arrays; rebuilt lazily when a village
+        # gains or moves coordinates, otherwise updated in place.
+        self._spatial = None
+        self._week_cases = None
+        self._week_rain = None
+
+    # --- Persistence ---
+    def load(self):
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path) as f:
+                snapshot = json.load(f)
+            self.villages = {vid: VillageWindow.from_dict(d) for vid, d in snapshot['villages'].items()}
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path) as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        self._apply(json.loads(line))
+                        self._journal_lines += 1
+        return self
+
+    def compact(self):
+        """Folds the journal into a fresh snapshot (written atomically)."""
+        with self._lock:
+            self._write_snapshot()
+
+    def _write_snapshot(self):
+        os.makedirs(self.store_dir, exist_ok=True)
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'villages': {vid: w.to_dict() for vid, w in self.villages.items()}}, f)
+        os.replace(tmp_path, self.snapshot_path)
+        open(self.journal_path, 'w').close()
+        self._journal_lines = 0
+
+    # --- Updates ---
+    def _validate(self, readings):
+        """
+        Checks a whole batch against the stored windows before any of it is
+        applied, so a bad reading rejects the batch instead of leaving the
+        readings before it applied. Caller holds the lock.
+        """
+        if not isinstance(readings, list):
+            raise ValueError("Expected a reading or a list of readings.")
+        last_dates = {}
+        for i, reading in enumerate(readings):
+            if not isinstance(reading, dict):
+                raise ValueError(f"Reading {i} is not an object.")
+            village_id = reading.get('village_id')
+            if village_id is None or village_id == '' or not isinstance(village_id, (str, int)):
+                raise ValueError(f"Reading {i} needs a 'village_id'.")
+            try:
+                reading_date = _parse_date(reading.get('date'))
+            except ValueError:
+                raise ValueError(f"Reading {i} for {village_id} has an invalid 'date' (YYYY-MM-DD).") from None
+            if reading_date is None:
+                raise ValueError(f"Reading {i} for {village_id} needs a 'date' (YYYY-MM-DD).")
+            if 'reported_cases' not in reading or 'rainfall_mm' not in reading:
+                raise ValueError(f"Reading {i} for {village_id} needs 'reported_cases' and 'rainfall_mm'.")
+            for key in ('reported_cases', 'rainfall_mm', 'latitude', 'longitude'):
+                value = reading.get(key)
+                if value is None and key in ('latitude', 'longitude'):
+                    continue  # Coordinates are optional
+                try:
+                    finite = math.isfinite(float(value))
+                except (TypeError, ValueError):
+                    finite = False
+                if not finite:
+                    raise ValueError(f"Reading {i} for {village_id}: '{key}' must be a finite number.")
+            window = self.villages.get(village_id)
+            last_date = last_dates.get(village_id, window.last_date if window is not None else None)
+            if last_date is not None and reading_date < last_date:
+                raise ValueError(
+                    f"Reading {i} for {village_id} ({reading_date.isoformat()}) is older than "
+                    f"its latest reading ({last_date.isoformat()})."
+                )
+            last_dates[village_id] = reading_date
+
+    def _apply(self, reading):
+        village_id = reading.get('village_id')
+        if village_id is None or village_id == '':
+            raise ValueError("Each reading needs a 'village_id'.")
+        reading_date = _parse_date(reading.get('date'))
+        if reading_date is None:
+            raise ValueError(f"Reading for {village_id} needs a 'date' (YYYY-MM-DD).")
+        if 'reported_cases' not in reading or 'rainfall_mm' not in reading:
+            raise ValueError(f"Reading for {village_id} needs 'reported_cases' and 'rainfall_mm'.")
+
+        window = self.villages.get(village_id)
+        if window is None:
+            window = self.villages[village_id] = VillageWindow()
+        coords = (window.latest.get('latitude'), window.latest.get('longitude'))
+        window.push(reading_date, float(reading['reported_cases']), float(reading['rainfall_mm']), reading)
+
+        if self._spatial is not None:
+            if coords != (window.latest.get('latitude'), window.latest.get('longitude')):
+                self._spatial = None
+            elif village_id in self._spatial.position:
+                pos = self._spatial.position[village_id]
+                self._week_cases[pos], self._week_rain[pos] = window.week_sums()
+
+    def ingest(self, readings):
+        """
+        Applies a list of daily readings (sorted per village by date) and
+        journals them. The batch is all or nothing: if any reading is
+        invalid, ValueError is raised and none are applied. Returns the
+        number of readings applied.
+        """
+        if isinstance(readings, dict):
+            readings = [readings]
+        with self._lock:
+            self._validate(readings)
+            os.makedirs(self.store_dir, exist_ok=True)
+            applied = []
+            try:
+                for reading in readings:
+                    self._apply(reading)
+                    applied.append(reading)
+            finally:
+                # Whatever was applied in memory must also be on disk.
+                if applied:
+                    with open(self.journal_path, 'a') as f:
+                        f.writelines(json.dumps(r, default=str) + '\n' for r in applied)
+                    self._journal_lines += len(applied)
+            if self._journal_lines >= self.compact_every:
+                self._write_snapshot()
+        return len(applied)
+
+    # --- Lookups ---
+    def __contains__(self, village_id):
+        return village_id in self.villages
+
+    def __len__(self):
+        return len(self.villages)
+
+    def versions(self):
+        """Current input version of every village."""
+        with self._lock:
+            return {vid: w.version for vid, w in self.villages.items()}
+
+    def features_for(self, data):
+        """
+        Builds a full prediction row for a known village.
+
+        'data' needs only a 'village_id'. If it also carries today's reading
+        ('reported_cases' and 'rainfall_mm', optional 'date'), the rolling
+        windows are evaluated as if that reading were appended, without storing
+        it. Otherwise the latest ingested reading is used.
+        """
+        village_id = data['village_id']
+        with self._lock:
+            window = self.villages[village_id]
+            row = dict(window.latest)
+            row.update(data)
+            if 'reported_cases' in data and 'rainfall_mm' in data:
+                reading_date = _parse_date(data.get('date'))
+                rolling = window.preview_features(
+                    reading_date,
+                    float(data['reported_cases']),
+                    float(data['rainfall_mm']),
+                )
+                history_days = window.count + (0 if reading_date == window.last_date else 1)
+            else:
+                rolling = window.rolling_features()
+                history_days = window.count
+        # Client-supplied rolling values still win, as before.
+        for key, value in rolling.items():
+            if key not in data:
+                row[key] = value
+        row['history_days'] = history_days
+        return row
+
+
+    # --- Spatial Aggregates ---
+    def _spatial_index(self):
+        # Caller holds the lock.
+        if self._spatial is None:
+            from spatial import SpatialIndex
+
+            located = [
+                (vid, w) for vid, w in self.villages.items()
+                if w.latest.get('latitude') is not None and w.latest.get('longitude') is not None
+            ]
+            self._spatial = SpatialIndex(
+                [vid for vid, _ in located],
+                [float(w.latest['latitude']) for _, w in located],
+                [float(w.latest['longitude']) for _, w in located],
+            )
+            sums = np.array([w.week_sums() for _, w in located], dtype=float).reshape(-1, 2)
+            self._week_cases, self._week_rain = sums[:, 0].copy(), sums[:, 1].copy()
+        return self._spatial
+
+    def add_neighbor_features(self, records, radius_km):
+        """
+        Fills SPATIAL_FEATURES (see features.add_spatial_features) into each
+        record that has latitude/longitude, from the latest ingested readings
+        of the stored villages within radius_km. Records without coordinates
+        are left unchanged (the model sees missing values).
+        """
+        lat = np.array([_coordinate(r, 'latitude') for r in records])
+        lon = np.array([_coordinate(r, 'longitude') for r in records])
+        located = np.flatnonzero(~np.isnan(lat) & ~np.isnan(lon))
+        if not len(located):
+            return records
+
+        with self._lock:
+            index = self._spatial_index()
+            if not len(index):
+                return records
+            within = index.within(lat[located], lon[located], radius_km)
+            week_cases, week_rain = self._week_cases.copy(), self._week_rain.copy()
+
+        own = np.array([index.position.get(records[i].get('village_id'), -1) for i in located])
+        is_own = own >= 0
+        cases = np.nan_to_num(week_cases)
+        rain_valid = (~np.isnan(week_rain)).astype(float)
+
+        count = np.asarray(within.sum(axis=1)).ravel() - is_own
+        neighbor_cases = within @ cases - np.where(is_own, cases[own], 0.0)
+        rain_sum = within @ np.nan_to_num(week_rain)
+        rain_count = within @ rain_valid
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rain_avg = rain_sum / (rain_count * SPATIAL_WINDOW)
+
+        for j, i in enumerate(located):
+            record = records[i]
+            record.setdefault('neighbor_count', float(count[j]))
+            record.setdefault('neighbor_cases_7_day_sum', float(neighbor_cases[j]))
+            record.setdefault('neighbor_rainfall_7_day_avg', float(rain_avg[j]))
+        return records
+
+
+def seed_from_history(store, csv_path):
+    """Replays a historical CSV (e.g. data/historical_data.csv) into the store."""
+    import pandas as pd
+
+    df = pd.read_csv(csv_path)
+    df = df.sort_values(by=['village_id', 'date']).reset_index(drop=True)
+    store.ingest(df.to_dict(orient='records'))
+    store.compact()
+    return len(df)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manage the outbreak rolling feature store.")
+    parser.add_argument('--store', default=DEFAULT_STORE_DIR, help="Feature store directory")
+    parser.add_argument('--seed', help="Historical CSV to replay into the store")
+    parser.add_argument('--compact', action='store_true', help="Fold the journal into the snapshot")
+    args = parser.parse_args()
+
+    store = FeatureStore(args.store).load()
+    if args.seed:
+        n = seed_from_history(store, args.seed)
+        print(f"✅ Seeded {n} readings for {len(store)} villages into '{args.store}'.")
+    elif args.compact:
+        store.compact()
+        print(f"✅ Compacted feature store for {len(store)} villages.")
+    else:
+        print(f"Feature store '{args.store}' holds {len(store)} villages.")
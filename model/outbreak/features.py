@@ -0,0 +1,286 @@
+import numpy as np
+import pandas as pd
+
+# --- Shared Feature Definitions ---
+# One module for training (train_model.py), data generation (generate_data.py),
+# batch scoring and serving (app.py, feature_store.py).
+
+FEATURES = [
+    'reported_cases', 'turbidity_ntu', 'ph_level', 'rainfall_mm',
+    'e_coli_present', 'population_density', 'proximity_to_river',
+    'cases_7_day_avg', 'rainfall_3_day_sum', 'cases_7_days_ago'
+]
+TARGET = 'outbreak_in_next_7_days'
+OUTBREAK_THRESHOLD = 15
+
+# Windows are counted in rows (daily readings) per village.
+CASES_AVG_WINDOW = 7
+RAIN_SUM_WINDOW = 3
+CASES_LAG = 7
+OUTBREAK_HORIZON = 7
+# Neighbor aggregates (opt-in, see add_spatial_features). A village's
+# neighbors are the other villages within the model's radius.
+SPATIAL_FEATURES = ['neighbor_count', 'neighbor_cases_7_day_sum', 'neighbor_rainfall_7_day_avg']
+SPATIAL_WINDOW = 7
+SPATIAL_BLOCK_CELLS = 1 << 21  # villages x dates cells per aggregation panel (16 MB of float64)
+COORDINATE_COLUMNS = ['latitude', 'longitude']
+
+# Days of earlier history needed before a row's features are complete
+FEATURE_LOOKBACK_DAYS = max(CASES_AVG_WINDOW, RAIN_SUM_WINDOW, CASES_LAG, SPATIAL_WINDOW)
+
+# Rolling features that fall back to today's value when a caller omits them
+ROLLING_DEFAULTS = {
+    'cases_7_day_avg': 'reported_cases',
+    'rainfall_3_day_sum': 'rainfall_mm',
+}
+
+
+# --- Grouped Rolling Primitives ---
+# All of these work on a flat array sorted by (group, date) and on the
+# per-row group bounds from group_bounds(). They are plain NumPy operations,
+# with no per-group Python calls.
+
+def group_bounds(keys):
+    """
+    Returns (row_start, row_end): for every row, the index of the first and
+    last row of its group. 'keys' must already be sorted so groups are contiguous.
+    """
+    codes = pd.factorize(np.asarray(keys))[0]
+    n = len(codes)
+    is_start = np.empty(n, dtype=bool)
+    if n:
+        is_start[0] = True
+        np.not_equal(codes[1:], codes[:-1], out=is_start[1:])
+    starts = np.flatnonzero(is_start)
+    ends = np.r_[starts[1:], n] - 1
+    lengths = ends - starts + 1
+    return np.repeat(starts, lengths), np.repeat(ends, lengths)
+
+
+def _rolling_reduce(values, row_start, window, reduce):
+    # Combines the window as `window` shifted contiguous slices, which is much
+    # faster than reducing a strided sliding_window_view along a short axis.
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    out = values.copy()
+    for lag in range(1, window):
+        reduce(out[lag:], values[:n - lag], out=out[lag:])
+    incomplete = np.arange(n) - (window - 1) < row_start
+    out[incomplete] = np.nan
+    return out
+
+
+def rolling_sum(values, row_start, window):
+    """Same as groupby(...).transform(lambda x: x.rolling(window).sum())."""
+    return _rolling_reduce(values, row_start, window, np.add)
+
+
+def rolling_mean(values, row_start, window):
+    """Same as groupby(...).transform(lambda x: x.rolling(window).mean())."""
+    return rolling_sum(values, row_start, window) / window
+
+
+def rolling_max(values, row_start, window):
+    """Same as groupby(...).transform(lambda x: x.rolling(window).max())."""
+    return _rolling_reduce(values, row_start, window, np.maximum)
+
+
+def group_shift(values, row_start, row_end, periods):
+    """Same as groupby(...).shift(periods), for positive or negative periods."""
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    src = np.arange(n) - periods
+    valid = (src >= row_start) & (src <= row_end)
+    np.clip(src, 0, max(n - 1, 0), out=src)
+    return np.where(valid, values[src], np.nan)
+
+
+# --- Training / Backtest Frames ---
+
+def sort_panel(df):
+    """Sorts by village and date, skipping the sort when already in order."""
+    village = df['village_id']
+    if village.is_monotonic_increasing:
+        codes = pd.factorize(village)[0]
+        same_village = codes[1:] == codes[:-1]
+        dates = df['date'].to_numpy()
+        if np.all(dates[1:][same_village] > dates[:-1][same_village]):
+            return df.reset_index(drop=True)
+    return df.sort_values(by=['village_id', 'date']).reset_index(drop=True)
+
+
+def add_features(df, bounds=None):
+    """
+    Adds the rolling model features to a per-village daily panel.
+    'df' must be sorted by village_id and date (see sort_panel); 'bounds'
+    may pass in a precomputed group_bounds() result.
+    """
+    row_start, row_end = bounds or group_bounds(df['village_id'].to_numpy())
+    cases = df['reported_cases'].to_numpy(dtype=float)
+    df['cases_7_day_avg'] = rolling_mean(cases, row_start, CASES_AVG_WINDOW)
+    df['rainfall_3_day_sum'] = rolling_sum(df['rainfall_mm'].to_numpy(dtype=float), row_start, RAIN_SUM_WINDOW)
+    df['cases_7_days_ago'] = group_shift(cases, row_start, row_end, CASES_LAG)
+    return df
+
+
+def add_target(df, threshold=OUTBREAK_THRESHOLD, bounds=None):
+    """
+    Adds 'max_cases_next_7_days' and the binary target. The last
+    OUTBREAK_HORIZON rows of every village have no label (NaN max).
+    """
+    row_start, row_end = bounds or group_bounds(df['village_id'].to_numpy())
+    cases = df['reported_cases'].to_numpy(dtype=float)
+    future_max = group_shift(rolling_max(cases, row_start, OUTBREAK_HORIZON), row_start, row_end, -OUTBREAK_HORIZON)
+    df['max_cases_next_7_days'] = future_max
+    df[TARGET] = (future_max > threshold).astype(int)
+    return df
+
+
+def add_spatial_features(df, radius_km, bounds=None):
+    """
+    Adds the SPATIAL_FEATURES for every (village, date) row of a sorted panel:
+
+    neighbor_count              - villages within radius_km
+    neighbor_cases_7_day_sum    - their reported cases over the last 7 days
+    neighbor_rainfall_7_day_avg - mean daily rainfall over the last 7 days,
+                                  across the village and its neighbors
+
+    Villages without a full 7-day window on a date do not contribute to it.
+    The neighbor graph comes from a KD-tree (spatial.py); aggregation is a
+    sparse (villages x villages) by dense (villages x dates) product, done
+    in blocks of dates so memory stays at SPATIAL_BLOCK_CELLS per panel
+    however long the history is.
+    """
+    from spatial import neighbor_graph
+
+    row_start, _ = bounds or group_bounds(df['village_id'].to_numpy())
+    village_codes, villages = pd.factorize(df['village_id'])
+    date_codes, dates = pd.factorize(df['date'])
+    first_rows = np.unique(row_start)
+    adjacency = neighbor_graph(df['latitude'].to_numpy()[first_rows], df['longitude'].to_numpy()[first_rows], radius_km)
+
+    cases = rolling_sum(df['reported_cases'].to_numpy(dtype=float), row_start, SPATIAL_WINDOW)
+    rain = rolling_sum(df['rainfall_mm'].to_numpy(dtype=float), row_start, SPATIAL_WINDOW)
+    rain_valid = ~np.isnan(rain)
+    cases, rain = np.nan_to_num(cases), np.nan_to_num(rain)
+
+    # Rows grouped by date, so each block of dates is one contiguous slice
+    by_date = np.argsort(date_codes, kind='stable')
+    date_start = np.concatenate(([0], np.cumsum(np.bincount(date_codes, minlength=len(dates)))))
+    block = max(1, SPATIAL_BLOCK_CELLS // max(len(villages), 1))
+
+    neighbor_cases = np.empty(len(df))
+    rain_avg = np.empty(len(df))
+    for first in range(0, len(dates), block):
+        last = min(first + block, len(dates))
+        rows = by_date[date_start[first]:date_start[last]]
+        v, d = village_codes[rows], date_codes[rows] - first
+
+        def panel(values):
+            # Villages without a reading on a date contribute nothing to it
+            grid = np.zeros((len(villages), last - first))
+            grid[v, d] = values
+            return grid
+
+        rain_panel, valid_panel = panel(rain[rows]), panel(rain_valid[rows])
+        neighbor_cases[rows] = (adjacency @ panel(cases[rows]))[v, d]
+        rain_sum = (adjacency @ rain_panel)[v, d] + rain[rows]
+        rain_count = (adjacency @ valid_panel)[v, d] + rain_valid[rows]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rain_avg[rows] = rain_sum / (rain_count * SPATIAL_WINDOW)
+
+    df['neighbor_count'] = np.asarray(adjacency.sum(axis=1)).ravel()[village_codes]
+    df['neighbor_cases_7_day_sum'] = neighbor_cases
+    df['neighbor_rainfall_7_day_avg'] = rain_avg
+    return df
+
+
+def prepare_training_frame(df, threshold=OUTBREAK_THRESHOLD, spatial_radius_km=None):
+    """
+    Sorts, builds features and target, and drops rows without full history.
+    With 'spatial_radius_km' the neighbor aggregates are added as well
+    (the frame then needs latitude/longitude columns).
+    """
+    df = sort_panel(df)
+    bounds = group_bounds(df['village_id'].to_numpy())
+    df = add_features(df, bounds)
+    if spatial_radius_km:
+        df = add_spatial_features(df, spatial_radius_km, bounds)
+    df = add_target(df, threshold, bounds)
+    return df.dropna().reset_index(drop=True)
+
+
+# --- Serving ---
+
+def build_feature_matrix(records, features=FEATURES):
+    """
+    Builds the model feature matrix for many readings in one vectorized step.
+    'records' is a list of reading dictionaries (one per village).
+    Keys are resolved per record, exactly as feature_row does: a reading
+    scores the same alone and in a batch whatever keys the others carry.
+    """
+    df = pd.DataFrame.from_records(records)
+    n = len(records)
+    X = np.zeros((n, len(features)))
+
+    def supplied(col):
+        """Which records carry 'col' (None if none do)."""
+        if col not in df.columns:
+            return None
+        return np.fromiter((col in r for r in records), dtype=bool, count=n)
+
+    for i, col in enumerate(features):
+        filled = np.zeros(n, dtype=bool)
+        for source in (col, ROLLING_DEFAULTS.get(col)):
+            mask = supplied(source) if source else None
+            if mask is None:
+                continue
+            take = mask & ~filled
+            if take.any():
+                # None becomes NaN: rolling features without enough history stay missing, as in training
+                X[take, i] = df[source].to_numpy()[take].astype(float)
+            filled |= mask
+    return pd.DataFrame(X, columns=list(features))
+
+
+def feature_row(record, features=FEATURES):
+    """
+    build_feature_matrix for a single reading, as a (1, features) float32
+    array built without pandas (the compiled-trees fast path of /predict).
+    """
+    row = np.empty((1, len(features)), dtype=np.float32)
+    for i, col in enumerate(features):
+        if col in record:
+            value = record[col]
+        elif ROLLING_DEFAULTS.get(col) in record:
+            value = record[ROLLING_DEFAULTS[col]]
+        else:
+            value = 0
+        row[0, i] = np.nan if value is None else float(value)
+    return row
+
+
+def scenario_matrix(base_row, grid=None, scale=None):
+    """
+    Expands one feature row into the full cartesian product of what-if axes.
+
+    grid  - {feature: [values]}: the feature is set to each value
+    scale - {feature: [multipliers]}: the base value is multiplied by each one
+
+    Returns (matrix, axes): a DataFrame with one row per combination, in
+    C order over the axes, and the list of (feature, mode, values) axes.
+    """
+    axes = [(f, 'set', list(v)) for f, v in (grid or {}).items()]
+    axes += [(f, 'scale', list(v)) for f, v in (scale or {}).items()]
+    base = base_row.to_numpy(dtype=float).reshape(-1)
+    if not axes:
+        return pd.DataFrame(base[None, :], columns=base_row.columns), axes
+
+    mesh = np.meshgrid(*[np.asarray(values, dtype=float) for _, _, values in axes], indexing='ij')
+    n = mesh[0].size
+    X = np.repeat(base[None, :], n, axis=0)
+    position = {name: i for i, name in enumerate(base_row.columns)}
+    for (feature, mode, _), points in zip(axes, mesh):
+        col = position[feature]
+        X[:, col] = points.ravel() if mode == 'set' else base[col] * points.ravel()
+    return pd.DataFrame(X, columns=base_row.columns), axes
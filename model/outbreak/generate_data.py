@@ -1,71 +1,202 @@
-import pandas as pd
-import numpy as np
+import argparse
 import os
+import time
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
 
-print("🚀 Starting FINAL synthetic data generation with advanced features...")
+from features import RAIN_SUM_WINDOW, rolling_sum
 
 # --- Configuration ---
 NUM_VILLAGES = 20
+NUM_YEARS = 1
 START_DATE = '2024-01-01'
-END_DATE = '2024-12-31'
+SEED = 42
+CHUNK_VILLAGES = 500  # Villages generated (and held in memory) per chunk
+# Villages are scattered uniformly over a square around REGION_CENTER whose
+# size grows with the village count, so neighbor density stays constant.
+REGION_CENTER = (25.5, 93.0)  # (latitude, longitude), Northeast India
+VILLAGES_PER_KM2 = 0.05
 OUTPUT_FOLDER = 'data'
 OUTPUT_FILE = os.path.join(OUTPUT_FOLDER, 'historical_data.csv')
+HISTORY_DIR = os.path.join(OUTPUT_FOLDER, 'history')
+
+COLUMNS = [
+    'date', 'village_id', 'latitude', 'longitude', 'population_density', 'proximity_to_river',
+    'reported_cases', 'turbidity_ntu', 'ph_level', 'rainfall_mm', 'e_coli_present'
+]
+
+
+def village_name(index):
+    """Village_A ... Village_Z, Village_AA, Village_AB, ... (spreadsheet style)."""
+    letters = ''
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(65 + rem) + letters
+    return f'Village_{letters}'
+
 
-# --- Create Village-specific static features ---
-villages_data = {
-    'village_id': [f'Village_{chr(65+i)}' for i in range(NUM_VILLAGES)],
+def date_range_for(start_date, years):
+    start = pd.Timestamp(start_date)
+    end = start + pd.DateOffset(years=years) - pd.Timedelta(days=1)
+    return pd.date_range(start=start, end=end, freq='D')
+
+
+def village_coordinates(num_villages, total_villages, seed, chunk_index):
+    """
+    Random village locations. They come from their own random stream so that
+    adding them did not change any of the other simulated columns.
+    """
+    rng = np.random.default_rng([seed, chunk_index, 1])
+    half_side_km = np.sqrt(total_villages / VILLAGES_PER_KM2) / 2
+    lat0, lon0 = REGION_CENTER
+    dlat = half_side_km / 111.0
+    dlon = half_side_km / (111.0 * np.cos(np.radians(lat0)))
+    latitude = np.round(rng.uniform(lat0 - dlat, lat0 + dlat, size=num_villages), 5)
+    longitude = np.round(rng.uniform(lon0 - dlon, lon0 + dlon, size=num_villages), 5)
+    return latitude, longitude
+
+
+def generate_chunk(first_village, num_villages, dates, seed, chunk_index, total_villages=None):
+    """
+    Simulates one block of villages as (villages x days) arrays. Every chunk has
+    its own random stream derived from (seed, chunk_index), so the output does
+    not depend on how chunks are spread over worker processes.
+    """
+    rng = np.random.default_rng([seed, chunk_index])
+    v, d = num_villages, len(dates)
+    shape = (v, d)
+
+    # --- Village-specific static features ---
     # Simulate some villages being more dense than others
-    'population_density': np.random.randint(100, 1000, size=NUM_VILLAGES),
+    population_density = rng.integers(100, 1000, size=v)
     # Simulate proximity to a river (lower is closer/riskier)
-    'proximity_to_river': np.round(np.random.uniform(0.1, 5.0, size=NUM_VILLAGES), 1)
-}
-villages_df = pd.DataFrame(villages_data)
-
-# --- Create Time-series Data ---
-date_range = pd.date_range(start=START_DATE, end=END_DATE, freq='D')
-num_days = len(date_range)
-
-df_list = []
-for i, village in villages_df.iterrows():
-    temp_df = pd.DataFrame({'date': date_range})
-    temp_df['village_id'] = village['village_id']
-    temp_df['population_density'] = village['population_density']
-    temp_df['proximity_to_river'] = village['proximity_to_river']
-    df_list.append(temp_df)
-
-df = pd.concat(df_list, ignore_index=True)
-num_records = len(df)
-
-# --- Generate Base Measurements ---
-df['reported_cases'] = np.random.randint(0, 3, size=num_records)
-df['turbidity_ntu'] = np.round(np.random.uniform(1.0, 5.0, size=num_records), 2)
-df['ph_level'] = np.round(np.random.uniform(6.8, 7.8, size=num_records), 2)
-df['rainfall_mm'] = np.round(np.abs(np.random.normal(2, 5, size=num_records)), 2)
-df['e_coli_present'] = np.zeros(num_records, dtype=int)
-
-# --- Create Probabilistic Outbreak Events ---
-print("Simulating probabilistic outbreak events using all risk factors...")
-is_monsoon = (df['date'].dt.month >= 6) & (df['date'].dt.month <= 9)
-recent_heavy_rain = df.groupby('village_id')['rainfall_mm'].transform(lambda x: x.rolling(window=3).sum()) > 50
-
-# Propensity now includes the new features
-propensity = 0.05
-propensity += is_monsoon * 0.15
-propensity += recent_heavy_rain * 0.25
-propensity += (df['population_density'] / 1000) * 0.10 # Denser areas have higher risk
-propensity -= (df['proximity_to_river'] / 5) * 0.10     # Closer to river (lower value) increases risk
-
-is_outbreak_event = np.random.rand(num_records) < propensity
-
-df.loc[is_outbreak_event, 'reported_cases'] += np.random.randint(15, 30, size=is_outbreak_event.sum())
-df.loc[is_outbreak_event, 'e_coli_present'] = 1
-df.loc[is_outbreak_event, 'turbidity_ntu'] += np.random.uniform(5, 15, size=is_outbreak_event.sum())
-
-df['turbidity_ntu'] += np.random.normal(0, 0.5, size=num_records)
-numeric_cols = df.select_dtypes(include=np.number).columns
-df[numeric_cols] = df[numeric_cols].clip(lower=0)
-
-# --- Save to CSV ---
-os.makedirs(OUTPUT_FOLDER, exist_ok=True)
-df.to_csv(OUTPUT_FILE, index=False)
-print(f"\n✅ Final synthetic data saved to '{OUTPUT_FILE}'!")
\ No newline at end of file
+    proximity_to_river = np.round(rng.uniform(0.1, 5.0, size=v), 1)
+
+    # --- Generate Base Measurements ---
+    reported_cases = rng.integers(0, 3, size=shape)
+    turbidity_ntu = np.round(rng.uniform(1.0, 5.0, size=shape), 2)
+    ph_level = np.round(rng.uniform(6.8, 7.8, size=shape), 2)
+    rainfall_mm = np.round(np.abs(rng.normal(2, 5, size=shape)), 2)
+    e_coli_present = np.zeros(shape, dtype=int)
+
+    # --- Create Probabilistic Outbreak Events ---
+    is_monsoon = np.asarray((dates.month >= 6) & (dates.month <= 9))[None, :]
+    row_start = np.repeat(np.arange(v) * d, d)
+    recent_heavy_rain = (rolling_sum(rainfall_mm.ravel(), row_start, RAIN_SUM_WINDOW) > 50).reshape(shape)
+
+    propensity = 0.05
+    propensity = propensity + is_monsoon * 0.15
+    propensity = propensity + recent_heavy_rain * 0.25
+    propensity = propensity + (population_density[:, None] / 1000) * 0.10  # Denser areas have higher risk
+    propensity = propensity - (proximity_to_river[:, None] / 5) * 0.10     # Closer to river (lower value) increases risk
+
+    is_outbreak_event = rng.random(size=shape) < propensity
+    n_events = int(is_outbreak_event.sum())
+
+    reported_cases[is_outbreak_event] += rng.integers(15, 30, size=n_events)
+    e_coli_present[is_outbreak_event] = 1
+    turbidity_ntu[is_outbreak_event] += rng.uniform(5, 15, size=n_events)
+    turbidity_ntu += rng.normal(0, 0.5, size=shape)
+
+    latitude, longitude = village_coordinates(v, total_villages or v, seed, chunk_index)
+
+    names = np.array([village_name(i) for i in range(first_village, first_village + v)])
+    df = pd.DataFrame({
+        'date': np.tile(dates.values, v),
+        'village_id': pd.Categorical(np.repeat(names, d), categories=names),
+        'latitude': np.repeat(latitude, d),
+        'longitude': np.repeat(longitude, d),
+        'population_density': np.repeat(population_density, d),
+        'proximity_to_river': np.repeat(proximity_to_river, d),
+        'reported_cases': reported_cases.ravel(),
+        'turbidity_ntu': turbidity_ntu.ravel(),
+        'ph_level': ph_level.ravel(),
+        'rainfall_mm': rainfall_mm.ravel(),
+        'e_coli_present': e_coli_present.ravel(),
+    }, columns=COLUMNS)
+    numeric_cols = df.select_dtypes(include=np.number).columns
+    df[numeric_cols] = df[numeric_cols].clip(lower=0)
+    return df
+
+
+def _chunk_frame(task):
+    return generate_chunk(*task)
+
+
+def _chunk_csv(task):
+    df = _chunk_frame(task)
+    return df.to_csv(index=False, header=(task[4] == 0), date_format='%Y-%m-%d'), len(df)
+
+
+def _waves(tasks, fn, workers):
+    """Runs 'fn' over tasks, 'workers' at a time, yielding results in order."""
+    pool = Pool(workers) if workers > 1 else None
+    try:
+        for wave in range(0, len(tasks), max(workers, 1)):
+            batch = tasks[wave:wave + max(workers, 1)]
+            yield from (pool.map(fn, batch) if pool else [fn(t) for t in batch])
+            print(f"  {min(wave + len(batch), len(tasks))}/{len(tasks)} chunks done")
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+
+def generate(num_villages, years, start_date, seed, output, chunk_villages=CHUNK_VILLAGES, workers=1,
+             output_format='csv'):
+    """
+    Writes the panel chunk by chunk. At most 'workers' chunks are in memory at
+    once, so the dataset size is bounded only by disk space. 'parquet' writes a
+    partitioned dataset directory (see history_store.py) instead of a CSV file.
+    """
+    dates = date_range_for(start_date, years)
+    tasks = [
+        (first, min(chunk_villages, num_villages - first), dates, seed, i, num_villages)
+        for i, first in enumerate(range(0, num_villages, chunk_villages))
+    ]
+    rows = 0
+
+    if output_format == 'parquet':
+        from history_store import write_partitioned
+
+        def frames():
+            nonlocal rows
+            for df in _waves(tasks, _chunk_frame, workers):
+                rows += len(df)
+                yield df
+
+        write_partitioned(frames(), output)
+        return rows
+
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', newline='') as f:
+        for text, n in _waves(tasks, _chunk_csv, workers):
+            f.write(text)
+            rows += n
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate synthetic outbreak history.")
+    parser.add_argument('--villages', type=int, default=NUM_VILLAGES)
+    parser.add_argument('--years', type=int, default=NUM_YEARS)
+    parser.add_argument('--start-date', default=START_DATE)
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--chunk-villages', type=int, default=CHUNK_VILLAGES,
+                        help="Villages per chunk; bounds memory and fixes the random streams")
+    parser.add_argument('--workers', type=int, default=1, help="Processes generating chunks in parallel")
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv',
+                        help="'parquet' writes a partitioned dataset directory")
+    parser.add_argument('--out', default=None, help=f"Output path (default {OUTPUT_FILE} or {HISTORY_DIR})")
+    args = parser.parse_args()
+    args.out = args.out or (HISTORY_DIR if args.format == 'parquet' else OUTPUT_FILE)
+
+    print("🚀 Starting FINAL synthetic data generation with advanced features...")
+    print(f"Simulating {args.villages} villages x {args.years} year(s) from {args.start_date} (seed {args.seed})...")
+    start = time.perf_counter()
+    rows = generate(args.villages, args.years, args.start_date, args.seed, args.out,
+                    args.chunk_villages, args.workers, args.format)
+    print(f"\n✅ Final synthetic data ({rows:,} rows) saved to '{args.out}' in {time.perf_counter() - start:.1f}s!")
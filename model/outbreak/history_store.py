@@ -0,0 +1,188 @@
+import os
+import zlib
+
+import numpy as np
+import pandas as pd
+
+# --- Partitioned Columnar Storage for Historical Data ---
+# Parquet dataset partitioned by month and village group (hive layout, e.g.
+# data/history/month=202407/village_group=3/part-0.parquet), with compact
+# dtypes. Loading supports column projection and predicate pushdown, so a
+# retrain or backtest only reads the months / villages / columns it needs.
+# pyarrow is only needed for the Parquet path; CSV keeps working without it.
+
+HISTORY_DIR = 'data/history'
+NUM_VILLAGE_GROUPS = 16
+CSV_CHUNK_ROWS = 1_000_000
+
+HISTORY_DTYPES = {
+    'latitude': 'float32',       # Optional: older histories have no coordinates
+    'longitude': 'float32',
+    'population_density': 'uint16',
+    'proximity_to_river': 'float32',
+    'reported_cases': 'uint16',
+    'turbidity_ntu': 'float32',
+    'ph_level': 'float32',
+    'rainfall_mm': 'float32',
+    'e_coli_present': 'uint8',
+}
+PARTITION_COLUMNS = ['month', 'village_group']
+
+
+def _arrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+    except ImportError as e:
+        raise ImportError("Parquet history needs pyarrow: pip install pyarrow") from e
+    return pa, ds
+
+
+OPTIONAL_COLUMNS = {'latitude', 'longitude'}
+
+
+def _schema(pa, columns):
+    fields = [
+        pa.field('date', pa.timestamp('s')),
+        pa.field('village_id', pa.dictionary(pa.int32(), pa.string())),
+    ]
+    fields += [pa.field(col, pa.from_numpy_dtype(np.dtype(HISTORY_DTYPES[col]))) for col in columns]
+    fields += [pa.field('month', pa.int32()), pa.field('village_group', pa.int16())]
+    return pa.schema(fields)
+
+
+def village_groups(village_ids, num_groups=NUM_VILLAGE_GROUPS):
+    """Stable village -> group mapping (CRC32 of the id), hashed once per unique id."""
+    codes, uniques = pd.factorize(np.asarray(village_ids))
+    groups = np.array([zlib.crc32(str(v).encode()) % num_groups for v in uniques], dtype=np.int16)
+    return groups[codes]
+
+
+def month_key(dates):
+    dates = pd.DatetimeIndex(dates)
+    return (dates.year * 100 + dates.month).to_numpy(dtype=np.int32)
+
+
+def compact_frame(df):
+    """Casts a raw history frame to compact dtypes and adds the partition keys."""
+    out = pd.DataFrame({
+        'date': pd.to_datetime(df['date']).astype('datetime64[s]'),
+        'village_id': df['village_id'].astype('category'),
+    })
+    for col, dtype in HISTORY_DTYPES.items():
+        if col in df.columns or col not in OPTIONAL_COLUMNS:
+            out[col] = df[col].astype(dtype)
+    out['month'] = month_key(out['date'])
+    out['village_group'] = village_groups(out['village_id'])
+    return out
+
+
+def write_partitioned(frames, out_dir=HISTORY_DIR):
+    """
+    Streams an iterable of raw history DataFrames into one partitioned Parquet
+    dataset. Only one frame is converted at a time.
+    """
+    pa, ds = _arrow()
+    frames = iter(frames)
+    first = compact_frame(next(frames))
+    schema = _schema(pa, [c for c in HISTORY_DTYPES if c in first.columns])
+
+    def batches():
+        frame = first
+        while frame is not None:
+            yield from pa.Table.from_pandas(frame, schema=schema, preserve_index=False).to_batches()
+            raw = next(frames, None)
+            frame = compact_frame(raw) if raw is not None else None
+
+    ds.write_dataset(
+        batches(), out_dir, schema=schema, format='parquet',
+        partitioning=ds.partitioning(pa.schema([schema.field(c) for c in PARTITION_COLUMNS]), flavor='hive'),
+        existing_data_behavior='delete_matching',
+        max_open_files=4096, min_rows_per_group=1 << 16, max_rows_per_group=1 << 20,
+    )
+
+
+def convert_csv(csv_path, out_dir=HISTORY_DIR, chunk_rows=CSV_CHUNK_ROWS):
+    """One-shot converter from the legacy CSV, read in bounded chunks."""
+    rows = 0
+
+    def chunks():
+        nonlocal rows
+        for chunk in pd.read_csv(csv_path, chunksize=chunk_rows):
+            rows += len(chunk)
+            yield chunk
+
+    write_partitioned(chunks(), out_dir)
+    return rows
+
+
+def load_history(path, columns=None, start=None, end=None, villages=None):
+    """
+    Loads historical readings from a CSV file or a partitioned Parquet dataset.
+
+    columns  - only these columns are read ('date' and 'village_id' are always kept);
+               OPTIONAL_COLUMNS the data does not have are left out
+    start/end - inclusive date bounds; prune whole month partitions
+    villages - only these village ids; prunes village_group partitions
+    """
+    if columns is not None:
+        columns = list(dict.fromkeys(['date', 'village_id', *columns]))
+
+    if os.path.isfile(path):
+        if columns is not None:
+            header = set(pd.read_csv(path, nrows=0).columns)
+            columns = [c for c in columns if c in header or c not in OPTIONAL_COLUMNS]
+        df = pd.read_csv(path, usecols=columns, parse_dates=['date'])
+        if start is not None:
+            df = df[df['date'] >= pd.Timestamp(start)]
+        if end is not None:
+            df = df[df['date'] <= pd.Timestamp(end)]
+        if villages is not None:
+            df = df[df['village_id'].isin(villages)]
+        return df.reset_index(drop=True)
+
+    pa, ds = _arrow()
+    dataset = ds.dataset(path, format='parquet', partitioning='hive')
+    predicate = None
+
+    def _and(expr):
+        return expr if predicate is None else predicate & expr
+
+    if start is not None:
+        start = pd.Timestamp(start)
+        predicate = _and((ds.field('month') >= int(month_key([start])[0])) &
+                         (ds.field('date') >= pa.scalar(start.to_pydatetime(), pa.timestamp('s'))))
+    if end is not None:
+        end = pd.Timestamp(end)
+        predicate = _and((ds.field('month') <= int(month_key([end])[0])) &
+                         (ds.field('date') <= pa.scalar(end.to_pydatetime(), pa.timestamp('s'))))
+    if villages is not None:
+        villages = list(villages)
+        groups = sorted(set(village_groups(villages).tolist()))
+        predicate = _and(ds.field('village_group').isin(groups) & ds.field('village_id').isin(villages))
+
+    if columns is not None:
+        columns = [c for c in columns if c in dataset.schema.names or c not in OPTIONAL_COLUMNS]
+    read_columns = columns or [c for c in dataset.schema.names if c not in PARTITION_COLUMNS]
+    table = dataset.to_table(columns=read_columns, filter=predicate).unify_dictionaries()
+    df = table.to_pandas()
+    # Dictionaries come back in file order; sort the categories so that
+    # sorting by village_id matches sorting the plain strings.
+    villages_cat = df['village_id'].cat
+    df['village_id'] = villages_cat.reorder_categories(sorted(villages_cat.categories))
+    return df
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Convert outbreak history CSV to partitioned Parquet.")
+    parser.add_argument('--csv', default='data/historical_data.csv')
+    parser.add_argument('--out', default=HISTORY_DIR)
+    parser.add_argument('--chunk-rows', type=int, default=CSV_CHUNK_ROWS)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    n = convert_csv(args.csv, args.out, args.chunk_rows)
+    print(f"✅ Converted {n:,} rows from '{args.csv}' to '{args.out}' in {time.perf_counter() - start:.1f}s.")
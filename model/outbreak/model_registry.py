@@ -0,0 +1,339 @@
+import os
+import shutil
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import json
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from features import FEATURES, build_feature_matrix
+
+# --- Versioned Model Registry ---
+# model/registry/<version>/outbreak_predictor.pkl, plus an ACTIVE file naming
+# the version to serve. Models are loaded and warmed up off the request path
+# and then swapped in with a single reference assignment, so requests never
+# see a half-loaded model and no restart is needed after a retrain.
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model')
+REGISTRY_DIR = os.path.join(MODEL_DIR, 'registry')
+MODEL_FILENAME = 'outbreak_predictor.pkl'
+ACTIVE_FILE = 'ACTIVE'
+LEGACY_MODEL_FILE = os.path.join(MODEL_DIR, MODEL_FILENAME)
+WARMUP_BATCH_SIZES = (1, 64, 1024)
+SHADOW_WINDOW = 1000  # Recent shadow comparisons kept for latency percentiles
+SHADOW_QUEUE_LIMIT = 64  # Pending shadow comparisons; requests beyond this skip (and count) theirs
+# TREE_ENGINE=1 scores small batches with the compiled NumPy trees (model/tree_engine.py)
+TREE_ENGINE = os.environ.get('TREE_ENGINE', '0') == '1'
+VERIFY_ROWS = 1024  # Synthetic rows the compiled trees must reproduce before serving
+
+
+def synthetic_readings(n, seed=0):
+    """Plausible daily readings used to warm up a freshly loaded model."""
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            'reported_cases': int(c), 'turbidity_ntu': float(t), 'ph_level': float(p),
+            'rainfall_mm': float(r), 'e_coli_present': int(e), 'population_density': int(d),
+            'proximity_to_river': float(x), 'cases_7_day_avg': float(a),
+            'rainfall_3_day_sum': float(s), 'cases_7_days_ago': int(g),
+        }
+        for c, t, p, r, e, d, x, a, s, g in zip(
+            rng.integers(0, 30, n), rng.uniform(1, 20, n), rng.uniform(6.8, 7.8, n),
+            rng.uniform(0, 20, n), rng.integers(0, 2, n), rng.integers(100, 1000, n),
+            rng.uniform(0.1, 5, n), rng.uniform(0, 20, n), rng.uniform(0, 60, n), rng.integers(0, 30, n),
+        )
+    ]
+
+
+def warm_up(model, features=FEATURES, batch_sizes=WARMUP_BATCH_SIZES):
+    """Runs synthetic batches through the full serving path; returns seconds spent."""
+    start = time.perf_counter()
+    for size in batch_sizes:
+        model.predict_proba(build_feature_matrix(synthetic_readings(size), features))
+    return time.perf_counter() - start
+
+
+def import_tree_engine():
+    # Shared by the model services; lives one level up in model/
+    model_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if model_root not in sys.path:
+        sys.path.append(model_root)
+    import tree_engine
+    return tree_engine
+
+
+def compile_trees(model, features):
+    """
+    Compiled trees for an XGBoost model, checked against it on synthetic
+    readings. Returns None (serve with XGBoost) if it cannot be compiled.
+    """
+    try:
+        trees = import_tree_engine().CompiledTrees.from_booster(model.get_booster())
+        X = build_feature_matrix(synthetic_readings(VERIFY_ROWS, seed=1), features)
+        trees.verify(model.predict_proba(X), X.to_numpy(np.float32))
+        return trees
+    except Exception as e:
+        print(f"Compiled trees unavailable, serving with XGBoost: {e}")
+        return None
+
+
+def model_features(model):
+    """Feature columns a model was trained on (FEATURES for older models)."""
+    names = getattr(model, 'feature_names_in_', None)
+    return list(names) if names is not None else list(FEATURES)
+
+
+def load_model_meta(model_path):
+    """The .meta.json sidecar written by train_model.py, or {} if there is none."""
+    path = os.path.splitext(model_path)[0] + '.meta.json'
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+class ModelHandle:
+    """A loaded, warmed-up model and its metadata. Never mutated after creation."""
+
+    def __init__(self, model, version, path, load_seconds, warmup_seconds, meta=None, compiled=None):
+        self.model = model
+        self.compiled = compiled  # CompiledTrees for small batches, or None
+        self.version = version
+        self.path = path
+        self.load_seconds = load_seconds
+        self.warmup_seconds = warmup_seconds
+        self.loaded_at = pd.Timestamp.now(tz='Asia/Kolkata').isoformat()
+        self.features = model_features(model)
+        # Radius of the neighbor aggregates, for models trained with them
+        self.spatial_radius_km = (meta or {}).get('spatial_radius_km')
+        self.compiled_max_rows = import_tree_engine().SMALL_BATCH_ROWS if compiled is not None else 0
+
+    def predict_proba(self, features):
+        """'features' is a DataFrame in self.features order or, with compiled trees, an array."""
+        if self.compiled is not None and len(features) <= self.compiled_max_rows:
+            return self.compiled.predict_proba(np.asarray(features, dtype=np.float32))
+        return self.model.predict_proba(features)
+
+    def info(self):
+        return {
+            'version': self.version,
+            'loaded_at': self.loaded_at,
+            'load_seconds': round(self.load_seconds, 4),
+            'warmup_seconds': round(self.warmup_seconds, 4),
+            'spatial_radius_km': self.spatial_radius_km,
+            'tree_engine': self.compiled is not None,
+        }
+
+
+class ShadowStats:
+    """Running comparison of the shadow model against the active one."""
+
+    def __init__(self, version):
+        self.version = version
+        self.count = 0
+        self.sum_abs_diff = 0.0
+        self.max_abs_diff = 0.0
+        self.disagreements = 0
+        self.dropped = 0  # Requests not compared because the shadow queue was full
+        self.primary_ms = deque(maxlen=SHADOW_WINDOW)
+        self.shadow_ms = deque(maxlen=SHADOW_WINDOW)
+        self._lock = threading.Lock()
+
+    def record(self, primary, shadow, primary_ms, shadow_ms):
+        diff = np.abs(primary - shadow)
+        with self._lock:
+            self.count += len(diff)
+            self.sum_abs_diff += float(diff.sum())
+            self.max_abs_diff = max(self.max_abs_diff, float(diff.max(initial=0.0)))
+            self.disagreements += int(np.sum((primary >= 0.5) != (shadow >= 0.5)))
+            self.primary_ms.append(primary_ms)
+            self.shadow_ms.append(shadow_ms)
+
+    def record_dropped(self):
+        with self._lock:
+            self.dropped += 1
+
+    def summary(self):
+        with self._lock:
+            def pct(values, q):
+                return round(float(np.percentile(values, q)), 3) if values else None
+            return {
+                'version': self.version,
+                'rows_compared': self.count,
+                'mean_abs_diff': self.sum_abs_diff / self.count if self.count else None,
+                'max_abs_diff': self.max_abs_diff,
+                'decision_disagreements': self.disagreements,
+                'comparisons_dropped': self.dropped,
+                'primary_latency_ms': {'p50': pct(self.primary_ms, 50), 'p95': pct(self.primary_ms, 95)},
+                'shadow_latency_ms': {'p50': pct(self.shadow_ms, 50), 'p95': pct(self.shadow_ms, 95)},
+            }
+
+
+def load_handle(path, version):
+    """Loads and warms up one model file."""
+    start = time.perf_counter()
+    model = joblib.load(path)
+    load_seconds = time.perf_counter() - start
+    features = model_features(model)
+    warmup_seconds = warm_up(model, features)
+    compiled = compile_trees(model, features) if TREE_ENGINE else None
+    return ModelHandle(model, version, path, load_seconds, warmup_seconds, load_model_meta(path), compiled)
+
+
+class ModelRegistry:
+    def __init__(self, root=REGISTRY_DIR, legacy_path=LEGACY_MODEL_FILE):
+        self.root = root
+        self.legacy_path = legacy_path
+        self.current = None  # Active ModelHandle; swapped atomically
+        self.shadow = None   # Optional ModelHandle scored alongside, off the request path
+        self.shadow_stats = None
+        self._swap_lock = threading.Lock()
+        self._shadow_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='shadow')
+        self._shadow_slots = threading.BoundedSemaphore(SHADOW_QUEUE_LIMIT)
+        self._watcher = None
+
+    # --- Registry Layout ---
+    def _model_path(self, version):
+        """Path of a published version; any other name (e.g. '../x') is refused before a path is built."""
+        if not isinstance(version, str):
+            raise FileNotFoundError(f"Model version {version!r} not found")
+        if version.startswith('legacy'):
+            return self.legacy_path
+        if version not in self.versions():
+            raise FileNotFoundError(f"Model version '{version}' not found in {self.root}")
+        return os.path.join(self.root, version, MODEL_FILENAME)
+
+    def versions(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(v for v in os.listdir(self.root) if os.path.isfile(os.path.join(self.root, v, MODEL_FILENAME)))
+
+    def active_version(self):
+        """Version named in the ACTIVE file, else the newest published one, else the legacy model."""
+        active_path = os.path.join(self.root, ACTIVE_FILE)
+        if os.path.exists(active_path):
+            with open(active_path) as f:
+                version = f.read().strip()
+            if version:
+                return version
+        versions = self.versions()
+        if versions:
+            return versions[-1]
+        if os.path.exists(self.legacy_path):
+            from risk_table import model_file_version
+            return f'legacy-{model_file_version(self.legacy_path)}'
+        return None
+
+    def publish(self, model_path, version=None):
+        """Copies a trained model into the registry under a new version."""
+        version = version or time.strftime('%Y%m%d-%H%M%S')
+        target_dir = os.path.join(self.root, version)
+        os.makedirs(target_dir, exist_ok=True)
+        shutil.copy2(model_path, os.path.join(target_dir, MODEL_FILENAME))
+        meta_path = os.path.splitext(model_path)[0] + '.meta.json'
+        if os.path.exists(meta_path):
+            shutil.copy2(meta_path, os.path.join(target_dir, os.path.splitext(MODEL_FILENAME)[0] + '.meta.json'))
+        return version
+
+    def set_active(self, version):
+        """Atomically points the ACTIVE file at 'version'; watchers swap to it."""
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = os.path.join(self.root, ACTIVE_FILE + '.tmp')
+        with open(tmp_path, 'w') as f:
+            f.write(version)
+        os.replace(tmp_path, os.path.join(self.root, ACTIVE_FILE))
+
+    # --- Loading and Swapping ---
+    def load(self, version):
+        path = self._model_path(version)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Model version '{version}' not found at {path}")
+        return load_handle(path, version)
+
+    def activate(self, version=None, persist=True):
+        """
+        Loads and warms up 'version' (default: the ACTIVE one) before swapping it
+        in. Requests in flight keep the handle they already hold.
+        """
+        version = version or self.active_version()
+        if version is None:
+            return None
+        if self.current is not None and self.current.version == version:
+            return self.current
+        handle = self.load(version)
+        with self._swap_lock:
+            self.current = handle
+            if persist and not version.startswith('legacy'):
+                self.set_active(version)
+        print(f"Model {version} active (load {handle.load_seconds:.3f}s, warm-up {handle.warmup_seconds:.3f}s).")
+        return handle
+
+    # --- Shadow Scoring ---
+    def set_shadow(self, version):
+        if version is None:
+            self.shadow, self.shadow_stats = None, None
+            return None
+        handle = self.load(version)
+        self.shadow, self.shadow_stats = handle, ShadowStats(version)
+        return handle
+
+    def score_shadow(self, features_df, primary_proba, primary_ms, columns=None):
+        """
+        Queues a shadow comparison; never blocks or fails the live request.
+        An array 'features_df' (the compiled-trees path) needs its 'columns'.
+        At most SHADOW_QUEUE_LIMIT comparisons wait at once, so a shadow
+        slower than the traffic drops comparisons instead of queueing
+        requests' features without bound.
+        """
+        shadow, stats = self.shadow, self.shadow_stats
+        if shadow is None:
+            return
+        if not self._shadow_slots.acquire(blocking=False):
+            stats.record_dropped()
+            return
+
+        def compare():
+            nonlocal features_df
+            try:
+                if columns is not None:
+                    features_df = pd.DataFrame(features_df, columns=columns)
+                start = time.perf_counter()
+                # The shadow may use other features; ones the primary lacks are missing
+                shadow_proba = shadow.predict_proba(features_df.reindex(columns=shadow.features))[:, 1]
+                stats.record(primary_proba, shadow_proba, primary_ms, (time.perf_counter() - start) * 1000)
+            except Exception as e:
+                print(f"Shadow scoring failed for {shadow.version}: {e}")
+            finally:
+                self._shadow_slots.release()
+
+        self._shadow_pool.submit(compare)
+
+    # --- File Watcher ---
+    def watch(self, interval, on_swap=None):
+        """
+        Polls the ACTIVE file so every worker process follows a swap, then
+        calls 'on_swap(handle)' (e.g. to rescore the risk table).
+        """
+        if self._watcher is not None or interval <= 0:
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    version = self.active_version()
+                    if version and (self.current is None or version != self.current.version):
+                        handle = self.activate(version, persist=False)
+                        if on_swap is not None:
+                            on_swap(handle)
+                except Exception as e:
+                    print(f"Model watcher could not activate a new version: {e}")
+
+        self._watcher = threading.Thread(target=loop, name='model-watcher', daemon=True)
+        self._watcher.start()
@@ -0,0 +1,157 @@
+import csv
+import hashlib
+import json
+import os
+import threading
+
+from features import FEATURES, build_feature_matrix
+
+# --- Precomputed Village Risk Table ---
+# A batch job scores villages from the feature store and keeps one row per
+# village (village, district, date, probability, model version). The
+# dashboard reads it from memory; the model is only run when a village's
+# inputs (feature store version) or the model version change.
+
+RISK_TABLE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'risk_table.csv')
+COLUMNS = ['village_id', 'district', 'date', 'outbreak_risk_probability', 'model_version', 'input_version']
+
+
+def model_file_version(path):
+    """Short content hash of a model artifact, used as its version."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+class RiskTable:
+    def __init__(self, path=RISK_TABLE_FILE):
+        self.path = path
+        self.entries = {}
+        self.by_district = {}
+        self._json = {}           # village_id -> serialized entry
+        self._district_json = {}  # district -> serialized list, built lazily
+        self._lock = threading.Lock()
+
+    # --- Persistence ---
+    def load(self):
+        if os.path.exists(self.path):
+            with open(self.path, newline='') as f:
+                rows = list(csv.DictReader(f))
+            for row in rows:
+                row['outbreak_risk_probability'] = float(row['outbreak_risk_probability'])
+                row['input_version'] = int(row['input_version'])
+                row['district'] = row['district'] or None
+            self._update(rows)
+        return self
+
+    def save(self):
+        with self._lock:
+            rows = list(self.entries.values())
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+        os.replace(tmp_path, self.path)
+
+    # --- Read Path ---
+    def __len__(self):
+        return len(self.entries)
+
+    def get_json(self, village_id):
+        """Serialized entry for one village, or None."""
+        return self._json.get(village_id)
+
+    def district_json(self, district=None):
+        """Serialized list of entries for a district (all villages when None)."""
+        cached = self._district_json.get(district)
+        if cached is None:
+            with self._lock:
+                ids = self.entries if district is None else self.by_district.get(district, ())
+                cached = '[' + ','.join(self._json[v] for v in sorted(ids)) + ']'
+                self._district_json[district] = cached
+        return cached
+
+    # --- Write Path ---
+    def _update(self, rows):
+        with self._lock:
+            for row in rows:
+                vid = row['village_id']
+                old = self.entries.get(vid)
+                if old is not None and old['district'] != row['district']:
+                    self.by_district.get(old['district'], set()).discard(vid)
+                self.entries[vid] = row
+                self.by_district.setdefault(row['district'], set()).add(vid)
+                self._json[vid] = json.dumps({k: row[k] for k in COLUMNS if k != 'input_version'})
+            self._district_json = {}
+
+    def stale_villages(self, store, model_version):
+        """Villages whose inputs or model changed since they were last scored."""
+        versions = store.versions()
+        stale = []
+        for vid, version in versions.items():
+            entry = self.entries.get(vid)
+            if entry is None or entry['input_version'] != version or entry['model_version'] != model_version:
+                stale.append(vid)
+        return stale
+
+    def rescore(self, model, model_version, store, villages=None):
+        """
+        Scores the given villages (default: all stale ones) from the feature
+        store with one predict_proba call. Returns the number rescored.
+        """
+        if villages is None:
+            villages = self.stale_villages(store, model_version)
+        villages = [v for v in villages if v in store]
+        if not villages:
+            return 0
+
+        # Versions are read before the features so a concurrent ingest marks
+        # the village stale again rather than being lost.
+        versions = store.versions()
+        records = [store.features_for({'village_id': v}) for v in villages]
+        spatial_radius_km = getattr(model, 'spatial_radius_km', None)
+        if spatial_radius_km:
+            store.add_neighbor_features(records, spatial_radius_km)
+        features = getattr(model, 'features', None) or FEATURES
+        probabilities = model.predict_proba(build_feature_matrix(records, features))[:, 1]
+
+        rows = []
+        for vid, record, p in zip(villages, records, probabilities.tolist()):
+            rows.append({
+                'village_id': vid,
+                'district': record.get('district'),
+                'date': str(record.get('date', ''))[:10],
+                'outbreak_risk_probability': p,
+                'model_version': model_version,
+                'input_version': versions[vid],
+            })
+        self._update(rows)
+        return len(rows)
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    from feature_store import DEFAULT_STORE_DIR, FeatureStore
+    from model_registry import load_handle
+
+    parser = argparse.ArgumentParser(description="Rescore villages whose inputs changed and write the risk table.")
+    parser.add_argument('--model', default='model/outbreak_predictor.pkl')
+    parser.add_argument('--store', default=DEFAULT_STORE_DIR)
+    parser.add_argument('--out', default=RISK_TABLE_FILE)
+    parser.add_argument('--full', action='store_true', help="Rescore every village")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    store = FeatureStore(args.store).load()
+    table = RiskTable(args.out).load()
+    version = model_file_version(args.model)
+    villages = list(store.villages) if args.full else None
+    n = table.rescore(load_handle(args.model, version), version, store, villages)
+    table.save()
+    print(f"✅ Rescored {n} of {len(store)} villages (model {version}) in {time.perf_counter() - start:.2f}s.")
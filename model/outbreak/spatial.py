@@ -0,0 +1,61 @@
+import numpy as np
+from scipy import sparse
+from scipy.spatial import cKDTree
+
+# --- Spatial Index over Village Coordinates ---
+# Villages are placed on the unit sphere (3D points) and indexed with a
+# KD-tree, so "within R km" is an exact great-circle test with no projection
+# distortion. Building the tree is O(n log n) and a radius query costs
+# O(log n + neighbors), so neighbor aggregates over 100k villages never need
+# the O(n^2) pairwise distance table.
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def to_unit_xyz(latitude, longitude):
+    lat = np.radians(np.asarray(latitude, dtype=float))
+    lon = np.radians(np.asarray(longitude, dtype=float))
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+
+def chord_radius(radius_km):
+    """Straight-line distance between two points on the unit sphere radius_km apart."""
+    return 2 * np.sin(radius_km / (2 * EARTH_RADIUS_KM))
+
+
+def neighbor_graph(latitude, longitude, radius_km):
+    """
+    Sparse (n x n) 0/1 matrix with a 1 for every pair of distinct points at
+    most radius_km apart. Multiplying it by a per-village vector sums that
+    vector over each village's neighbors.
+    """
+    n = len(latitude)
+    tree = cKDTree(to_unit_xyz(latitude, longitude))
+    pairs = tree.query_pairs(chord_radius(radius_km), output_type='ndarray')
+    rows = np.concatenate([pairs[:, 0], pairs[:, 1]])
+    cols = np.concatenate([pairs[:, 1], pairs[:, 0]])
+    return sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(n, n))
+
+
+class SpatialIndex:
+    """KD-tree over a fixed set of village coordinates, for radius queries."""
+
+    def __init__(self, village_ids, latitude, longitude):
+        self.village_ids = list(village_ids)
+        self.position = {vid: i for i, vid in enumerate(self.village_ids)}
+        self.tree = cKDTree(to_unit_xyz(latitude, longitude))
+
+    def __len__(self):
+        return len(self.village_ids)
+
+    def within(self, latitude, longitude, radius_km):
+        """
+        Sparse (queries x villages) 0/1 matrix of the indexed villages within
+        radius_km of each query point (a village matches its own coordinates).
+        """
+        hits = self.tree.query_ball_point(to_unit_xyz(latitude, longitude), chord_radius(radius_km))
+        lengths = np.fromiter((len(h) for h in hits), dtype=np.int64, count=len(hits))
+        indptr = np.r_[0, np.cumsum(lengths)]
+        indices = np.concatenate(hits).astype(np.int64) if indptr[-1] else np.empty(0, dtype=np.int64)
+        return sparse.csr_matrix((np.ones(len(indices)), indices, indptr), shape=(len(hits), len(self)))
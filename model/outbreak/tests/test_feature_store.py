@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from feature_store import FeatureStore  # noqa: E402
+
+
+@pytest.mark.parametrize('value', ['nan', float('nan'), float('inf'), '-inf'])
+def test_rejects_non_finite_numbers(tmp_path, value):
+    store = FeatureStore(store_dir=str(tmp_path))
+    reading = {'village_id': 'Village_A', 'date': '2024-06-01', 'reported_cases': 3, 'rainfall_mm': value}
+    with pytest.raises(ValueError, match='finite'):
+        store.ingest(reading)
+    assert 'Village_A' not in store.villages
+
+
+def test_accepts_village_id_zero(tmp_path):
+    store = FeatureStore(store_dir=str(tmp_path))
+    store.ingest({'village_id': 0, 'date': '2024-06-01', 'reported_cases': 3, 'rainfall_mm': 1.5})
+    assert 0 in store.villages
@@ -0,0 +1,36 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from features import build_feature_matrix, feature_row  # noqa: E402
+
+# Readings with different key sets: some omit features others supply, one
+# relies on the rolling fallbacks, one is empty and one has explicit nulls.
+MIXED_RECORDS = [
+    {'reported_cases': 5, 'rainfall_mm': 2.0, 'cases_7_day_avg': 3.0, 'turbidity_ntu': 4, 'e_coli_present': 1},
+    {'reported_cases': 9, 'rainfall_mm': None},
+    {},
+    {'turbidity_ntu': '2.5', 'cases_7_day_avg': None, 'population_density': 1200},
+]
+
+
+def test_batch_matches_single_rows():
+    batch = build_feature_matrix(MIXED_RECORDS).to_numpy()
+    for i, record in enumerate(MIXED_RECORDS):
+        alone = build_feature_matrix([record]).to_numpy()[0]
+        np.testing.assert_array_equal(batch[i], alone)
+        np.testing.assert_array_equal(batch[i], feature_row(record)[0].astype(float))
+
+
+def test_missing_keys_are_zero_per_record():
+    X = build_feature_matrix(MIXED_RECORDS)
+    # Supplied by the first record only: the others get 0, not NaN
+    assert X['e_coli_present'].tolist() == [1, 0, 0, 0]
+    assert X['population_density'].tolist() == [0, 0, 0, 1200]
+    # Rolling features fall back to today's value, an explicit null stays missing
+    assert X['cases_7_day_avg'].iloc[1] == 9
+    assert np.isnan(X['cases_7_day_avg'].iloc[3])
+    assert np.isnan(X['rainfall_3_day_sum'].iloc[1])
@@ -0,0 +1,35 @@
+import json
+import os
+import sys
+
+import pandas as pd
+
+OUTBREAK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, OUTBREAK_DIR)
+
+import train_model  # noqa: E402
+
+DATA_FILE = os.path.join(OUTBREAK_DIR, 'data', 'historical_data.csv')
+
+
+def _run(*argv):
+    return train_model.main(train_model.build_parser().parse_args(['--data', DATA_FILE, '--n-jobs', '1', *argv]))
+
+
+def test_one_new_labeled_day_adds_trees(tmp_path):
+    out = str(tmp_path / 'model.pkl')
+    _run('--out', out, '--end', '2024-11-30')
+    with open(train_model.meta_path(out)) as f:
+        before = json.load(f)
+
+    # One more raw day labels exactly one more day (the label looks
+    # OUTBREAK_HORIZON days ahead); never fall back to a full retrain.
+    trained_through = pd.Timestamp(before['trained_through'])
+    end = trained_through + pd.Timedelta(days=train_model.OUTBREAK_HORIZON + 1)
+    _run('--out', out, '--end', str(end.date()), '--incremental', '--no-fallback')
+    with open(train_model.meta_path(out)) as f:
+        after = json.load(f)
+
+    assert pd.Timestamp(after['trained_through']) == trained_through + pd.Timedelta(days=1)
+    assert after['rounds'] == before['rounds'] + train_model.INCREMENTAL_ROUNDS
+    assert after['incremental_updates'] == before.get('incremental_updates', 0) + 1
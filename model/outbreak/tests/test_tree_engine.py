@@ -0,0 +1,71 @@
+import os
+import sys
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+MODEL_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, MODEL_ROOT)
+
+from tree_engine import CompiledTrees  # noqa: E402
+
+# Every XGBoost model shipped in the repo (the waterborne pipeline's
+# classifier sits behind a StandardScaler, so it is fed scaled rows).
+BUNDLED_MODELS = [
+    'outbreak/model/outbreak_predictor.pkl',
+    'water_quality/water_quality_model_xgb_classifier.pkl',
+    'waterborne-disease-predictor/models/disease_model.pkl',
+]
+ROWS = 500
+ATOL = 1e-6  # A couple of float32 ulps of a probability
+
+
+def _classifier(path):
+    model = joblib.load(os.path.join(MODEL_ROOT, path))
+    return model.steps[-1][1] if hasattr(model, 'steps') else model
+
+
+def _split_nodes(trees):
+    return np.flatnonzero(trees.left != np.arange(len(trees.left)))
+
+
+def _random_rows(trees, n_features, rng):
+    """Rows spread over the range of each feature's split thresholds."""
+    splits = _split_nodes(trees)
+    low = np.zeros(n_features, dtype=np.float32)
+    high = np.ones(n_features, dtype=np.float32)
+    for f in range(n_features):
+        values = trees.threshold[splits][trees.feature[splits] == f]
+        if len(values):
+            low[f], high[f] = values.min() - 1, values.max() + 1
+    return rng.uniform(low, high, size=(ROWS, n_features)).astype(np.float32)
+
+
+def _edge_rows(trees, base, rng):
+    """Rows with one feature exactly on a split threshold or one float32 step below it."""
+    splits = rng.choice(_split_nodes(trees), size=ROWS // 2)
+    rows = base[rng.integers(0, len(base), size=2 * len(splits))].copy()
+    at, below = rows[:len(splits)], rows[len(splits):]
+    at[np.arange(len(splits)), trees.feature[splits]] = trees.threshold[splits]
+    below[np.arange(len(splits)), trees.feature[splits]] = np.nextafter(
+        trees.threshold[splits], np.float32(-np.inf))
+    return rows
+
+
+@pytest.mark.parametrize('path', BUNDLED_MODELS)
+def test_compiled_trees_match_booster(path):
+    clf = _classifier(path)
+    trees = CompiledTrees.from_booster(clf.get_booster())
+    n_features = clf.n_features_in_
+    rng = np.random.default_rng(0)
+
+    random_rows = _random_rows(trees, n_features, rng)
+    nan_rows = random_rows.copy()
+    nan_rows[rng.random(nan_rows.shape) < 0.3] = np.nan
+    nan_rows[0] = np.nan  # Every value missing
+    X = np.vstack([random_rows, nan_rows, _edge_rows(trees, random_rows, rng)])
+
+    reference = clf.predict_proba(pd.DataFrame(X, columns=clf.get_booster().feature_names))
+    assert trees.verify(reference, X, atol=ATOL) <= ATOL
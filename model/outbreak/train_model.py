@@ -1,80 +1,461 @@
-import pandas as pd
-import xgboost as xgb
-from sklearn.model_selection import train_test_split, GridSearchCV
-from sklearn.metrics import classification_report, make_scorer, recall_score
-import joblib
+import argparse
+import json
+import math
 import os
+import time
 
-print("🚀 Starting FINAL model training with Hyperparameter Tuning...")
+import joblib
+import numpy as np
+import xgboost as xgb
+from joblib import Parallel, delayed
+from sklearn.metrics import classification_report
+
+import pandas as pd
+
+from features import (
+    FEATURES, SPATIAL_FEATURES, COORDINATE_COLUMNS, TARGET, OUTBREAK_HORIZON, FEATURE_LOOKBACK_DAYS,
+    prepare_training_frame,
+)
+from history_store import load_history
 
 # --- Configuration ---
 DATA_FILE = 'data/historical_data.csv'
 MODEL_OUTPUT_FILE = 'model/outbreak_predictor.pkl'
 
-# --- 1. Load Data ---
-df = pd.read_csv(DATA_FILE, parse_dates=['date'])
+BASE_PARAMS = {
+    'objective': 'binary:logistic',
+    'base_score': 0.5,
+    'subsample': 0.8,
+    'colsample_bytree': 0.8,
+    'tree_method': 'hist',
+    'eval_metric': 'aucpr',
+}
 
-# --- 2. Feature Engineering ---
-print("Step 2: Performing feature engineering...")
-df = df.sort_values(by=['village_id', 'date']).reset_index(drop=True)
-df['cases_7_day_avg'] = df.groupby('village_id')['reported_cases'].transform(lambda x: x.rolling(7).mean())
-df['rainfall_3_day_sum'] = df.groupby('village_id')['rainfall_mm'].transform(lambda x: x.rolling(3).sum())
-df['cases_7_days_ago'] = df.groupby('village_id')['reported_cases'].shift(7)
+# Searched on top of BASE_PARAMS. The number of trees is no longer a grid
+# axis: it is the boosting budget, cut short by early stopping.
+PARAM_GRID = {
+    'max_depth': [5, 6],
+    'learning_rate': [0.05, 0.1],
+    'scale_pos_weight': [1.0, 1.2],  # Multiplier on the class-balance weight
+}
+MAX_ROUNDS = 400
+MIN_ROUNDS = 50
+EARLY_STOPPING_ROUNDS = 25
+HALVING_FACTOR = 2
+DECISION_THRESHOLD = 0.5
 
-# --- 3. Create Target Variable ---
-df['max_cases_next_7_days'] = df.groupby('village_id')['reported_cases'].transform(lambda x: x.rolling(7).max().shift(-7))
-OUTBREAK_THRESHOLD = 15
-df['outbreak_in_next_7_days'] = (df['max_cases_next_7_days'] > OUTBREAK_THRESHOLD).astype(int)
-df = df.dropna().reset_index(drop=True)
+# Incremental (daily) updates
+INCREMENTAL_ROUNDS = 10     # Trees added per update
+HOLDOUT_DAYS = 28           # Latest labeled days held out to gate each update
+RECALL_TOLERANCE = 0.02     # Allowed holdout recall drop vs the current model
+PSI_THRESHOLD = 0.25        # Population stability index that counts as drift
+PSI_BINS = 10
+PSI_MIN_ROWS = 10 * PSI_BINS  # Fewer new rows than this are too noisy to call drift
 
-# --- 4. Model Training Setup ---
-features = [
+# Raw history columns the features are built from
+RAW_COLUMNS = [
     'reported_cases', 'turbidity_ntu', 'ph_level', 'rainfall_mm',
-    'e_coli_present', 'population_density', 'proximity_to_river',
-    'cases_7_day_avg', 'rainfall_3_day_sum', 'cases_7_days_ago'
+    'e_coli_present', 'population_density', 'proximity_to_river'
 ]
-target = 'outbreak_in_next_7_days'
 
-X = df[features]
-y = df[target]
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.25, random_state=42, stratify=y)
 
-# --- 5. Hyperparameter Tuning with GridSearchCV ---
-print("Step 5: Searching for best hyperparameters to maximize RECALL...")
-scale_pos_weight = y_train.value_counts()[0] / y_train.value_counts()[1]
+def training_columns(spatial_radius_km=None):
+    """(raw history columns to load, model features) with or without neighbor aggregates."""
+    if spatial_radius_km:
+        return RAW_COLUMNS + COORDINATE_COLUMNS, FEATURES + SPATIAL_FEATURES
+    return RAW_COLUMNS, FEATURES
 
-# Define the parameter grid to search
-param_grid = {
-    'max_depth': [5, 6],
-    'n_estimators': [300, 400],
-    'learning_rate': [0.05, 0.1],
-    'scale_pos_weight': [scale_pos_weight, scale_pos_weight * 1.2] # Try giving even more weight
-}
 
-# Define the model and the scorer
-xgb_model = xgb.XGBClassifier(objective='binary:logistic', base_score=0.5, subsample=0.8, colsample_bytree=0.8)
-recall_scorer = make_scorer(recall_score)
+# --- Time-ordered Splits ---
 
-grid_search = GridSearchCV(
-    estimator=xgb_model,
-    param_grid=param_grid,
-    scoring=recall_scorer, # <-- Optimize for recall!
-    cv=3, # 3-fold cross-validation
-    verbose=1 # Shows progress
-)
+def time_holdout_split(df, test_fraction=0.25, horizon=OUTBREAK_HORIZON):
+    """
+    Splits on a date cutoff shared by all villages: the last 'test_fraction'
+    of days is held out. Training rows whose 7-day label window overlaps the
+    holdout period are purged, so no future information leaks into training.
+    """
+    dates = np.sort(df['date'].unique())
+    cutoff = dates[int(len(dates) * (1 - test_fraction))]
+    purge_from = cutoff - np.timedelta64(horizon, 'D')
+    train = df[df['date'] < purge_from].reset_index(drop=True)
+    test = df[df['date'] >= cutoff].reset_index(drop=True)
+    return train, test
+
+
+def rolling_origin_folds(dates, n_folds=3, horizon=OUTBREAK_HORIZON):
+    """
+    Rolling-origin cross-validation folds over a date column. Fold k trains on
+    every day before its origin (minus the label horizon) and validates on the
+    next block of days, so each village's series is always split in time order.
+    """
+    dates = np.asarray(dates)
+    unique = np.sort(np.unique(dates))
+    blocks = np.array_split(unique, n_folds + 1)
+    folds = []
+    for block in blocks[1:]:
+        origin = block[0]
+        train_idx = np.flatnonzero(dates < origin - np.timedelta64(horizon, 'D'))
+        valid_idx = np.flatnonzero((dates >= origin) & (dates <= block[-1]))
+        if len(train_idx) and len(valid_idx):
+            folds.append((train_idx, valid_idx))
+    return folds
+
+
+def recall_precision(y_true, proba, threshold=DECISION_THRESHOLD):
+    pred = proba >= threshold
+    tp = np.sum(pred & (y_true == 1))
+    recall = tp / max(np.sum(y_true == 1), 1)
+    precision = tp / max(np.sum(pred), 1)
+    return float(recall), float(precision)
+
+
+# --- Hyperparameter Search ---
+
+def build_fold_matrices(X, y, folds, features=FEATURES):
+    """Builds each fold's XGBoost matrices once; every candidate reuses them."""
+    matrices = []
+    for train_idx, valid_idx in folds:
+        dtrain = xgb.QuantileDMatrix(X[train_idx], y[train_idx], feature_names=features)
+        dvalid = xgb.QuantileDMatrix(X[valid_idx], y[valid_idx], ref=dtrain, feature_names=features)
+        matrices.append((dtrain, dvalid, y[valid_idx]))
+    return matrices
+
+
+def candidate_grid(class_weight):
+    keys = list(PARAM_GRID)
+    combos = np.array(np.meshgrid(*[PARAM_GRID[k] for k in keys], indexing='ij')).reshape(len(keys), -1).T
+    candidates = []
+    for combo in combos:
+        params = dict(zip(keys, combo.tolist()))
+        params['max_depth'] = int(params['max_depth'])
+        params['scale_pos_weight'] = float(class_weight * params['scale_pos_weight'])
+        candidates.append(params)
+    return candidates
+
+
+def _advance(params, matrices, fold, booster, rounds, nthread):
+    """Boosts one (candidate, fold) pair up to 'rounds' trees, continuing 'booster'."""
+    dtrain, dvalid, y_valid = matrices[fold]
+    done = booster.num_boosted_rounds() if booster is not None else 0
+    stopped = booster is not None and booster.best_iteration + EARLY_STOPPING_ROUNDS < done
+    if rounds > done and not stopped:
+        booster = xgb.train(
+            {**BASE_PARAMS, **params, 'nthread': nthread},
+            dtrain,
+            num_boost_round=rounds - done,
+            evals=[(dvalid, 'valid')],
+            early_stopping_rounds=EARLY_STOPPING_ROUNDS,
+            xgb_model=booster,
+            verbose_eval=False,
+        )
+    best = booster.best_iteration + 1
+    proba = booster.predict(dvalid, iteration_range=(0, best))
+    recall, precision = recall_precision(y_valid, proba)
+    return booster, recall, precision, best
+
+
+def successive_halving(matrices, candidates, min_rounds=MIN_ROUNDS, max_rounds=MAX_ROUNDS,
+                       factor=HALVING_FACTOR, n_jobs=-1):
+    """
+    Successive halving over boosting rounds. Every rung trains the surviving
+    candidates on all folds in parallel (threads share the prebuilt matrices;
+    XGBoost releases the GIL), keeps the best 1/factor by mean validation
+    recall and continues their boosters with a larger budget, until one
+    candidate is left or the budget reaches max_rounds.
+    With min_rounds == max_rounds this is a plain grid search with early stopping.
+    """
+    n_cpu = os.cpu_count() or 1
+    boosters = {}
+    survivors = list(range(len(candidates)))
+    rounds = min(min_rounds, max_rounds)
+    while True:
+        tasks = [(c, f) for c in survivors for f in range(len(matrices))]
+        workers = min(len(tasks), n_cpu if n_jobs in (None, -1) else n_jobs)
+        nthread = max(1, n_cpu // workers)
+        results = Parallel(n_jobs=workers, prefer='threads')(
+            delayed(_advance)(candidates[c], matrices, f, boosters.get((c, f)), rounds, nthread)
+            for c, f in tasks
+        )
+        scores = {}
+        for (c, f), (booster, recall, precision, best) in zip(tasks, results):
+            boosters[(c, f)] = booster
+            scores.setdefault(c, []).append((recall, precision, best))
+
+        ranked = sorted(survivors, key=lambda c: (np.mean([s[0] for s in scores[c]]),
+                                                  np.mean([s[1] for s in scores[c]])), reverse=True)
+        print(f"  Rung with {rounds} rounds: {len(survivors)} candidates, "
+              f"best mean recall {np.mean([s[0] for s in scores[ranked[0]]]):.3f}")
+        survivors = ranked[:max(1, math.ceil(len(survivors) / factor))]
+        # A lone survivor has nothing left to be compared against: stop here
+        if rounds >= max_rounds or len(survivors) == 1:
+            best_c = ranked[0]
+            best_rounds = int(np.mean([s[2] for s in scores[best_c]]))
+            return candidates[best_c], best_rounds, scores[best_c]
+        rounds = min(rounds * factor, max_rounds)
+
+
+# --- Model Metadata and Drift ---
+
+def meta_path(model_path):
+    """Sidecar JSON next to the model: training cutoff, parameters, reference distributions."""
+    return os.path.splitext(model_path)[0] + '.meta.json'
+
+
+def load_meta(model_path):
+    path = meta_path(model_path)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_meta(model_path, meta):
+    with open(meta_path(model_path), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+
+def reference_distribution(X, features=FEATURES):
+    """Per-feature quantile bin edges and bin shares of the training data, for PSI."""
+    reference = {}
+    for i, name in enumerate(features):
+        edges = np.unique(np.quantile(X[:, i], np.linspace(0, 1, PSI_BINS + 1)[1:-1]))
+        counts = np.bincount(np.searchsorted(edges, X[:, i], side='right'), minlength=len(edges) + 1)
+        reference[name] = {'edges': edges.tolist(), 'shares': (counts / max(len(X), 1)).tolist()}
+    return reference
+
+
+def population_stability(reference, X, features=FEATURES):
+    """PSI of each feature in X against the stored reference bins."""
+    psi = {}
+    for i, name in enumerate(features):
+        edges = np.asarray(reference[name]['edges'])
+        expected = np.maximum(np.asarray(reference[name]['shares']), 1e-4)
+        counts = np.bincount(np.searchsorted(edges, X[:, i], side='right'), minlength=len(edges) + 1)
+        actual = np.maximum(counts / max(len(X), 1), 1e-4)
+        psi[name] = float(np.sum((actual - expected) * np.log(actual / expected)))
+    return psi
+
+
+# --- Full Retrain ---
+
+def full_retrain(args):
+    print("🚀 Starting FINAL model training with Hyperparameter Tuning...")
+    start = time.perf_counter()
+
+    # --- 1. Load Data (CSV or partitioned Parquet) ---
+    raw_columns, features = training_columns(args.spatial_radius_km)
+    df = load_history(args.data, columns=raw_columns, start=args.start, end=args.end)
+    print(f"Loaded {len(df):,} rows from '{args.data}'.")
+
+    # --- 2. Feature Engineering & 3. Target Variable ---
+    print("Step 2: Performing feature engineering...")
+    if args.spatial_radius_km:
+        missing = [c for c in COORDINATE_COLUMNS if c not in df.columns]
+        if missing:
+            raise SystemExit(f"--spatial-radius-km needs {missing} in '{args.data}' (regenerate with generate_data.py).")
+        print(f"Adding neighbor aggregates within {args.spatial_radius_km} km...")
+    df = prepare_training_frame(df, spatial_radius_km=args.spatial_radius_km)
+
+    # --- 4. Time-ordered Train/Test Split ---
+    train_df, test_df = time_holdout_split(df, args.test_fraction)
+    print(f"Training on {len(train_df)} rows up to {train_df['date'].max().date()}, "
+          f"testing on {len(test_df)} rows from {test_df['date'].min().date()}.")
+    X_train = train_df[features].to_numpy(dtype=np.float32)
+    y_train = train_df[TARGET].to_numpy()
+    class_weight = np.sum(y_train == 0) / max(np.sum(y_train == 1), 1)
+
+    # --- 5. Hyperparameter Tuning on Rolling-origin Folds ---
+    print(f"Step 5: Searching for best hyperparameters to maximize RECALL ({args.tune})...")
+    folds = rolling_origin_folds(train_df['date'].to_numpy(), args.folds)
+    matrices = build_fold_matrices(X_train, y_train, folds, features)
+    candidates = candidate_grid(class_weight)
+    min_rounds = MIN_ROUNDS if args.tune == 'halving' else MAX_ROUNDS
+    best_params, best_rounds, fold_scores = successive_halving(
+        matrices, candidates, min_rounds=min_rounds, n_jobs=args.n_jobs
+    )
+    print("Best parameters found: ", {**best_params, 'n_estimators': best_rounds})
+    print("Validation recall per fold: ", [round(s[0], 3) for s in fold_scores])
+
+    # --- 6. Evaluate the Selected Parameters on the Time Holdout ---
+    print("\nStep 6: Evaluating the FINAL optimized model on the time holdout...")
+    params = {k: v for k, v in BASE_PARAMS.items() if k != 'eval_metric'}
+    holdout_model = xgb.XGBClassifier(**params, **best_params, n_estimators=best_rounds, n_jobs=args.n_jobs)
+    holdout_model.fit(train_df[features], y_train)
+    y_pred = holdout_model.predict(test_df[features])
+    print(classification_report(test_df[TARGET], y_pred))
+    holdout_recall, holdout_precision = recall_precision(
+        test_df[TARGET].to_numpy(), holdout_model.predict_proba(test_df[features])[:, 1]
+    )
+
+    # --- 7. Refit on All Labeled Data and Save ---
+    # The holdout only scores the parameters; the served model also learns
+    # its days, so trained_through is the last labeled date and incremental
+    # updates start after it.
+    print(f"Step 7: Refitting on all {len(df)} labeled rows up to {df['date'].max().date()}...")
+    X_all = df[features].to_numpy(dtype=np.float32)
+    best_model = xgb.XGBClassifier(**params, **best_params, n_estimators=best_rounds, n_jobs=args.n_jobs)
+    best_model.fit(df[features], df[TARGET])
+    os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+    joblib.dump(best_model, args.out)
+    save_meta(args.out, {
+        'trained_through': str(df['date'].max().date()),
+        'params': best_params,
+        'rounds': best_rounds,
+        'holdout_recall': holdout_recall,
+        'holdout_precision': holdout_precision,
+        'incremental_updates': 0,
+        'features': features,
+        'spatial_radius_km': args.spatial_radius_km,
+        'reference': reference_distribution(X_all, features),
+    })
+    print(f"\n✅ Final optimized model saved to '{args.out}' in {time.perf_counter() - start:.1f}s!")
+    return True
+
+
+# --- Incremental Update ---
+
+def incremental_update(args):
+    """
+    Continues boosting the current model on every day labeled since it was
+    trained, instead of searching and refitting on the whole history.
+
+    The gate only uses days the current model has never seen. The newest
+    new days (up to --holdout-days, at most half of them) are held out, a
+    gate model is boosted on the new days before them (purging rows whose
+    label window reaches into the holdout), and the update is accepted only
+    if its holdout recall is within RECALL_TOLERANCE of the current model's
+    and no feature has drifted past PSI_THRESHOLD against the full
+    retrain's data. Each check is skipped when there are too few new days
+    (for a holdout) or rows (PSI_MIN_ROWS) to be meaningful. An accepted update boosts on all new days; a rejected
+    one falls back to a full retrain.
+    """
+    print("🔁 Starting incremental model update...")
+    start = time.perf_counter()
+    meta = load_meta(args.out)
+    if meta is None or not os.path.exists(args.out):
+        print(f"No model metadata at '{meta_path(args.out)}'; running a full retrain instead.")
+        return full_retrain(args)
+
+    # --- 1. Load only the new window (plus the history its features need) ---
+    trained_through = pd.Timestamp(meta['trained_through'])
+    load_from = trained_through - pd.Timedelta(days=FEATURE_LOOKBACK_DAYS)
+    spatial_radius_km = meta.get('spatial_radius_km')
+    raw_columns, features = training_columns(spatial_radius_km)
+    df = load_history(args.data, columns=raw_columns, start=load_from, end=args.end)
+    # Rows without a full label window are dropped here, so every row left is labeled
+    df = prepare_training_frame(df, spatial_radius_km=spatial_radius_km)
+
+    new_df = df[df['date'] > trained_through]
+    if new_df.empty:
+        print(f"Model is up to date (trained through {trained_through.date()}); nothing to add.")
+        return False
+    new_days = np.sort(new_df['date'].unique())
+    latest = pd.Timestamp(new_days[-1])
+    holdout_days = min(args.holdout_days, len(new_days) // 2)
+    holdout_start = pd.Timestamp(new_days[-holdout_days]) if holdout_days else latest + pd.Timedelta(days=1)
+    gate_df = new_df[new_df['date'] < holdout_start - pd.Timedelta(days=OUTBREAK_HORIZON)]
+    holdout_df = new_df[new_df['date'] >= holdout_start]
+    print(f"Updating on {len(new_df)} new rows ({new_df['date'].min().date()} to {latest.date()}).")
+
+    # --- 2. Drift Check ---
+    drifted = {}
+    if len(new_df) < PSI_MIN_ROWS:
+        print(f"Only {len(new_df)} new rows: too few for a drift check.")
+    else:
+        X_new = new_df[features].to_numpy(dtype=np.float32)
+        psi = population_stability(meta['reference'], X_new, features)
+        drifted = {k: round(v, 3) for k, v in psi.items() if v > PSI_THRESHOLD}
+
+    # --- 3. Recall Check on Unseen Days ---
+    current = joblib.load(args.out)
+
+    def boost(rows):
+        model = xgb.XGBClassifier(**current.get_params())
+        model.set_params(n_estimators=args.rounds)
+        model.fit(rows[features], rows[TARGET], xgb_model=current.get_booster())
+        return model
+
+    reasons = []
+    holdout_recall, holdout_precision = meta.get('holdout_recall'), meta.get('holdout_precision')
+    if gate_df.empty:
+        print(f"Only {len(new_days)} new labeled days: too few to hold some out, checking drift only.")
+    else:
+        y_holdout = holdout_df[TARGET].to_numpy()
+        gate = boost(gate_df)
+        old_recall, old_precision = recall_precision(y_holdout, current.predict_proba(holdout_df[features])[:, 1])
+        new_recall, new_precision = recall_precision(y_holdout, gate.predict_proba(holdout_df[features])[:, 1])
+        print(f"Gating on {len(holdout_df)} holdout rows from {holdout_start.date()}: recall "
+              f"{old_recall:.3f} -> {new_recall:.3f}, precision {old_precision:.3f} -> {new_precision:.3f}")
+        if new_recall < old_recall - RECALL_TOLERANCE:
+            reasons.append(f"recall dropped by {old_recall - new_recall:.3f}")
+        holdout_recall, holdout_precision = new_recall, new_precision
+    if drifted:
+        reasons.append(f"feature drift {drifted}")
+    if reasons:
+        print("Update rejected: " + "; ".join(reasons))
+        if args.no_fallback:
+            print("Keeping the current model (--no-fallback).")
+            return False
+        print("Falling back to a full retrain...")
+        args.spatial_radius_km = spatial_radius_km
+        return full_retrain(args)
+
+    # --- 4. Continue Boosting on All New Days ---
+    updated = boost(new_df)
+    joblib.dump(updated, args.out)
+    save_meta(args.out, {
+        **meta,
+        'trained_through': str(latest.date()),
+        'rounds': int(updated.get_booster().num_boosted_rounds()),
+        'holdout_recall': holdout_recall,
+        'holdout_precision': holdout_precision,
+        'incremental_updates': meta.get('incremental_updates', 0) + 1,
+    })
+    print(f"\n✅ Updated model saved to '{args.out}' in {time.perf_counter() - start:.1f}s "
+          f"({args.rounds} trees added, trained through {latest.date()}).")
+    return True
+
+
+# --- Main ---
+
+def main(args):
+    saved = incremental_update(args) if args.incremental else full_retrain(args)
+
+    # --- Publish to the Model Registry ---
+    if saved and (args.publish or args.activate):
+        from model_registry import ModelRegistry
+        registry = ModelRegistry()
+        version = registry.publish(args.out)
+        if args.activate:
+            registry.set_active(version)
+        print(f"Published as version '{version}'" + (" and marked ACTIVE." if args.activate else "."))
 
-grid_search.fit(X_train, y_train)
-print("Best parameters found: ", grid_search.best_params_)
 
-# Use the best estimator found by the search
-best_model = grid_search.best_estimator_
+def build_parser():
+    parser = argparse.ArgumentParser(description="Train the outbreak prediction model.")
+    parser.add_argument('--data', default=DATA_FILE, help="Historical CSV or partitioned Parquet directory")
+    parser.add_argument('--start', help="Only train on readings from this date (YYYY-MM-DD)")
+    parser.add_argument('--end', help="Only train on readings up to this date (YYYY-MM-DD)")
+    parser.add_argument('--out', default=MODEL_OUTPUT_FILE, help="Where to save the model")
+    parser.add_argument('--tune', choices=['halving', 'grid'], default='halving',
+                        help="'halving' prunes candidates by budget; 'grid' fits all at the full budget")
+    parser.add_argument('--folds', type=int, default=3, help="Rolling-origin validation folds")
+    parser.add_argument('--test-fraction', type=float, default=0.25, help="Share of latest days held out")
+    parser.add_argument('--n-jobs', type=int, default=-1, help="Parallel fits (-1 = all cores)")
+    parser.add_argument('--spatial-radius-km', type=float, default=None,
+                        help="Add neighbor aggregates over villages within this radius (needs coordinates)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Continue boosting the model in --out on newly labeled days instead of retraining")
+    parser.add_argument('--rounds', type=int, default=INCREMENTAL_ROUNDS, help="Trees added per incremental update")
+    parser.add_argument('--holdout-days', type=int, default=HOLDOUT_DAYS,
+                        help="Latest labeled days held out to gate an incremental update")
+    parser.add_argument('--no-fallback', action='store_true',
+                        help="Keep the current model instead of fully retraining when an update is rejected")
+    parser.add_argument('--publish', action='store_true', help="Copy the model into model/registry/ as a new version")
+    parser.add_argument('--activate', action='store_true',
+                        help="Publish and mark the version ACTIVE (running servers pick it up)")
+    return parser
 
-# --- 6. Evaluate the Final Model ---
-print("\nStep 6: Evaluating the FINAL optimized model...")
-y_pred = best_model.predict(X_test)
-print(classification_report(y_test, y_pred))
 
-# --- 7. Save the Final Model ---
-os.makedirs('model', exist_ok=True)
-joblib.dump(best_model, MODEL_OUTPUT_FILE)
-print(f"\n✅ Final optimized model saved to '{MODEL_OUTPUT_FILE}'!")
\ No newline at end of file
+if __name__ == '__main__':
+    main(build_parser().parse_args())
@@ -0,0 +1,335 @@
+# predict_benchmark.py
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from startup_benchmark import MODEL_ROOT, SERVICES
+
+# --- Prediction latency and throughput benchmark ---
+# Drives each service's /predict (batch size 1) or /predict_batch (batch size
+# n, n copies of the sample payload) at a fixed number of concurrent clients
+# and reports latency percentiles, requests/s, and CPU and RSS per worker.
+#
+#   inproc  the app runs inside a fresh benchmark process: Flask through its
+#           test client (one thread per client), FastAPI through an httpx
+#           ASGI transport (one task per client). No server or sockets.
+#   http    a running server, e.g. --http outbreak=http://127.0.0.1:5000.
+#           --server-pid attributes CPU and RSS to the server workers.
+#
+#   python predict_benchmark.py --concurrency 1 8 --batch-sizes 1 64 --out baseline.json
+#   python predict_benchmark.py --compare baseline.json --threshold 0.1   # exit 1 on regressions
+#
+# Environment variables reach the service (e.g. TREE_ENGINE=1).
+
+BATCH_PATH = "/predict_batch"
+# (metric, direction): +1 means higher is worse
+REGRESSION_CHECKS = (("p50_ms", +1), ("p95_ms", +1), ("rps", -1))
+
+
+def request_for(name, batch_size):
+    """Route and JSON body for one request of 'batch_size' rows."""
+    _, _, path, body = SERVICES[name]
+    if batch_size == 1:
+        return path, body
+    row = body["features"] if name == "water_quality" else body
+    return BATCH_PATH, [row] * batch_size
+
+
+def scenario_key(result):
+    return f"{result['service']}/{result['mode']}/c{result['concurrency']}/b{result['batch_size']}"
+
+
+# --- Process Sampling ---
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def process_sample(pid):
+    """(CPU seconds, RSS bytes) of a process, read from /proc."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/statm") as f:
+            rss_pages = int(f.read().split()[1])
+    except OSError:
+        if pid != os.getpid():
+            return None
+        # No /proc (e.g. macOS): own process only, peak instead of current RSS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return time.process_time(), peak * (1 if sys.platform == "darwin" else 1024)
+    # utime and stime are fields 14 and 15 of stat; 'fields' starts at field 3
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS, rss_pages * PAGE_SIZE
+
+
+def worker_usage(pids, before, after, elapsed):
+    usage = []
+    for pid in pids:
+        if before.get(pid) is None or after.get(pid) is None:
+            continue
+        cpu = after[pid][0] - before[pid][0]
+        usage.append({"pid": pid, "cpu_s": round(cpu, 3), "cpu_pct": round(100 * cpu / elapsed, 1),
+                      "rss_mb": round(after[pid][1] / 2 ** 20, 1)})
+    return usage
+
+
+def summarize(latencies, errors, elapsed, batch_size):
+    latencies = sorted(latencies)
+    if len(latencies) >= 2:
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = latencies[0] if latencies else float("nan")
+    return {
+        "requests": len(latencies), "errors": errors, "elapsed_s": round(elapsed, 3),
+        "p50_ms": round(p50 * 1000, 3), "p95_ms": round(p95 * 1000, 3), "p99_ms": round(p99 * 1000, 3),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3) if latencies else None,
+        "rps": round(len(latencies) / elapsed, 1), "rows_per_s": round(len(latencies) * batch_size / elapsed, 1),
+    }
+
+
+# --- Load Generation ---
+# Both drivers share one request counter, so 'total' requests are spread
+# over 'concurrency' closed-loop clients (each sends its next request as
+# soon as the previous one returns).
+
+def run_threads(make_send, concurrency, total):
+    latencies, errors, counter, lock = [], [0], itertools.count(), threading.Lock()
+
+    def client():
+        send = make_send()
+        while next(counter) < total:
+            start = time.perf_counter()
+            try:
+                ok = send()
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0]
+
+
+async def run_tasks(send, concurrency, total):
+    latencies, errors, counter = [], 0, itertools.count()
+
+    async def client():
+        nonlocal errors
+        while next(counter) < total:
+            start = time.perf_counter()
+            try:
+                ok = await send()
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, errors
+
+
+# --- Worker Process ---
+# One fresh process per service and mode runs every scenario and prints one
+# JSON line per scenario.
+
+async def measure(spec, scenario, pids, run):
+    """Warm-up, then the measured requests; 'run(concurrency, total)' returns (latencies, errors)."""
+    concurrency, batch_size = scenario
+    await run(concurrency, spec["warmup"])
+    sampled = [*pids, os.getpid()]
+    before = {pid: process_sample(pid) for pid in sampled}
+    start = time.perf_counter()
+    latencies, errors = await run(concurrency, spec["requests"])
+    elapsed = time.perf_counter() - start
+    after = {pid: process_sample(pid) for pid in sampled}
+    result = {"service": spec["service"], "mode": spec["mode"], "concurrency": concurrency, "batch_size": batch_size}
+    result.update(summarize(latencies, errors, elapsed, batch_size))
+    result["workers"] = worker_usage(pids, before, after, elapsed)
+    if spec["mode"] == "http":
+        result["client"] = worker_usage([os.getpid()], before, after, elapsed)[0]
+    print(json.dumps(result), flush=True)
+
+
+async def flask_scenarios(spec, service):
+    for scenario in spec["scenarios"]:
+        path, body = request_for(spec["service"], scenario[1])
+
+        def make_send():
+            client = service.app.test_client()  # One per thread
+            return lambda: client.post(path, json=body).status_code == 200
+
+        await measure(spec, scenario, [os.getpid()],
+                      lambda c, n: asyncio.to_thread(run_threads, make_send, c, n))
+
+
+async def httpx_scenarios(spec, client, pids):
+    for scenario in spec["scenarios"]:
+        path, body = request_for(spec["service"], scenario[1])
+        content, headers = json.dumps(body).encode(), {"content-type": "application/json"}
+
+        async def send():
+            return (await client.post(path, content=content, headers=headers)).status_code == 200
+
+        await measure(spec, scenario, pids, lambda c, n: run_tasks(send, c, n))
+
+
+async def worker(spec):
+    import httpx
+
+    if spec["mode"] == "http":
+        limits = httpx.Limits(max_connections=max(c for c, _ in spec["scenarios"]))
+        async with httpx.AsyncClient(base_url=spec["url"], limits=limits, timeout=60) as client:
+            await httpx_scenarios(spec, client, spec["pids"])
+        return
+
+    directory, framework, _, _ = SERVICES[spec["service"]]
+    service_dir = os.path.join(spec["model_root"], directory)
+    os.chdir(service_dir)
+    sys.path.insert(0, service_dir)
+    import app as service
+
+    if framework == "flask":
+        await flask_scenarios(spec, service)
+        return
+    async with service.app.router.lifespan_context(service.app):
+        transport = httpx.ASGITransport(app=service.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=60) as client:
+            await httpx_scenarios(spec, client, [os.getpid()])
+
+
+def run_worker(spec):
+    """Runs one worker process; returns its scenario results."""
+    proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--worker", json.dumps(spec)],
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    results = [json.loads(line) for line in proc.stdout if line.startswith('{"service"')]
+    proc.stdout.close()
+    proc.wait()
+    if len(results) != len(spec["scenarios"]):
+        raise RuntimeError(f"{spec['service']} ({spec['mode']}) finished {len(results)} of "
+                           f"{len(spec['scenarios'])} scenarios (exit code {proc.returncode})")
+    return results
+
+
+# --- Baselines ---
+def environment():
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=MODEL_ROOT,
+                                  capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        revision = None
+    return {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "revision": revision, "tree_engine": os.getenv("TREE_ENGINE", "0") == "1"}
+
+
+def compare(baseline, results, threshold):
+    """Prints current vs baseline per scenario; returns the regressions beyond 'threshold'."""
+    previous = {scenario_key(r): r for r in baseline["results"]}
+    regressions = []
+    print(f"\n{'scenario':<34}" + "".join(f"{m:>26}" for m, _ in REGRESSION_CHECKS))
+    for result in results:
+        key = scenario_key(result)
+        old = previous.get(key)
+        if old is None:
+            print(f"{key:<34}  (not in baseline)")
+            continue
+        cells = []
+        for metric, direction in REGRESSION_CHECKS:
+            change = (result[metric] - old[metric]) / old[metric] if old[metric] else 0.0
+            regressed = direction * change > threshold
+            if regressed:
+                regressions.append(f"{key} {metric} {old[metric]} -> {result[metric]} ({change:+.0%})")
+            cell = f"{old[metric]:.2f}->{result[metric]:.2f} {change:+.0%}{' !' if regressed else ''}"
+            cells.append(f"{cell:>26}")
+        if result["errors"] and not old["errors"]:
+            regressions.append(f"{key} now fails {result['errors']} of {result['requests'] + result['errors']} requests")
+        print(f"{key:<34}" + "".join(cells))
+    return regressions
+
+
+def print_table(results):
+    print(f"\n{'scenario':<34}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>10}{'rows/s':>11}"
+          f"{'errors':>8}{'cpu %':>8}{'rss MB':>8}")
+    for r in results:
+        cpu = sum(w["cpu_pct"] for w in r["workers"]) if r["workers"] else float("nan")
+        rss = sum(w["rss_mb"] for w in r["workers"]) if r["workers"] else float("nan")
+        print(f"{scenario_key(r):<34}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}{r['rps']:>10.1f}"
+              f"{r['rows_per_s']:>11.1f}{r['errors']:>8}{cpu:>8.1f}{rss:>8.1f}")
+
+
+def parse_pairs(values, what):
+    pairs = {}
+    for value in values or []:
+        name, sep, rest = value.partition("=")
+        if not sep or name not in SERVICES:
+            raise SystemExit(f"--{what} expects NAME=VALUE with NAME one of {list(SERVICES)}, got {value!r}")
+        pairs[name] = rest
+    return pairs
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--worker":
+        asyncio.run(worker(json.loads(sys.argv[2])))
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="Latency and throughput of the model /predict routes.")
+    parser.add_argument("--services", nargs="+", choices=list(SERVICES), default=list(SERVICES))
+    parser.add_argument("--modes", nargs="+", choices=["inproc", "http"], default=["inproc"])
+    parser.add_argument("--http", action="append", metavar="NAME=URL", help="Base URL of a running service")
+    parser.add_argument("--server-pid", action="append", metavar="NAME=PID[,PID...]",
+                        help="Server worker processes to report CPU and RSS for in http mode")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8], help="Concurrent clients")
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1],
+                        help="Rows per request (1 = /predict, more = /predict_batch)")
+    parser.add_argument("--requests", type=int, default=1000, help="Measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=50, help="Unmeasured requests before each scenario")
+    parser.add_argument("--out", help="Write the results as a JSON baseline")
+    parser.add_argument("--compare", metavar="BASELINE", help="Compare against a saved baseline")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative p50/p95/req/s change that counts as a regression (default 0.10)")
+    args = parser.parse_args()
+
+    urls, pids = parse_pairs(args.http, "http"), parse_pairs(args.server_pid, "server-pid")
+    scenarios = [[c, b] for c in args.concurrency for b in args.batch_sizes]
+    results = []
+    for mode in args.modes:
+        for name in args.services:
+            if mode == "http" and name not in urls:
+                print(f"Skipping {name} over HTTP: no --http {name}=URL given.")
+                continue
+            spec = {"service": name, "mode": mode, "model_root": MODEL_ROOT, "scenarios": scenarios,
+                    "requests": args.requests, "warmup": args.warmup, "url": urls.get(name),
+                    "pids": [int(p) for p in pids.get(name, "").split(",") if p]}
+            results.extend(run_worker(spec))
+    print_table(results)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"args": vars(args), "environment": environment(), "results": results}, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.threshold:.0%}.")
@@ -0,0 +1,165 @@
+# startup_benchmark.py
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+# --- Cold-start benchmark ---
+# Starts each model service in a fresh Python process, the way a scale-to-zero
+# host does, and measures time-to-first-prediction: from spawning the process
+# to the first /predict response. No server or HTTP client is involved; the
+# app is called in-process (ASGI calls for FastAPI, the test client for Flask)
+# so only the service's own imports and loading are measured.
+#
+#   python startup_benchmark.py                     # current tree
+#   python startup_benchmark.py --compare-ref HEAD~1  # also an older revision, side by side
+
+MODEL_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+SERVICES = {
+    # name: (service directory relative to model/, framework, path, JSON body)
+    "outbreak": ("outbreak", "flask", "/predict", {
+        "reported_cases": 5, "turbidity_ntu": 3.0, "ph_level": 7.2, "rainfall_mm": 4.0, "e_coli_present": 0,
+        "population_density": 500, "proximity_to_river": 1.2, "cases_7_day_avg": 4.0,
+        "rainfall_3_day_sum": 10.0, "cases_7_days_ago": 3,
+    }),
+    "waterborne": ("waterborne-disease-predictor/src", "asgi", "/predict", {
+        "Diarrhea": 1, "Dehydration": 1, "Watery_Diarrhea": 1, "Vomiting": 1,
+    }),
+    "water_quality": ("water_quality", "asgi", "/predict", {"features": [0.0] * 21}),
+}
+
+# Runs inside the fresh process. Timings start at the first line of the script.
+CHILD = r"""
+import time
+t0 = time.perf_counter()
+import json, os, sys
+service_dir, framework, path, body = sys.argv[1], sys.argv[2], sys.argv[3], json.loads(sys.argv[4])
+os.chdir(service_dir)
+sys.path.insert(0, service_dir)
+import app as service
+t_import = time.perf_counter()
+
+if framework == "flask":
+    t_startup = time.perf_counter()
+    response = service.app.test_client().post(path, json=body)
+    status, payload = response.status_code, response.get_json()
+else:
+    import asyncio
+
+    async def first_prediction():
+        async with service.app.router.lifespan_context(service.app):
+            startup = time.perf_counter()
+            raw = json.dumps(body).encode()
+            scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+                     "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+                     "query_string": b"", "headers": [(b"content-type", b"application/json")],
+                     "client": ("127.0.0.1", 0), "server": ("127.0.0.1", 80)}
+            sent, out = False, {"body": b""}
+
+            async def receive():
+                nonlocal sent
+                if sent:
+                    await asyncio.sleep(3600)
+                sent = True
+                return {"type": "http.request", "body": raw, "more_body": False}
+
+            async def send(message):
+                if message["type"] == "http.response.start":
+                    out["status"] = message["status"]
+                elif message["type"] == "http.response.body":
+                    out["body"] += message.get("body", b"")
+
+            await service.app(scope, receive, send)
+            return startup, out["status"], json.loads(out["body"])
+
+    t_startup, status, payload = asyncio.run(first_prediction())
+t_first = time.perf_counter()
+print(json.dumps({"status": status, "response": payload, "import_s": t_import - t0,
+                  "startup_s": t_startup - t_import, "first_request_s": t_first - t_startup,
+                  "modules": len(sys.modules), "pandas": "pandas" in sys.modules,
+                  "sklearn": "sklearn" in sys.modules, "xgboost": "xgboost" in sys.modules}), flush=True)
+"""
+
+
+def cold_start(model_root, name):
+    """One fresh process; returns its timings with 'wall_s' = spawn to first prediction."""
+    directory, framework, path, body = SERVICES[name]
+    service_dir = os.path.join(model_root, directory)
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-c", CHILD, service_dir, framework, path, json.dumps(body)],
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    result = None
+    for line in proc.stdout:
+        if line.startswith('{"status"'):
+            result = json.loads(line)
+            result["wall_s"] = time.perf_counter() - start
+            break
+    proc.stdout.close()
+    proc.wait()
+    if result is None:
+        raise RuntimeError(f"{name} did not produce a prediction (exit code {proc.returncode})")
+    return result
+
+
+def benchmark(model_root, services, runs):
+    results = {}
+    for name in services:
+        samples = [cold_start(model_root, name) for _ in range(runs)]
+        summary = {key: round(statistics.median(s[key] for s in samples), 3)
+                   for key in ("wall_s", "import_s", "startup_s", "first_request_s")}
+        summary.update({key: samples[-1][key] for key in ("status", "modules", "pandas", "sklearn", "xgboost")})
+        results[name] = summary
+    return results
+
+
+def extract_revision(ref, target):
+    """Copies model/ as of a git revision into 'target'; returns its model/ directory."""
+    archive = subprocess.run(["git", "archive", "--format=tar", "--prefix=model/", f"{ref}:model"],
+                             cwd=os.path.dirname(MODEL_ROOT),
+                             capture_output=True, check=True).stdout
+    path = os.path.join(target, "archive.tar")
+    with open(path, "wb") as f:
+        f.write(archive)
+    with tarfile.open(path) as tar:
+        tar.extractall(target)
+    return os.path.join(target, "model")
+
+
+def print_table(label, results):
+    print(f"\n{label}")
+    print(f"{'service':<15}{'first pred (s)':>15}{'import':>9}{'startup':>9}{'request':>9}  loaded")
+    for name, r in results.items():
+        loaded = ",".join(m for m in ("pandas", "sklearn", "xgboost") if r[m]) or "-"
+        print(f"{name:<15}{r['wall_s']:>15.3f}{r['import_s']:>9.3f}{r['startup_s']:>9.3f}"
+              f"{r['first_request_s']:>9.3f}  {loaded}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time-to-first-prediction of each model service from a cold process.")
+    parser.add_argument("--services", nargs="+", choices=list(SERVICES), default=list(SERVICES))
+    parser.add_argument("--runs", type=int, default=3, help="Cold starts per service (median reported)")
+    parser.add_argument("--compare-ref", help="Also benchmark this git revision of model/ (e.g. HEAD~1)")
+    parser.add_argument("--out", help="Write the results as JSON")
+    args = parser.parse_args()
+
+    report = {"current": benchmark(MODEL_ROOT, args.services, args.runs)}
+    if args.compare_ref:
+        with tempfile.TemporaryDirectory() as tmp:
+            report[args.compare_ref] = benchmark(extract_revision(args.compare_ref, tmp), args.services, args.runs)
+        print_table(f"Revision {args.compare_ref}", report[args.compare_ref])
+    print_table("Current tree", report["current"])
+
+    if args.compare_ref:
+        print()
+        for name in args.services:
+            before, after = report[args.compare_ref][name]["wall_s"], report["current"][name]["wall_s"]
+            print(f"{name:<15}{before:.3f}s -> {after:.3f}s ({(after - before) / before:+.0%})")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"args": vars(args), "results": report}, f, indent=2)
@@ -1,16 +1,52 @@
 # app.py
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 import traceback
+import asyncio
+import json
 import numpy as np
-import joblib   # or use pickle
 import os
+import sys
+
+import array_io
+from array_io import ArrayFormatError
+from batching import DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_WAIT_MS, MicroBatcher
+import streaming
+import native_model
+from streaming import StreamScorer, StreamSession, split_readings
+
+# Shared opt-in profiler (PROFILE_ENABLED=1), in profiling/ at the repository root;
+# deployments that ship only this service run without it.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "profiling"))
+try:
+    from sampling_profiler import install_profiler
+except ImportError:
+    install_profiler = None
 
 # --- Config ---
-MODEL_PATH = "water_quality_model_xgb_classifier.pkl"
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "water_quality_model_xgb_classifier.pkl")
+# Native booster + JSON sidecar exported from MODEL_PATH (python native_model.py);
+# preferred at startup because it loads without joblib or unpickling.
+NATIVE_MODEL_PATH = os.path.join(os.path.dirname(MODEL_PATH), native_model.NATIVE_BASENAME)
+# TREE_ENGINE=1 evaluates the native model with the compiled NumPy trees instead of XGBoost
+TREE_ENGINE = os.getenv("TREE_ENGINE", "0") == "1"
+MAX_BATCH_ROWS = 1_000_000
+# Micro-batching of /predict: rows per model call and the longest a request waits
+# for others to join its batch. PREDICT_BATCH_MAX_SIZE=1 scores every request alone.
+PREDICT_BATCH_MAX_SIZE = int(os.getenv("PREDICT_BATCH_MAX_SIZE", DEFAULT_MAX_BATCH_SIZE))
+PREDICT_BATCH_MAX_WAIT_MS = float(os.getenv("PREDICT_BATCH_MAX_WAIT_MS", DEFAULT_MAX_WAIT_MS))
+# Streaming ingestion: readings per station window, flush triggers and a cap on tracked stations
+STREAM_WINDOW = int(os.getenv("STREAM_WINDOW", streaming.DEFAULT_WINDOW))
+STREAM_FLUSH_ROWS = int(os.getenv("STREAM_FLUSH_ROWS", streaming.DEFAULT_FLUSH_ROWS))
+STREAM_FLUSH_MS = float(os.getenv("STREAM_FLUSH_MS", streaming.DEFAULT_FLUSH_MS))
+STREAM_MAX_STATIONS = int(os.getenv("STREAM_MAX_STATIONS", 100_000))
 
 # --- App ---
 app = FastAPI(title="Model API")
+if install_profiler:
+    install_profiler(app, "water_quality")
 
 # --- Example input schema ---
 # Adjust fields/shape to match your model input.
@@ -24,49 +60,204 @@ class PredictResponse(BaseModel):
 
 # --- Load model once at startup ---
 model = None
+stream_scorer = None  # Station windows shared by every streaming connection
 
-def load_model(path=MODEL_PATH):
+def load_model(path=MODEL_PATH, native_path=NATIVE_MODEL_PATH):
+    if native_model.exists(native_path):
+        compiled = TREE_ENGINE and os.path.exists(native_model.trees_path(native_path))
+        native = native_model.NativeClassifier.load(native_path, compiled=compiled)
+        # A pickle retrained after the export wins over the stale native copy
+        if not os.path.exists(path) or native.meta.get("source_fingerprint") == native_model.file_fingerprint(path):
+            return native
+        print("Native model is older than the pickle; loading the pickle instead.")
     if not os.path.exists(path):
         raise FileNotFoundError(f"Model file not found at {path}")
-    # If you used joblib.dump / load
+    import joblib  # Only needed for the pickle fallback
     return joblib.load(path)
 
 @app.on_event("startup")
 def startup_event():
-    global model
+    global model, stream_scorer
     try:
         model = load_model(MODEL_PATH)
+        stream_scorer = make_stream_scorer(model)
         print("Model loaded successfully.")
     except Exception as e:
         print("Failed to load model:", e)
         # Let server start — but endpoints will return 500 if model missing
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await batcher.stop()
+
+def make_stream_scorer(model):
+    names = getattr(model, "feature_names_in_", None)
+    if names is None:
+        names = [f"f{i}" for i in range(model.n_features_in_)]
+    return StreamScorer(predict_rows, names, STREAM_WINDOW, STREAM_MAX_STATIONS)
+
 # --- Health check ---
 @app.get("/health")
 def health():
     return {"status": "ok", "model_loaded": model is not None}
 
 # --- Predict endpoint ---
+def predict_rows(X):
+    # Called by the batcher with the rows of every request in the batch
+    return np.asarray(model.predict(X), dtype=float)
+
+batcher = MicroBatcher(predict_rows, PREDICT_BATCH_MAX_SIZE, PREDICT_BATCH_MAX_WAIT_MS,
+                       metric_prefix="water_quality_predict")
+
 @app.post("/predict", response_model=PredictResponse)
-def predict(req: PredictRequest):
+async def predict(req: PredictRequest):
     if model is None:
         raise HTTPException(status_code=500, detail="Model not loaded")
+    # Convert to numpy array and ensure shape (1, n_features)
+    features = np.array(req.features, dtype=float).reshape(1, -1)
+    expected = getattr(model, "n_features_in_", None)
+    if expected is not None and features.shape[1] != expected:
+        # Checked up front so one bad request cannot fail the batch it joins
+        raise HTTPException(status_code=400, detail=f"Expected {expected} features, got {features.shape[1]}")
     try:
-        # Convert to numpy array and ensure shape (1, n_features)
-        features = np.array(req.features, dtype=float)
-        if features.ndim == 1:
-            features = features.reshape(1, -1)
+        if batcher.max_batch_size > 1:
+            pred_value = float(await batcher.submit(features))
+        else:
+            pred_value = float((await run_in_threadpool(predict_rows, features))[0])
+        return {"prediction": pred_value}
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=400, detail=str(e))
 
-        # If your model expects a DataFrame, change accordingly
-        pred = model.predict(features)
+# --- Metrics ---
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Batch-size and queue-wait histograms of /predict, in the Prometheus text format."""
+    return batcher.metrics()
 
-        # If model returns array, extract scalar
-        if hasattr(pred, "__len__"):
-            pred_value = float(pred[0])
-        else:
-            pred_value = float(pred)
 
-        return {"prediction": pred_value}
+# --- Batch predict endpoint ---
+# Body: raw little-endian float32 (with X-Array-Shape: rows,cols), .npy,
+# Arrow IPC or JSON {"instances": [...]}, picked by Content-Type. The array
+# is scored in one model.predict call and returned in the same format;
+# ?proba=true adds the class probabilities.
+def score_batch(X, with_proba):
+    expected = getattr(model, "n_features_in_", None)
+    if len(X) and expected is not None and X.shape[1] != expected:
+        raise ArrayFormatError(f"Expected {expected} features per row, got {X.shape[1]}")
+    if len(X) == 0:
+        n_classes = len(getattr(model, "classes_", []))
+        result = {"prediction": np.empty(0, dtype=np.float32)}
+        if with_proba:
+            result["probabilities"] = np.empty((0, n_classes), dtype=np.float32)
+        return result
+    if with_proba:
+        proba = np.asarray(model.predict_proba(X))
+        classes = np.asarray(model.classes_)
+        return {"prediction": classes[proba.argmax(axis=1)], "probabilities": proba}
+    return {"prediction": np.asarray(model.predict(X))}
+
+
+@app.post("/predict_batch")
+async def predict_batch(request: Request, proba: bool = False):
+    if model is None:
+        raise HTTPException(status_code=500, detail="Model not loaded")
+    body = await request.body()
+    try:
+        kind, X = array_io.read_array(
+            body,
+            request.headers.get("content-type"),
+            request.headers.get(array_io.SHAPE_HEADER),
+            getattr(model, "feature_names_in_", None),
+        )
+    except LookupError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except ArrayFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(X) > MAX_BATCH_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_ROWS} rows per batch")
+
+    try:
+        # Scoring is CPU-bound; keep it off the event loop
+        result = await run_in_threadpool(score_batch, X, proba)
+        content, headers = array_io.write_result(kind, result, getattr(model, "classes_", ()))
+    except ArrayFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         traceback.print_exc()
-        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=str(e))
+    headers["X-Batch-Rows"] = str(len(X))
+    return Response(content=content, media_type=kind, headers=headers)
+
+
+# --- Streaming ingestion ---
+# Readings: {"station_id": ..., "features": [...]} (or one key per feature
+# name), optionally with a "timestamp". Only state changes come back:
+# {"station_id", "state", "previous_state", "prediction", "readings", "timestamp"}.
+@app.websocket("/stream")
+async def stream(websocket: WebSocket):
+    """Long-lived connection: send readings (JSON object, array or NDJSON) in any number of messages."""
+    await websocket.accept()
+    if stream_scorer is None:
+        await websocket.close(code=1011, reason="Model not loaded")
+        return
+    session = StreamSession(stream_scorer, STREAM_FLUSH_ROWS, STREAM_FLUSH_MS)
+
+    async def receive():
+        try:
+            while True:
+                text = await websocket.receive_text()
+                try:
+                    readings = split_readings(text)
+                except ValueError as e:
+                    session.fail(f"Invalid JSON: {e}")
+                    continue
+                for reading in readings:
+                    session.add(reading)
+        except WebSocketDisconnect:
+            pass
+
+    receiver = asyncio.create_task(receive())
+    try:
+        while not receiver.done():
+            await session.wait()
+            for event in await session.flush():
+                await websocket.send_text(json.dumps(event))
+    except (WebSocketDisconnect, RuntimeError):
+        receiver.cancel()
+    finally:
+        # Readings that arrived just before the client left still update station state
+        await session.flush()
+
+
+@app.post("/stream/ingest")
+async def stream_ingest(request: Request):
+    """
+    Chunked NDJSON upload from gateways without WebSocket support. Readings
+    are scored in micro-batches while the body is still arriving; the state
+    changes come back as NDJSON once the upload ends, followed by a summary.
+    """
+    if stream_scorer is None:
+        raise HTTPException(status_code=500, detail="Model not loaded")
+    session = StreamSession(stream_scorer, STREAM_FLUSH_ROWS, STREAM_FLUSH_MS)
+    events = []
+
+    def add_lines(lines):
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                session.add(json.loads(line))
+            except ValueError as e:
+                session.fail(f"Invalid JSON: {e}")
+
+    buffer = b""
+    async for chunk in request.stream():
+        *lines, buffer = (buffer + chunk).split(b"\n")
+        add_lines(lines)
+        if session.due():
+            events += await session.flush()
+    add_lines([buffer])
+    events += await session.flush()
+    events.append(session.summary())
+    return Response("".join(json.dumps(e) + "\n" for e in events), media_type="application/x-ndjson")
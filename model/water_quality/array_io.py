@@ -0,0 +1,186 @@
+# array_io.py
+import io
+import json
+
+import numpy as np
+
+# --- Binary batch bodies ---
+# Sensor gateways upload thousands of readings per request. Instead of a JSON
+# list of floats (parsed and validated one element at a time), the body is
+# wrapped as a NumPy array in place with np.frombuffer: no per-element
+# parsing and, for raw and .npy bodies, no copy. Responses use the same
+# format as the request.
+
+RAW = "application/octet-stream"      # little-endian float32, shape in X-Array-Shape
+NPY = "application/x-npy"             # NumPy .npy file
+ARROW = "application/vnd.apache.arrow.stream"  # Arrow IPC stream, one column per feature
+JSON = "application/json"             # {"instances": [[...], ...]} for small callers
+
+SHAPE_HEADER = "X-Array-Shape"
+RAW_DTYPE = np.dtype("<f4")
+
+
+class ArrayFormatError(ValueError):
+    """The body cannot be read as a 2D numeric array."""
+
+
+def media_type(content_type):
+    return (content_type or JSON).split(";")[0].strip().lower()
+
+
+def parse_shape(value):
+    """'rows,cols' (or 'rows x cols') -> (rows, cols)."""
+    try:
+        shape = tuple(int(v) for v in value.replace("x", ",").split(","))
+    except (AttributeError, ValueError):
+        raise ArrayFormatError(f"{SHAPE_HEADER} must look like 'rows,cols', got {value!r}")
+    if len(shape) != 2 or min(shape) < 0:
+        raise ArrayFormatError(f"{SHAPE_HEADER} must give two non-negative sizes, got {value!r}")
+    return shape
+
+
+def format_shape(shape):
+    return ",".join(str(n) for n in shape)
+
+
+# --- Decoding ---
+def read_raw(body, shape_header):
+    if shape_header is None:
+        raise ArrayFormatError(f"Raw float32 bodies need an {SHAPE_HEADER}: rows,cols header")
+    rows, cols = parse_shape(shape_header)
+    if len(body) != rows * cols * RAW_DTYPE.itemsize:
+        raise ArrayFormatError(f"Body has {len(body)} bytes; {rows}x{cols} float32 needs {rows * cols * 4}")
+    return np.frombuffer(body, dtype=RAW_DTYPE).reshape(rows, cols)
+
+
+def read_npy(body):
+    """Reads the .npy header and wraps the data that follows it without copying."""
+    f = io.BytesIO(body)
+    try:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+    except ValueError as e:
+        raise ArrayFormatError(f"Invalid .npy body: {e}")
+    if dtype.hasobject or dtype.kind not in "biuf":
+        raise ArrayFormatError(f".npy arrays must be numeric, got {dtype}")
+    if len(shape) == 1:
+        shape = (1, shape[0])
+    if len(shape) != 2:
+        raise ArrayFormatError(f".npy arrays must be 2D (rows, features), got shape {shape}")
+    count = shape[0] * shape[1]
+    if len(body) - f.tell() < count * dtype.itemsize:
+        raise ArrayFormatError(".npy body is shorter than its header says")
+    X = np.frombuffer(body, dtype=dtype, count=count, offset=f.tell())
+    return X.reshape(shape, order="F" if fortran_order else "C")
+
+
+def read_arrow(body, feature_names=None):
+    """
+    Arrow IPC stream with one numeric column per feature. Columns are put in
+    'feature_names' order when they are all present, otherwise taken as sent.
+    Each column is viewed without copying; stacking them into the row-major
+    matrix XGBoost wants is the one copy.
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ArrayFormatError("Arrow bodies need pyarrow installed on the server")
+    try:
+        table = pa.ipc.open_stream(pa.py_buffer(body)).read_all()
+    except pa.ArrowInvalid as e:
+        raise ArrayFormatError(f"Invalid Arrow IPC stream: {e}")
+    names = list(feature_names) if feature_names is not None else []
+    if names and set(names) <= set(table.column_names):
+        table = table.select(names)
+    columns = []
+    for name, column in zip(table.column_names, table.columns):
+        if not (pa.types.is_integer(column.type) or pa.types.is_floating(column.type)):
+            raise ArrayFormatError(f"Arrow column {name!r} must be numeric, got {column.type}")
+        # Nulls become NaN, which XGBoost treats as missing
+        columns.append(column.to_numpy() if column.null_count == 0 else
+                       column.cast(pa.float64()).fill_null(np.nan).to_numpy())
+    if not columns:
+        return np.empty((table.num_rows, 0), dtype=np.float32)
+    return np.column_stack(columns)
+
+
+def read_json(body):
+    try:
+        payload = json.loads(body or b"null")
+    except ValueError as e:
+        raise ArrayFormatError(f"Invalid JSON: {e}")
+    instances = payload.get("instances") if isinstance(payload, dict) else payload
+    if not isinstance(instances, list):
+        raise ArrayFormatError('JSON bodies must be {"instances": [[...], ...]} or a list of rows')
+    try:
+        X = np.array(instances, dtype=float)
+    except (TypeError, ValueError) as e:
+        raise ArrayFormatError(f"Instances must be rows of numbers: {e}")
+    if X.ndim == 1:
+        X = X.reshape(1, -1) if len(X) else X.reshape(0, 0)
+    if X.ndim != 2:
+        raise ArrayFormatError("Instances must be a list of equally long rows")
+    return X
+
+
+def read_array(body, content_type, shape_header=None, feature_names=None):
+    kind = media_type(content_type)
+    if kind == RAW:
+        return kind, read_raw(body, shape_header)
+    if kind == NPY:
+        return kind, read_npy(body)
+    if kind == ARROW:
+        return kind, read_arrow(body, feature_names)
+    if kind == JSON:
+        return kind, read_json(body)
+    raise LookupError(f"Unsupported content type {kind!r}; use {RAW}, {NPY}, {ARROW} or {JSON}")
+
+
+# --- Encoding ---
+def write_raw(result):
+    """Predictions (and probabilities, if any) as one float32 matrix: column 0 is the class."""
+    columns = [result["prediction"]] + ([result["probabilities"]] if "probabilities" in result else [])
+    out = np.ascontiguousarray(np.column_stack(columns), dtype=RAW_DTYPE)
+    return out.tobytes(), {SHAPE_HEADER: format_shape(out.shape)}
+
+
+def write_npy(result):
+    columns = [result["prediction"]] + ([result["probabilities"]] if "probabilities" in result else [])
+    f = io.BytesIO()
+    np.save(f, np.column_stack(columns).astype(np.float32), allow_pickle=False)
+    return f.getvalue(), {}
+
+
+def write_arrow(result, classes):
+    import pyarrow as pa
+
+    arrays = {"prediction": pa.array(result["prediction"].astype(np.int32))}
+    if "probabilities" in result:
+        for i, label in enumerate(classes):
+            arrays[f"proba_{label}"] = pa.array(result["probabilities"][:, i].astype(np.float32))
+    table = pa.table(arrays)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes(), {}
+
+
+def write_json(result):
+    payload = {"predictions": result["prediction"].astype(float).tolist()}
+    if "probabilities" in result:
+        payload["probabilities"] = np.round(result["probabilities"].astype(float), 6).tolist()
+    return json.dumps(payload).encode(), {}
+
+
+def write_result(kind, result, classes=()):
+    """Encodes {'prediction': (n,), 'probabilities': (n, k)} in the request's format."""
+    if kind == RAW:
+        return write_raw(result)
+    if kind == NPY:
+        return write_npy(result)
+    if kind == ARROW:
+        return write_arrow(result, classes)
+    return write_json(result)
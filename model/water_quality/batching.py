@@ -0,0 +1,154 @@
+# batching.py
+import asyncio
+import bisect
+import threading
+import time
+
+import numpy as np
+
+# --- Dynamic micro-batching ---
+# XGBoost's per-call overhead dominates a one-row predict. Concurrent
+# requests put their row on a queue; a single worker takes the first row,
+# keeps collecting until it has max_batch_size rows or the first row has
+# waited max_wait_ms, scores them in one call on a worker thread and hands
+# each request its own result. While a batch is being scored the next one
+# fills up, so batches grow with load and the extra wait per request stays
+# bounded by max_wait_ms plus one batch's scoring time.
+
+DEFAULT_MAX_BATCH_SIZE = 64
+DEFAULT_MAX_WAIT_MS = 2.0
+
+WAIT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+
+
+def size_buckets(max_batch_size):
+    """Powers of two up to max_batch_size."""
+    buckets, size = [], 1
+    while size < max_batch_size:
+        buckets.append(size)
+        size *= 2
+    return tuple(buckets + [max_batch_size])
+
+
+class Histogram:
+    """Cumulative-bucket histogram rendered in the Prometheus text format."""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+
+    def render(self, labels="", header=True):
+        """'labels' like 'model="outbreak"'; header=False for further series of a family."""
+        label = f"{labels}," if labels else ""
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"] if header else []
+        with self._lock:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f'{self.name}_bucket{{{label}le="{le}"}} {cumulative}')
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {self.sum:.6g}")
+            lines.append(f"{self.name}_count{suffix} {self.count}")
+        return "\n".join(lines)
+
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+
+class MicroBatcher:
+    """
+    Gathers single rows from concurrent requests into one vectorized call.
+    'predict_fn' takes an (n, features) array and returns n results.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS,
+                 metric_prefix="predict"):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self.batch_size = Histogram(f"{metric_prefix}_batch_size", "Rows scored per model call",
+                                    size_buckets(self.max_batch_size))
+        self.queue_wait = Histogram(f"{metric_prefix}_queue_wait_seconds",
+                                    "Time a row waited before its batch was scored", WAIT_BUCKETS)
+        self._queue = None
+        self._worker = None
+
+    def start(self):
+        """Starts the worker on the running event loop (called lazily on first submit)."""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def submit(self, row):
+        """Queues one row and waits for its result."""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        first = await self._queue.get()
+        batch = [first]
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # Requests that gave up (client disconnected) are not scored
+            batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                continue
+            now = time.perf_counter()
+            for _, _, enqueued in batch:
+                self.queue_wait.observe(now - enqueued)
+            self.batch_size.observe(len(batch))
+            try:
+                X = np.vstack([row for row, _, _ in batch])
+                results = await loop.run_in_executor(None, self.predict_fn, X)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def metrics(self, labels=""):
+        return self.batch_size.render(labels) + "\n" + self.queue_wait.render(labels) + "\n"
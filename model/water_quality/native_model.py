@@ -0,0 +1,163 @@
+# native_model.py
+import hashlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+# --- Startup-optimized model artifact ---
+# The pickled XGBClassifier needs joblib and the scikit-learn wrapper just to
+# be unpickled. The native artifact is the XGBoost booster in its own binary
+# format (.ubj) plus a small JSON sidecar with the feature order and classes.
+# Loading it reads the JSON with the standard library and hands the booster
+# file straight to XGBoost; predictions go through Booster.inplace_predict on
+# a NumPy array (no pandas, no DMatrix), the same path XGBClassifier takes.
+
+# With TREE_ENGINE=1 small batches are instead evaluated by the compiled
+# NumPy engine (model/tree_engine.py) from <base>.trees.npz; XGBoost is only
+# imported once a batch larger than SMALL_BATCH_ROWS arrives.
+
+NATIVE_BASENAME = "water_quality_model"
+FORMAT = "xgboost-native"
+
+
+def sidecar_path(base_path):
+    return base_path + ".json"
+
+
+def booster_path(base_path):
+    return base_path + ".ubj"
+
+
+def trees_path(base_path):
+    return base_path + ".trees.npz"
+
+
+def tree_engine():
+    # Shared by the model services; lives one level up in model/
+    model_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if model_root not in sys.path:
+        sys.path.append(model_root)
+    import tree_engine
+    return tree_engine
+
+
+def file_fingerprint(path):
+    """Short content hash of the pickle the native artifact was exported from."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def exists(base_path):
+    return os.path.exists(booster_path(base_path)) and os.path.exists(sidecar_path(base_path))
+
+
+def export(model, base_path, source_path=None):
+    """Writes <base>.ubj and <base>.json for a fitted XGBClassifier."""
+    model.get_booster().save_model(booster_path(base_path))
+    tree_engine().CompiledTrees.from_booster(model.get_booster()).save(trees_path(base_path))
+    names = getattr(model, "feature_names_in_", None)
+    meta = {
+        "format": FORMAT,
+        "n_features": int(model.n_features_in_),
+        "features": [str(n) for n in names] if names is not None else None,
+        "classes": np.asarray(model.classes_).tolist(),
+        "objective": model.get_params().get("objective"),
+        "source_fingerprint": file_fingerprint(source_path) if source_path else None,
+    }
+    with open(sidecar_path(base_path), "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def load_booster(base_path):
+    import xgboost as xgb  # Deferred until a model is actually loaded
+
+    booster = xgb.Booster(model_file=booster_path(base_path))
+    # The booster file does not keep feature names; the sidecar does.
+    booster.feature_names = None
+    return booster
+
+
+class NativeClassifier:
+    """
+    The subset of XGBClassifier the service uses (predict, predict_proba,
+    n_features_in_, feature_names_in_, classes_), backed by a raw Booster
+    or, with compiled=True, by the NumPy tree engine.
+    """
+
+    def __init__(self, booster, meta, compiled=None, base_path=None):
+        self.booster = booster
+        self.compiled = compiled
+        self.base_path = base_path
+        self.meta = meta
+        self.n_features_in_ = meta["n_features"]
+        self.feature_names_in_ = np.array(meta["features"]) if meta.get("features") else None
+        self.classes_ = np.array(meta["classes"])
+
+    @classmethod
+    def load(cls, base_path, compiled=False):
+        with open(sidecar_path(base_path)) as f:
+            meta = json.load(f)
+        if meta.get("format") != FORMAT:
+            raise ValueError(f"{sidecar_path(base_path)} is not a {FORMAT} sidecar")
+        if compiled:
+            return cls(None, meta, tree_engine().CompiledTrees.load(trees_path(base_path)), base_path)
+        return cls(load_booster(base_path), meta)
+
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        if self.compiled is not None and len(X) <= tree_engine().SMALL_BATCH_ROWS:
+            return self.compiled.predict_proba(X)
+        if self.booster is None:
+            # First large batch under TREE_ENGINE=1; a concurrent duplicate load is harmless
+            self.booster = load_booster(self.base_path)
+        proba = self.booster.inplace_predict(X, validate_features=False)
+        if proba.ndim == 1:  # binary:logistic gives P(class 1) only
+            proba = np.column_stack([1 - proba, proba])
+        return proba
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Export the pickled model to the native booster format.")
+    parser.add_argument("--model", default=os.path.join(here, "water_quality_model_xgb_classifier.pkl"))
+    parser.add_argument("--out", default=os.path.join(here, NATIVE_BASENAME), help="Base path (no extension)")
+    parser.add_argument("--check-rows", type=int, default=10000, help="Random rows compared against the pickle")
+    args = parser.parse_args()
+
+    import joblib
+
+    model = joblib.load(args.model)
+    meta = export(model, args.out, args.model)
+    print(f"💾 Native model written to {booster_path(args.out)} "
+          f"(+ {os.path.basename(sidecar_path(args.out))}, {os.path.basename(trees_path(args.out))})")
+
+    start = time.perf_counter()
+    native = NativeClassifier.load(args.out)
+    print(f"⏱️ Native load took {time.perf_counter() - start:.3f}s")
+
+    # Wide random values so every tree branch is exercised
+    X = np.random.default_rng(0).normal(0, 3, (args.check_rows, meta["n_features"])).astype(np.float32)
+    if not np.array_equal(native.predict_proba(X), model.predict_proba(X)):
+        raise SystemExit("❌ Native probabilities differ from the pickled model.")
+    if not np.array_equal(native.predict(X), model.predict(X)):
+        raise SystemExit("❌ Native predictions differ from the pickled model.")
+    print(f"✅ Native model matches the pickle exactly on {args.check_rows:,} rows.")
+
+    compiled = NativeClassifier.load(args.out, compiled=True).compiled
+    try:
+        diff = compiled.verify(model.predict_proba(X), X)
+    except AssertionError as e:
+        raise SystemExit(f"❌ {e}.")
+    print(f"✅ Compiled trees match the pickle on {args.check_rows:,} rows (max probability difference {diff:.1e}).")
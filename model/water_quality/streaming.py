@@ -0,0 +1,205 @@
+# streaming.py
+import asyncio
+import json
+import threading
+import time
+
+import numpy as np
+
+# --- Streaming sensor ingestion ---
+# Field sensors send readings continuously. Each station keeps its last
+# STREAM_WINDOW readings in a fixed-size ring buffer (one slot of a shared
+# float32 array, so memory is stations x window x features x 4 bytes).
+# A station is scored on the mean of its window, which smooths single noisy
+# readings, and only stations that received readings since the last flush
+# are scored - all of them in one model.predict call. Only changes of a
+# station's predicted class are pushed back to the client.
+
+DEFAULT_WINDOW = 12          # Readings per station window
+DEFAULT_FLUSH_ROWS = 256     # Score as soon as this many readings are pending...
+DEFAULT_FLUSH_MS = 200.0     # ...or at least this often
+INITIAL_STATIONS = 64        # Ring buffers are allocated for this many stations and doubled as needed
+
+# The notebook label-encodes Water_Quality_Risk, so classes are in alphabetical order
+RISK_LABELS = {0: "High Risk", 1: "Low Risk", 2: "Medium Risk"}
+
+
+class ReadingError(ValueError):
+    """A reading is missing its station or has the wrong features."""
+
+
+class StationWindows:
+    """Per-station ring buffers of the most recent readings."""
+
+    def __init__(self, n_features, window=DEFAULT_WINDOW, max_stations=None):
+        self.n_features = n_features
+        self.window = window
+        self.max_stations = max_stations
+        self.index = {}  # station_id -> slot
+        self.values = np.zeros((INITIAL_STATIONS, window, n_features), dtype=np.float32)
+        self.counts = np.zeros(INITIAL_STATIONS, dtype=np.int64)  # Readings seen (not capped)
+
+    def __len__(self):
+        return len(self.index)
+
+    def _slot(self, station_id):
+        slot = self.index.get(station_id)
+        if slot is not None:
+            return slot
+        if self.max_stations is not None and len(self.index) >= self.max_stations:
+            raise ReadingError(f"Station limit of {self.max_stations} reached")
+        slot = len(self.index)
+        if slot == len(self.values):
+            self.values = np.concatenate([self.values, np.zeros_like(self.values)])
+            self.counts = np.concatenate([self.counts, np.zeros_like(self.counts)])
+        self.index[station_id] = slot
+        return slot
+
+    def append(self, station_id, row):
+        slot = self._slot(station_id)
+        self.values[slot, self.counts[slot] % self.window] = row
+        self.counts[slot] += 1
+        return slot
+
+    def means(self, slots):
+        """(len(slots), n_features) mean of each station's filled window slots."""
+        slots = np.asarray(slots, dtype=np.int64)
+        filled = np.minimum(self.counts[slots], self.window)
+        # Unfilled slots are still zero, so the plain sum is the sum of the readings
+        return self.values[slots].sum(axis=1, dtype=np.float64) / filled[:, None]
+
+
+class StreamScorer:
+    """Shared windows and last known state of every station."""
+
+    def __init__(self, predict_fn, feature_names, window=DEFAULT_WINDOW, max_stations=None):
+        self.predict_fn = predict_fn
+        self.feature_names = [str(name) for name in feature_names]
+        self.windows = StationWindows(len(self.feature_names), window, max_stations)
+        self.states = {}  # station_id -> predicted class
+        self._lock = threading.Lock()
+
+    def parse(self, reading):
+        """(station_id, row, timestamp) from {"station_id", "features": [...]} or named feature keys."""
+        if not isinstance(reading, dict) or reading.get("station_id") is None:
+            raise ReadingError("Each reading needs a 'station_id'")
+        if "features" in reading:
+            row = reading["features"]
+            if not isinstance(row, list) or len(row) != len(self.feature_names):
+                raise ReadingError(f"'features' must list {len(self.feature_names)} values")
+        else:
+            missing = [name for name in self.feature_names if name not in reading]
+            if missing:
+                raise ReadingError(f"Reading is missing features: {missing}")
+            row = [reading[name] for name in self.feature_names]
+        try:
+            row = np.asarray(row, dtype=np.float32)
+        except (TypeError, ValueError):
+            raise ReadingError("Feature values must be numbers")
+        return str(reading["station_id"]), row, reading.get("timestamp")
+
+    def ingest(self, reading, pending):
+        """Adds one reading to its station's window and marks the station in 'pending'."""
+        station_id, row, timestamp = self.parse(reading)
+        with self._lock:
+            self.windows.append(station_id, row)
+        pending[station_id] = timestamp
+
+    def score(self, pending):
+        """Scores the pending stations in one call; returns their state changes."""
+        if not pending:
+            return []
+        station_ids = list(pending)
+        with self._lock:
+            slots = [self.windows.index[s] for s in station_ids]
+            X = self.windows.means(slots)
+            counts = self.windows.counts[slots].tolist()
+        predictions = np.asarray(self.predict_fn(X)).astype(int)
+        changes = []
+        with self._lock:
+            for station_id, prediction, count in zip(station_ids, predictions.tolist(), counts):
+                previous = self.states.get(station_id)
+                if previous == prediction:
+                    continue
+                self.states[station_id] = prediction
+                changes.append({
+                    "station_id": station_id,
+                    "state": RISK_LABELS.get(prediction, str(prediction)),
+                    "previous_state": RISK_LABELS.get(previous, str(previous)) if previous is not None else None,
+                    "prediction": prediction,
+                    "readings": count,
+                    "timestamp": pending[station_id],
+                })
+        return changes
+
+
+def split_readings(text):
+    """Readings in one WebSocket message: a JSON object, a JSON array or NDJSON lines."""
+    text = text.strip()
+    if not text:
+        return []
+    try:
+        payload = json.loads(text)
+        return payload if isinstance(payload, list) else [payload]
+    except ValueError:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+class StreamSession:
+    """
+    One client connection: readings are ingested as they arrive and the
+    stations they touch are flushed to the scorer every 'flush_rows' readings
+    or 'flush_ms' milliseconds, whichever comes first.
+    """
+
+    def __init__(self, scorer, flush_rows=DEFAULT_FLUSH_ROWS, flush_ms=DEFAULT_FLUSH_MS):
+        self.scorer = scorer
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_ms / 1000
+        self.pending = {}
+        self.pending_rows = 0
+        self.readings = 0
+        self.errors = []  # Error events not yet sent back
+        self.error_count = 0
+        self.last_flush = time.perf_counter()
+        self._ready = asyncio.Event()
+
+    def add(self, reading):
+        try:
+            self.scorer.ingest(reading, self.pending)
+        except ReadingError as e:
+            self.fail(str(e))
+            return
+        self.readings += 1
+        self.pending_rows += 1
+        if self.pending_rows >= self.flush_rows:
+            self._ready.set()
+
+    def fail(self, message):
+        self.error_count += 1
+        self.errors.append({"error": message})
+
+    def due(self):
+        return self._ready.is_set() or time.perf_counter() - self.last_flush >= self.flush_interval
+
+    async def wait(self):
+        """Waits until a flush is due (enough readings or the interval elapsed)."""
+        try:
+            await asyncio.wait_for(self._ready.wait(), self.flush_interval)
+        except asyncio.TimeoutError:
+            pass
+
+    async def flush(self):
+        """Error events plus the state changes of the pending stations."""
+        pending, self.pending, self.pending_rows = self.pending, {}, 0
+        events, self.errors = self.errors, []
+        self._ready.clear()
+        self.last_flush = time.perf_counter()
+        if pending:
+            loop = asyncio.get_running_loop()
+            events += await loop.run_in_executor(None, self.scorer.score, pending)
+        return events
+
+    def summary(self):
+        return {"done": True, "readings": self.readings, "errors": self.error_count,
+                "stations": len(self.scorer.windows)}
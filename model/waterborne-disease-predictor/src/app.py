@@ -1,23 +1,61 @@
 # src/app.py
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-import joblib
-import pandas as pd
+import io
+import json
+import sys
+import threading
+import numpy as np
 import os
 
+from symptom_table import FEATURE_COLS, TABLE_FILENAME, SymptomTable, is_binary
+
+# Shared opt-in profiler (PROFILE_ENABLED=1), in profiling/ at the repository root;
+# deployments that ship only this service run without it.
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "..", "..", "profiling"))
+try:
+    from sampling_profiler import install_profiler
+except ImportError:
+    install_profiler = None
+
 # -------------------------
 # Load trained model + encoder
 # -------------------------
 model_path = os.path.join(os.path.dirname(__file__), "..", "models", "disease_model.pkl")
 encoder_path = os.path.join(os.path.dirname(__file__), "..", "models", "label_encoder.pkl")
 
-model = joblib.load(model_path)
-label_encoder = joblib.load(encoder_path)
+table_path = os.path.join(os.path.dirname(__file__), "..", "models", TABLE_FILENAME)
+
+# The pipeline (joblib, scikit-learn, XGBoost, pandas) is only needed for
+# non-binary symptom values, so it is loaded on first use rather than at
+# startup. Binary inputs - every valid request - are served from the table.
+model = None
+label_encoder = None
+_model_lock = threading.Lock()
+
+
+def load_pipeline():
+    global model, label_encoder
+    with _model_lock:
+        if model is None:
+            import joblib
+            label_encoder = joblib.load(encoder_path)
+            model = joblib.load(model_path)
+    return model, label_encoder
+
+
+# All 4096 symptom combinations, precomputed and verified against the
+# pipeline, so /predict is an array lookup (see symptom_table.py).
+symptom_table = SymptomTable.load_or_build(load_pipeline, table_path, model_path)
 
 # -------------------------
 # FastAPI App
 # -------------------------
 app = FastAPI(title="💧 Waterborne Disease Predictor API")
+if install_profiler:
+    install_profiler(app, "waterborne")
 
 # Input data model
 class PatientSymptoms(BaseModel):
@@ -42,11 +80,150 @@ def home():
 
 @app.post("/predict")
 def predict_disease(symptoms: PatientSymptoms):
-    # Convert input to DataFrame
-    input_data = pd.DataFrame([symptoms.dict()])
+    values = symptoms.dict()
+    flags = [[values[c] for c in FEATURE_COLS]]
+    if is_binary(flags):
+        return {"predicted_disease": str(symptom_table.predict(flags)[0])}
+
+    # Non-binary values are outside the table: fall back to the pipeline
+    import pandas as pd
+    model, label_encoder = load_pipeline()
+    input_data = pd.DataFrame([values])
 
     # Predict class
     pred_class = model.predict(input_data)[0]
     pred_disease = label_encoder.inverse_transform([pred_class])[0]
 
     return {"predicted_disease": pred_disease}
+
+
+# -------------------------
+# Batch prediction
+# -------------------------
+MAX_BATCH_ROWS = 100_000
+STREAM_CHUNK_ROWS = 1000
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+def parse_batch(body, content_type):
+    """
+    Reads a batch of patients from a JSON array (or {"patients": [...]}),
+    an NDJSON body, or a CSV with a header row. Missing symptom columns
+    count as 0; an optional "id" column is echoed back. Anything else -
+    non-object rows, unknown columns, non-numeric symptom values - raises
+    ValueError.
+    """
+    import pandas as pd
+
+    if "text/csv" in content_type:
+        df = pd.read_csv(io.BytesIO(body))
+    else:
+        if any(t in content_type for t in NDJSON_TYPES):
+            records = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            records = json.loads(body)
+            if isinstance(records, dict):
+                records = records.get("patients")
+            if not isinstance(records, list):
+                raise ValueError("Expected a JSON array of patients, NDJSON or CSV.")
+        bad = next((i for i, r in enumerate(records) if not isinstance(r, dict)), None)
+        if bad is not None:
+            raise ValueError(f"Patient {bad} is not a JSON object.")
+        df = pd.DataFrame.from_records(records)
+
+    unknown = [c for c in df.columns if c not in FEATURE_COLS and c != "id"]
+    if unknown:
+        raise ValueError(f"Unknown columns: {unknown}")
+    ids = df["id"].astype(object).where(df["id"].notna(), None).tolist() if "id" in df.columns else None
+    symptoms = df.reindex(columns=FEATURE_COLS)
+    # Object columns (mixed JSON types, text in a CSV) are checked value by value
+    non_numeric = [
+        c for c in FEATURE_COLS
+        if not pd.api.types.is_numeric_dtype(symptoms[c])
+        and not all(v is None or isinstance(v, (int, float, np.number)) for v in symptoms[c])
+    ]
+    if non_numeric:
+        raise ValueError(f"Symptom values must be numbers: {non_numeric}")
+    X = symptoms.astype(float).fillna(0).to_numpy()
+    return X, ids
+
+
+def batch_probabilities(X):
+    """
+    Class probabilities for every row: binary rows come from the symptom
+    table, any other rows from one pipeline.predict_proba call.
+    """
+    binary = np.all((X == 0) | (X == 1), axis=1)
+    proba = np.empty((len(X), len(symptom_table.classes)), dtype=np.float32)
+    proba[binary] = symptom_table.predict_proba(X[binary])
+    if not binary.all():
+        import pandas as pd
+        model, _ = load_pipeline()
+        other = pd.DataFrame(X[~binary], columns=FEATURE_COLS)
+        proba[~binary] = model.predict_proba(other)
+    return proba
+
+
+def score_batch(body, content_type, top_k):
+    """
+    Parses and scores a /predict_batch body: (ids, top-k labels, top-k
+    probabilities) per row. CPU-bound (and may load the pipeline), so it
+    runs in the threadpool, off the event loop.
+    """
+    try:
+        X, ids = parse_batch(body, content_type)
+    except ValueError as e:  # Also covers JSONDecodeError and pandas' ParserError
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(X) == 0:
+        raise HTTPException(status_code=400, detail="No patients to score.")
+    if len(X) > MAX_BATCH_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_ROWS} patients per request.")
+
+    proba = batch_probabilities(X)
+    k = min(top_k, proba.shape[1])
+    top = np.argsort(-proba, axis=1, kind="stable")[:, :k]
+    top_proba = np.take_along_axis(proba, top, axis=1).astype(float).round(4)
+    classes = symptom_table.classes.astype(str).tolist()
+    top_labels = [[classes[c] for c in row] for row in top.tolist()]
+    return ids, top_labels, top_proba.tolist()
+
+
+@app.post("/predict_batch")
+async def predict_batch(request: Request, top_k: int = Query(3, ge=1)):
+    """
+    Scores many patients at once and returns, per row, the predicted disease
+    and the top-k diseases with probabilities. The response is streamed as
+    NDJSON for NDJSON/CSV uploads (or "Accept: application/x-ndjson"),
+    otherwise as a JSON array.
+    """
+    content_type = request.headers.get("content-type", "")
+    body = await request.body()
+    ids, top_labels, top_proba = await run_in_threadpool(score_batch, body, content_type, top_k)
+    n = len(top_labels)
+
+    ndjson_out = "text/csv" in content_type or any(t in content_type for t in NDJSON_TYPES) \
+        or "application/x-ndjson" in request.headers.get("accept", "")
+
+    def rows(start, stop):
+        for i in range(start, stop):
+            yield json.dumps({
+                "row": i,
+                **({"id": ids[i]} if ids is not None else {}),
+                "predicted_disease": top_labels[i][0],
+                "top": [{"disease": d, "probability": p} for d, p in zip(top_labels[i], top_proba[i])],
+            }, default=str)
+
+    def generate():
+        if not ndjson_out:
+            yield "["
+        for start in range(0, n, STREAM_CHUNK_ROWS):
+            chunk = list(rows(start, min(start + STREAM_CHUNK_ROWS, n)))
+            if ndjson_out:
+                yield "\n".join(chunk) + "\n"
+            else:
+                yield ("," if start else "") + ",".join(chunk)
+        if not ndjson_out:
+            yield "]"
+
+    media_type = "application/x-ndjson" if ndjson_out else "application/json"
+    return StreamingResponse(generate(), media_type=media_type)
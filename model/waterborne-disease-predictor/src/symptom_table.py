@@ -0,0 +1,194 @@
+# src/symptom_table.py
+import hashlib
+import os
+
+import numpy as np
+
+# -------------------------
+# Lookup-table inference
+# -------------------------
+# The model only sees 12 binary symptom flags, so there are just 2^12 = 4096
+# possible inputs. We score all of them once and store the predicted class
+# and class probabilities in arrays indexed by the symptom bitmask
+# (bit i = FEATURE_COLS[i]). Serving a request is then an array lookup.
+
+FEATURE_COLS = [
+    "Diarrhea", "Dehydration", "Abdominal_Pain", "Watery_Diarrhea",
+    "Vomiting", "Fatigue", "Nausea", "Fever", "Jaundice",
+    "Loss_of_Appetite", "Headache", "Muscle_Pain"
+]
+NUM_COMBINATIONS = 1 << len(FEATURE_COLS)
+BIT_WEIGHTS = 1 << np.arange(len(FEATURE_COLS))
+
+TABLE_FILENAME = "symptom_table.npz"
+
+
+def file_fingerprint(path):
+    """Short content hash of the model file the table was built from."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def all_combinations():
+    """(4096, 12) uint8 matrix; row m holds the symptom flags of bitmask m."""
+    masks = np.arange(NUM_COMBINATIONS)
+    return ((masks[:, None] & BIT_WEIGHTS) > 0).astype(np.uint8)
+
+
+def to_bitmask(X):
+    """Bitmasks for an (n, 12) matrix of 0/1 flags in FEATURE_COLS order."""
+    return np.asarray(X, dtype=np.int64) @ BIT_WEIGHTS
+
+
+def is_binary(X):
+    X = np.asarray(X)
+    return bool(np.all((X == 0) | (X == 1)))
+
+
+class SymptomTable:
+    def __init__(self, predictions, probabilities, classes, fingerprint=None):
+        self.predictions = predictions        # (4096,) class index
+        self.probabilities = probabilities    # (4096, n_classes) float32
+        self.classes = np.asarray(classes)    # label_encoder.classes_
+        self.labels = self.classes[predictions]
+        self.fingerprint = fingerprint
+
+    # -------------------------
+    # Build / persist
+    # -------------------------
+    @classmethod
+    def build(cls, model, label_encoder, fingerprint=None):
+        import pandas as pd  # Only building/verifying needs pandas; lookups are NumPy only
+
+        X = pd.DataFrame(all_combinations(), columns=FEATURE_COLS)
+        predictions = np.asarray(model.predict(X)).astype(np.int64)
+        probabilities = np.asarray(model.predict_proba(X), dtype=np.float32)
+        return cls(predictions, probabilities, label_encoder.classes_, fingerprint)
+
+    def save(self, path):
+        """Writes the table atomically, so workers starting together never read half a file."""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez_compressed(
+                    f,
+                    predictions=self.predictions.astype(np.uint8),
+                    probabilities=self.probabilities,
+                    classes=self.classes.astype(str),
+                    feature_cols=np.array(FEATURE_COLS),
+                    fingerprint=np.array(self.fingerprint or ""),
+                )
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            if list(data["feature_cols"]) != FEATURE_COLS:
+                raise ValueError(f"{path} was built for different symptom columns.")
+            return cls(
+                data["predictions"].astype(np.int64),
+                data["probabilities"],
+                data["classes"],
+                str(data["fingerprint"]) or None,
+            )
+
+    @classmethod
+    def load_or_build(cls, load_model, table_path, model_path):
+        """
+        Loads the table artifact if it was built from this exact model file,
+        otherwise builds it (a single 4096-row batch), verifies it and saves
+        it to 'table_path' for the next start.
+        'load_model' returns (model, label_encoder) and is only called to build,
+        so a current table needs neither the pipeline nor pandas.
+        """
+        fingerprint = file_fingerprint(model_path)
+        if os.path.exists(table_path):
+            try:
+                table = cls.load(table_path)
+            except Exception as e:  # Unreadable or for other columns: rebuilt below
+                print(f"Symptom table {table_path} is unusable ({e}); rebuilding it.")
+            else:
+                if table.fingerprint == fingerprint:
+                    return table
+        model, label_encoder = load_model()
+        table = cls.build(model, label_encoder, fingerprint)
+        table.verify(model, label_encoder)
+        try:
+            table.save(table_path)
+        except OSError as e:  # e.g. a read-only image: serve the table from memory
+            print(f"Could not save the symptom table to {table_path}: {e}")
+        return table
+
+    # -------------------------
+    # Verification
+    # -------------------------
+    def verify(self, model, label_encoder, per_row=False):
+        """
+        Raises if any of the 4096 entries differs from the pipeline. With
+        per_row=True every combination also goes through the original
+        one-row DataFrame path used by /predict.
+        """
+        if list(self.classes) != list(label_encoder.classes_):
+            raise AssertionError("Table classes do not match the label encoder.")
+        import pandas as pd
+
+        X = pd.DataFrame(all_combinations(), columns=FEATURE_COLS)
+        expected_pred = np.asarray(model.predict(X))
+        expected_proba = np.asarray(model.predict_proba(X), dtype=np.float32)
+        if not np.array_equal(self.predictions, expected_pred):
+            raise AssertionError(f"{np.sum(self.predictions != expected_pred)} predictions differ from the pipeline.")
+        if not np.array_equal(self.probabilities, expected_proba):
+            raise AssertionError("Probabilities differ from the pipeline.")
+
+        if per_row:
+            for mask in range(NUM_COMBINATIONS):
+                row = X.iloc[[mask]]
+                label = label_encoder.inverse_transform(model.predict(row))[0]
+                if label != self.labels[mask]:
+                    raise AssertionError(f"Bitmask {mask}: table says {self.labels[mask]}, pipeline says {label}.")
+                if not np.array_equal(self.probabilities[mask], np.asarray(model.predict_proba(row)[0], dtype=np.float32)):
+                    raise AssertionError(f"Bitmask {mask}: probabilities differ from the one-row pipeline path.")
+        return True
+
+    # -------------------------
+    # Lookup
+    # -------------------------
+    def predict(self, X):
+        """Predicted disease labels for an (n, 12) matrix of 0/1 flags."""
+        return self.labels[to_bitmask(X)]
+
+    def predict_proba(self, X):
+        return self.probabilities[to_bitmask(X)]
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    import joblib
+
+    models_dir = os.path.join(os.path.dirname(__file__), "..", "models")
+    parser = argparse.ArgumentParser(description="Build and verify the symptom lookup table.")
+    parser.add_argument("--model", default=os.path.join(models_dir, "disease_model.pkl"))
+    parser.add_argument("--encoder", default=os.path.join(models_dir, "label_encoder.pkl"))
+    parser.add_argument("--out", default=os.path.join(models_dir, TABLE_FILENAME))
+    args = parser.parse_args()
+
+    model = joblib.load(args.model)
+    label_encoder = joblib.load(args.encoder)
+    start = time.perf_counter()
+    table = SymptomTable.build(model, label_encoder, file_fingerprint(args.model))
+    print(f"🧮 Scored all {NUM_COMBINATIONS} symptom combinations in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    table.verify(model, label_encoder, per_row=True)
+    print(f"✅ Table matches the pipeline exactly for every combination ({time.perf_counter() - start:.1f}s)")
+
+    table.save(args.out)
+    print(f"💾 Symptom table saved to {args.out} ({os.path.getsize(args.out) / 1024:.1f} KB)")
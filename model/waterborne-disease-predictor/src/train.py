@@ -1,71 +1,216 @@
 # src/train.py
 import argparse
 import os
+import resource
+import tempfile
+import time
+import numpy as np
 import pandas as pd
 import joblib
+import xgboost as xgb
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.pipeline import Pipeline
 from xgboost import XGBClassifier
 from sklearn.metrics import accuracy_score, classification_report
 
+from symptom_table import FEATURE_COLS, TABLE_FILENAME, SymptomTable, file_fingerprint
 
-def main(args):
-    print(f"📂 Loading data from {args.data}...")
-    df = pd.read_csv(args.data)
-    df = df.dropna(how="all")
+LABEL_COL = "disease_label"
 
-    # -------------------------
-    # Symptom Features
-    # -------------------------
-    feature_cols = [
-        "Diarrhea", "Dehydration", "Abdominal_Pain", "Watery_Diarrhea",
-        "Vomiting", "Fatigue", "Nausea", "Fever", "Jaundice",
-        "Loss_of_Appetite", "Headache", "Muscle_Pain"
-    ]
+XGB_PARAMS = dict(
+    n_estimators=200,
+    learning_rate=0.1,
+    max_depth=5,
+    subsample=0.8,
+    colsample_bytree=0.8,
+    random_state=42,
+    n_jobs=-1,
+    objective="multi:softprob"
+)
 
+# Streaming mode
+CHUNK_ROWS = 1_000_000
+TEST_FRACTION = 0.2
+MAX_EVAL_ROWS = 1_000_000  # Held-out rows kept in memory for the final report
+CSV_DTYPES = {**{c: "UInt8" for c in FEATURE_COLS}, LABEL_COL: "category"}
+
+
+def peak_memory_mb():
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def check_columns(columns):
     # ✅ Check dataset has all required columns
-    missing = [c for c in feature_cols if c not in df.columns]
+    missing = [c for c in FEATURE_COLS if c not in columns]
     if missing:
         raise ValueError(f"❌ Input CSV missing required columns: {missing}")
 
-    if "disease_label" not in df.columns:
+    if LABEL_COL not in columns:
         raise ValueError("❌ Dataset must contain a 'disease_label' column.")
 
-    X = df[feature_cols].fillna(0)
+
+def build_pipeline(clf, use_scaler=True):
+    # The scaler is a no-op for trees; it is kept by default so existing
+    # pipelines and their predictions stay the same.
+    steps = [("scaler", StandardScaler())] if use_scaler else []
+    return Pipeline(steps + [("clf", clf)])
+
+
+# -------------------------
+# In-memory training
+# -------------------------
+def train_in_memory(args):
+    print(f"📂 Loading data from {args.data}...")
+    df = pd.read_csv(args.data)
+    df = df.dropna(how="all")
+    check_columns(df.columns)
+
+    X = df[FEATURE_COLS].fillna(0)
 
     # -------------------------
     # Encode target labels
     # -------------------------
     le = LabelEncoder()
-    y = le.fit_transform(df["disease_label"])
+    y = le.fit_transform(df[LABEL_COL])
 
     # -------------------------
     # Train-test split
     # -------------------------
     X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42, stratify=y
+        X, y, test_size=TEST_FRACTION, random_state=42, stratify=y
     )
 
     # -------------------------
     # Pipeline with XGBoost
     # -------------------------
-    pipeline = Pipeline([
-        ("scaler", StandardScaler()),
-        ("clf", XGBClassifier(
-            n_estimators=200,
-            learning_rate=0.1,
-            max_depth=5,
-            subsample=0.8,
-            colsample_bytree=0.8,
-            random_state=42,
-            n_jobs=-1,
-            objective="multi:softprob"
-        ))
-    ])
+    pipeline = build_pipeline(XGBClassifier(**XGB_PARAMS), not args.no_scaler)
 
     print("🚀 Training model...")
+    start = time.perf_counter()
     pipeline.fit(X_train, y_train)
+    report_speed(len(X_train), time.perf_counter() - start)
+
+    return pipeline, le, X_test, y_test
+
+
+# -------------------------
+# Streaming (out-of-core) training
+# -------------------------
+def read_chunks(path, chunk_rows):
+    """Yields compact chunks: uint8 symptom flags and a categorical label."""
+    reader = pd.read_csv(path, chunksize=chunk_rows, usecols=FEATURE_COLS + [LABEL_COL], dtype=CSV_DTYPES)
+    for chunk in reader:
+        chunk = chunk[chunk[LABEL_COL].notna()]
+        X = chunk[FEATURE_COLS].fillna(0).astype(np.uint8)
+        yield X, chunk[LABEL_COL]
+
+
+def holdout_mask(n, chunk_index, test_fraction, seed=42):
+    """Same rows are held out on every pass: the mask depends only on the chunk."""
+    return np.random.default_rng([seed, chunk_index]).random(n) < test_fraction
+
+
+def scan(args):
+    """
+    First pass over the CSV: label classes, scaler statistics and a bounded
+    sample of held-out rows for evaluation.
+    """
+    classes = set()
+    scaler = None if args.no_scaler else StandardScaler()
+    eval_X, eval_y = [], []
+    kept = 0
+    for i, (X, labels) in enumerate(read_chunks(args.data, args.chunk_rows)):
+        classes.update(labels.cat.categories[np.unique(labels.cat.codes)])
+        test = holdout_mask(len(X), i, TEST_FRACTION)
+        if scaler is not None:
+            scaler.partial_fit(X[~test])
+        if kept < MAX_EVAL_ROWS:
+            take = X[test].iloc[:MAX_EVAL_ROWS - kept]
+            eval_X.append(take)
+            eval_y.append(labels[test].iloc[:len(take)].astype(str))
+            kept += len(take)
+    le = LabelEncoder().fit(sorted(classes))
+    eval_X = pd.concat(eval_X, ignore_index=True)
+    eval_y = le.transform(pd.concat(eval_y, ignore_index=True))
+    return le, scaler, eval_X, eval_y
+
+
+class CsvChunkIter(xgb.DataIter):
+    """Feeds the training rows of the CSV to XGBoost one chunk at a time."""
+
+    def __init__(self, args, le, scaler, cache_prefix):
+        self.args = args
+        self.le = le
+        self.scaler = scaler
+        self.rows = 0  # Training rows in one full pass
+        self._pass_rows = 0
+        self._chunks = None
+        self._index = 0
+        super().__init__(cache_prefix=cache_prefix, release_data=True)
+
+    def next(self, input_data):
+        if self._chunks is None:
+            self._chunks = read_chunks(self.args.data, self.args.chunk_rows)
+        batch = next(self._chunks, None)
+        if batch is None:
+            return False
+        X, labels = batch
+        train = ~holdout_mask(len(X), self._index, TEST_FRACTION)
+        self._index += 1
+        X = X[train]
+        y = pd.Categorical(labels[train].astype(str), categories=self.le.classes_).codes
+        if self.scaler is not None:
+            # As in the in-memory Pipeline, the classifier sees the scaler's plain array
+            X = self.scaler.transform(X).astype(np.float32)
+        self._pass_rows += len(X)
+        self.rows = max(self.rows, self._pass_rows)
+        input_data(data=X, label=y)
+        return True
+
+    def reset(self):
+        self._chunks = None
+        self._index = 0
+        self._pass_rows = 0
+
+
+def train_streaming(args):
+    print(f"📂 Streaming data from {args.data} in chunks of {args.chunk_rows:,} rows...")
+    check_columns(pd.read_csv(args.data, nrows=0).columns)
+    le, scaler, X_test, y_test = scan(args)
+    print(f"🔎 Found {len(le.classes_)} classes; holding out {len(X_test):,} rows for evaluation.")
+
+    params = {k: v for k, v in XGB_PARAMS.items() if k not in ("n_estimators", "random_state", "n_jobs")}
+    params.update(num_class=len(le.classes_), tree_method="hist", seed=XGB_PARAMS["random_state"])
+
+    print("🚀 Training model (external memory)...")
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(dir=args.cache_dir) as cache_dir:
+        it = CsvChunkIter(args, le, scaler, os.path.join(cache_dir, "cache"))
+        dtrain = xgb.ExtMemQuantileDMatrix(it)
+        rows = it.rows
+        booster = xgb.train(params, dtrain, num_boost_round=XGB_PARAMS["n_estimators"])
+        del dtrain
+    report_speed(rows, time.perf_counter() - start)
+
+    # Wrap the booster so the saved artifact is the same kind of Pipeline
+    clf = XGBClassifier(**XGB_PARAMS)
+    with tempfile.TemporaryDirectory() as tmp:
+        booster_path = os.path.join(tmp, "booster.ubj")
+        booster.save_model(booster_path)
+        clf.load_model(booster_path)
+    pipeline = Pipeline(([("scaler", scaler)] if scaler is not None else []) + [("clf", clf)])
+    return pipeline, le, X_test, y_test
+
+
+def report_speed(rows, seconds):
+    print(f"⏱️ Trained on {rows:,} rows in {seconds:.1f}s ({rows / max(seconds, 1e-9):,.0f} rows/s), "
+          f"peak memory {peak_memory_mb():,.0f} MB")
+
+
+def main(args):
+    pipeline, le, X_test, y_test = (train_streaming if args.streaming else train_in_memory)(args)
 
     # -------------------------
     # Evaluate
@@ -73,7 +218,7 @@ def main(args):
     preds = pipeline.predict(X_test)
     acc = accuracy_score(y_test, preds)
     print(f"✅ Accuracy: {acc:.4f}")
-    print(classification_report(y_test, preds, target_names=le.classes_))
+    print(classification_report(y_test, preds, labels=np.arange(len(le.classes_)), target_names=le.classes_))
 
     # -------------------------
     # Save model + encoder
@@ -84,13 +229,28 @@ def main(args):
     encoder_path = os.path.join(os.path.dirname(args.out), "label_encoder.pkl")
     joblib.dump(le, encoder_path)
 
+    # -------------------------
+    # Precompute the symptom lookup table
+    # -------------------------
+    table_path = os.path.join(os.path.dirname(args.out), TABLE_FILENAME)
+    table = SymptomTable.build(pipeline, le, file_fingerprint(args.out))
+    table.verify(pipeline, le)
+    table.save(table_path)
+
     print(f"💾 Pipeline saved to {args.out}")
     print(f"💾 Label encoder saved to {encoder_path}")
+    print(f"💾 Symptom lookup table saved to {table_path}")
+    print(f"📈 Peak memory {peak_memory_mb():,.0f} MB")
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--data", type=str, required=True, help="Path to CSV dataset")
     parser.add_argument("--out", type=str, required=True, help="Path to save model.pkl")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Read the CSV in chunks and train with XGBoost external memory")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="Rows per chunk in --streaming mode")
+    parser.add_argument("--cache-dir", default=None, help="Where external-memory pages go (default: system temp)")
+    parser.add_argument("--no-scaler", action="store_true", help="Drop the StandardScaler step (a no-op for trees)")
     args = parser.parse_args()
     main(args)
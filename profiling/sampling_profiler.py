@@ -0,0 +1,324 @@
+# sampling_profiler.py
+import atexit
+import hmac
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from urllib.parse import parse_qs
+
+# --- Opt-in sampling profiler for the Flask and FastAPI services ---
+# A chosen request is profiled statistically: a background thread wakes up
+# every PROFILE_INTERVAL_MS, grabs the Python stack of the thread serving it
+# (sys._current_frames) and counts it. Nothing traces function calls, so the
+# profiled request runs at close to full speed and unsampled requests pay one
+# random() call. Stacks are aggregated per service in the collapsed format
+# ("label;outer;...;inner count") that flamegraph.pl, speedscope and
+# inferno read directly.
+#
+#   PROFILE_ENABLED=1        install the middleware (otherwise the app is left untouched)
+#   PROFILE_SAMPLE_RATE=0.01 fraction of requests profiled
+#   X-Profile: <token>       profiles this request (any value when no PROFILE_TOKEN is set)
+#   PROFILE_TOKEN=...        enables GET /debug/profile with 'X-Profile-Token: <token>'
+#                            (?reset=1 clears the stacks after reading them)
+#   PROFILE_DIR=...          also writes <service>-<pid>.collapsed there periodically and at exit
+#
+#   curl -H "X-Profile-Token: $PROFILE_TOKEN" host/debug/profile | flamegraph.pl > profile.svg
+#
+# Flask requests own their thread, so their stacks are exact. ASGI requests
+# share the event loop thread; it is sampled only while the profiled
+# request's task is the one running. Work handed to thread pools (sync
+# FastAPI endpoints, the water_quality micro-batcher) is counted under
+# "[worker threads]".
+
+ENABLED = os.getenv("PROFILE_ENABLED", "0").lower() in ("1", "true", "yes")
+SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.01"))
+INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+TOKEN = os.getenv("PROFILE_TOKEN") or None
+DUMP_DIR = os.getenv("PROFILE_DIR") or None
+DUMP_SECONDS = float(os.getenv("PROFILE_DUMP_SECONDS", "30"))
+MAX_STACKS = int(os.getenv("PROFILE_MAX_STACKS", "20000"))  # Distinct stacks kept per service
+
+ENDPOINT = "/debug/profile"
+MAX_DEPTH = 128
+WORKER_THREADS = "[worker threads]"
+# Innermost frames of a thread that is waiting for work, not doing it
+IDLE_FRAMES = {
+    ("threading.py", "wait"), ("queue.py", "get"), ("selectors.py", "select"),
+    ("thread.py", "_worker"), ("socketserver.py", "serve_forever"),
+}
+
+
+def wants_profile(header_value):
+    """Whether to profile a request with this X-Profile header value (None if absent)."""
+    if header_value is not None and (TOKEN is None or hmac.compare_digest(header_value, TOKEN)):
+        return True
+    return SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE
+
+
+def authorized(token):
+    return TOKEN is not None and token is not None and hmac.compare_digest(token, TOKEN)
+
+
+def request_label(method, path):
+    """'POST /risk/{id}': path segments with digits are collapsed to keep labels few."""
+    segments = ["{id}" if any(c.isdigit() for c in s) else s for s in path.split("/")]
+    return f"{method} {'/'.join(segments)}".replace(";", ":")
+
+
+# --- Aggregated Stacks ---
+class Profile:
+    """Collapsed stacks of one service."""
+
+    def __init__(self, service):
+        self.service = service
+        self.stacks = Counter()
+        self.samples = 0
+        self.requests = 0
+        self.dropped = 0  # Samples of new stacks once MAX_STACKS is reached
+        self._lock = threading.Lock()
+        self._last_dump = time.monotonic()
+
+    def add(self, label, frames):
+        key = ";".join([label, *frames])
+        with self._lock:
+            self.samples += 1
+            if key in self.stacks or len(self.stacks) < MAX_STACKS:
+                self.stacks[key] += 1
+            else:
+                self.dropped += 1
+
+    def finished(self):
+        """Called after each profiled request."""
+        with self._lock:
+            self.requests += 1
+            due = DUMP_DIR is not None and time.monotonic() - self._last_dump >= DUMP_SECONDS
+            if due:
+                self._last_dump = time.monotonic()
+        if due:
+            self.dump(DUMP_DIR)
+
+    def collapsed(self, reset=False):
+        with self._lock:
+            lines = [f"{stack} {count}" for stack, count in self.stacks.most_common()]
+            stats = {"samples": self.samples, "requests": self.requests, "dropped": self.dropped}
+            if reset:
+                self.stacks.clear()
+                self.samples = self.requests = self.dropped = 0
+        return "\n".join(lines) + "\n" if lines else "", stats
+
+    def dump(self, directory):
+        try:
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"{self.service}-{os.getpid()}.collapsed")
+            text, _ = self.collapsed()
+            with open(path + ".tmp", "w") as f:
+                f.write(text)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            print(f"Profiler: could not write {self.service} stacks to {directory}: {e}")
+
+
+# --- Sampler Thread ---
+_frame_names = {}  # code object -> "function (dir/file.py:line)"
+
+
+def frame_name(code):
+    name = _frame_names.get(code)
+    if name is None:
+        path = code.co_filename.replace("\\", "/").split("/")
+        name = f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+        _frame_names[code] = name
+    return name
+
+
+def stack_of(frame):
+    """Frame names from outermost to innermost."""
+    names = []
+    while frame is not None and len(names) < MAX_DEPTH:
+        names.append(frame_name(frame.f_code))
+        frame = frame.f_back
+    names.reverse()
+    return names
+
+
+def is_idle(frame):
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+
+class Sampler:
+    """One per process; samples only while at least one profiled request is in flight."""
+
+    def __init__(self, interval_ms=INTERVAL_MS):
+        self.interval = max(interval_ms, 0.5) / 1000
+        self.sessions = {}  # key -> (profile, label, thread id, is_running or None)
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._active = threading.Event()
+        self._thread = None
+
+    def begin(self, profile, label, thread_id, is_running=None):
+        """'is_running()' tells ASGI sessions whether their task holds the loop thread right now."""
+        with self._lock:
+            key = next(self._ids)
+            self.sessions[key] = (profile, label, thread_id, is_running)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+                self._thread.start()
+        self._active.set()
+        return key
+
+    def end(self, key):
+        with self._lock:
+            session = self.sessions.pop(key, None)
+        if session is not None:
+            session[0].finished()
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            self._active.wait()
+            with self._lock:
+                sessions = list(self.sessions.values())
+                if not sessions:
+                    self._active.clear()
+                    continue
+            self._sample(sessions, sys._current_frames(), me)
+            time.sleep(self.interval)
+
+    def _sample(self, sessions, frames, me):
+        request_threads = {me}
+        asgi_profile = None
+        for profile, label, thread_id, is_running in sessions:
+            request_threads.add(thread_id)
+            frame = frames.get(thread_id)
+            if is_running is not None:
+                asgi_profile = asgi_profile or profile
+                if not is_running():
+                    continue
+            if frame is not None:
+                profile.add(label, stack_of(frame))
+        if asgi_profile is None:
+            return
+        for thread_id, frame in frames.items():
+            if thread_id not in request_threads and not is_idle(frame):
+                asgi_profile.add(WORKER_THREADS, stack_of(frame))
+
+
+sampler = Sampler()
+
+
+# --- WSGI (Flask) ---
+class WSGIProfiler:
+    def __init__(self, app, profile):
+        self.app = app
+        self.profile = profile
+
+    def __call__(self, environ, start_response):
+        if TOKEN is not None and environ.get("PATH_INFO") == ENDPOINT:
+            return self.serve(environ, start_response)
+        if not wants_profile(environ.get("HTTP_X_PROFILE")):
+            return self.app(environ, start_response)
+        label = request_label(environ.get("REQUEST_METHOD", ""), environ.get("PATH_INFO", ""))
+        key = sampler.begin(self.profile, label, threading.get_ident())
+        try:
+            result = self.app(environ, start_response)
+        except BaseException:
+            sampler.end(key)
+            raise
+        return self._stream(result, key)
+
+    @staticmethod
+    def _stream(result, key):
+        # Streamed bodies (e.g. /predict_batch) are produced while iterating
+        try:
+            yield from result
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+            sampler.end(key)
+
+    def serve(self, environ, start_response):
+        if not authorized(environ.get("HTTP_X_PROFILE_TOKEN")):
+            start_response("403 Forbidden", [("Content-Type", "text/plain")])
+            return [b"Forbidden\n"]
+        reset = parse_qs(environ.get("QUERY_STRING", "")).get("reset") == ["1"]
+        text, stats = self.profile.collapsed(reset)
+        body = text.encode()
+        start_response("200 OK", [("Content-Type", "text/plain; charset=utf-8"),
+                                  ("Content-Length", str(len(body))), *stat_headers(stats)])
+        return [body]
+
+
+# --- ASGI (FastAPI) ---
+class ASGIProfiler:
+    def __init__(self, app, profile):
+        self.app = app
+        self.profile = profile
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        path = scope["path"]
+        root = scope.get("root_path", "")
+        if root and path.startswith(root):  # Mounted (e.g. under the gateway)
+            path = path[len(root):] or "/"
+        headers = dict(scope["headers"])
+        if TOKEN is not None and path == ENDPOINT:
+            return await self.serve(scope, headers, send)
+        trigger = headers.get(b"x-profile")
+        if not wants_profile(trigger.decode("latin-1") if trigger is not None else None):
+            return await self.app(scope, receive, send)
+
+        import asyncio
+
+        loop, task = asyncio.get_running_loop(), asyncio.current_task()
+        key = sampler.begin(self.profile, request_label(scope["method"], path), threading.get_ident(),
+                            lambda: asyncio.current_task(loop) is task)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            sampler.end(key)
+
+    async def serve(self, scope, headers, send):
+        token = headers.get(b"x-profile-token")
+        if not authorized(token.decode("latin-1") if token is not None else None):
+            await send({"type": "http.response.start", "status": 403,
+                        "headers": [(b"content-type", b"text/plain")]})
+            await send({"type": "http.response.body", "body": b"Forbidden\n"})
+            return
+        reset = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("reset") == ["1"]
+        text, stats = self.profile.collapsed(reset)
+        body = text.encode()
+        response_headers = [(b"content-type", b"text/plain; charset=utf-8"),
+                            (b"content-length", str(len(body)).encode())]
+        response_headers += [(k.lower().encode(), v.encode()) for k, v in stat_headers(stats)]
+        await send({"type": "http.response.start", "status": 200, "headers": response_headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+def stat_headers(stats):
+    return [(f"X-Profile-{name.capitalize()}", str(value)) for name, value in stats.items()]
+
+
+def install_profiler(app, service):
+    """
+    Profiles a Flask or ASGI (FastAPI) app when PROFILE_ENABLED=1; otherwise
+    leaves it untouched. Returns the service's Profile, or None.
+    """
+    if not ENABLED:
+        return None
+    profile = Profile(service)
+    if hasattr(app, "wsgi_app"):
+        app.wsgi_app = WSGIProfiler(app.wsgi_app, profile)
+    else:
+        app.add_middleware(ASGIProfiler, profile=profile)
+    if DUMP_DIR is not None:
+        atexit.register(profile.dump, DUMP_DIR)
+    print(f"Profiler: sampling {SAMPLE_RATE:.1%} of {service} requests every {INTERVAL_MS:g}ms"
+          f"{'' if TOKEN is None else f', stacks at {ENDPOINT}'}.")
+    return profile